@@ -53,6 +53,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -108,10 +109,23 @@ REST_FRAMEWORK = {
     ],
 
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Proxy hops in front of the app (Railway's edge is one). Client addresses
+    # for the ip throttle buckets are read from that many hops back in
+    # X-Forwarded-For, so a header the client sends itself is never trusted
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=1),
+    # Token buckets of cinewhisper.throttling.RedisRateThrottle, per
+    # "<throttle_scope>.<ip|user|account>"; a missing entry means no bucket
+    'DEFAULT_THROTTLE_RATES': {
+        'login.ip': env('THROTTLE_LOGIN_IP', default='20/min'),
+        'login.account': env('THROTTLE_LOGIN_ACCOUNT', default='5/min'),
+        'register.ip': env('THROTTLE_REGISTER_IP', default='10/hour'),
+        'catalog-write.ip': env('THROTTLE_CATALOG_WRITE_IP', default='30/min'),
+        'catalog-write.user': env('THROTTLE_CATALOG_WRITE_USER', default='60/min'),
+    },
 }
 
 SIMPLE_JWT = {
@@ -177,18 +191,86 @@ else:
     }
 
 
+REDIS_URL = env('REDIS')
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": env('REDIS'),
+        "LOCATION": REDIS_URL,
     }
 }
 
+# Seconds a published trending list counts as fresh; stale lists keep being
+# served while a single refresh runs, guarded by a lock of TRENDING_LOCK_TIMEOUT
+TRENDING_CACHE_TIMEOUT = env.int("TRENDING_CACHE_TIMEOUT", default=14400)
+TRENDING_LOCK_TIMEOUT = env.int("TRENDING_LOCK_TIMEOUT", default=300)
+
+# Seconds clients and shared caches may reuse catalog and trending responses
+# before revalidating them against the ingestion version (ETag/Last-Modified)
+CATALOG_CACHE_MAX_AGE = env.int("CATALOG_CACHE_MAX_AGE", default=60)
+
+# Serve catalog list and detail reads from values() rows instead of the
+# serializers (movies.views.FastReadMixin); the JSON is byte-identical
+CATALOG_FAST_READS = env.bool("CATALOG_FAST_READS", default=False)
+
+# How gunicorn serves the app (gunicorn.conf.py): "wsgi" with sync workers,
+# or "asgi" with uvicorn workers. ASYNC_READS routes anonymous catalog and
+# trending GETs to the async views (movies/async_views.py); on by default
+# under ASGI, where they do not tie up a thread while waiting on I/O
+SERVER_MODE = env("SERVER_MODE", default="wsgi")
+ASYNC_READS = env.bool("ASYNC_READS", default=SERVER_MODE == "asgi")
+
+# Postgres text search configuration used for title and overview search
+SEARCH_CONFIG = env("SEARCH_CONFIG", default="english")
+
+# Neighbours kept per title for /movies/{id}/similar and /tvshows/{id}/similar
+SIMILAR_TITLES_K = env.int("SIMILAR_TITLES_K", default=20)
+
+# Favourites-based recommendations: how many of a user's most recent
+# favourites seed them, and how many neighbours each seed contributes
+FAVOURITE_RECOMMENDATION_SEEDS = env.int("FAVOURITE_RECOMMENDATION_SEEDS", default=50)
+FAVOURITE_NEIGHBOURS_PER_SEED = env.int("FAVOURITE_NEIGHBOURS_PER_SEED", default=50)
+
+# Favourites embedded in the profile; the rest are paged through /favourites/
+PROFILE_FAVOURITES_LIMIT = env.int("PROFILE_FAVOURITES_LIMIT", default=20)
+
+# Largest number of items accepted by POST /favourites/bulk
+FAVOURITES_BULK_MAX = env.int("FAVOURITES_BULK_MAX", default=500)
+
+# Bulk-added favourites whose co-occurrences the pair_favourites task counts
+# per transaction
+FAVOURITE_PAIR_BATCH = env.int("FAVOURITE_PAIR_BATCH", default=100)
+
+# Seconds a user's serialized favourites and profile stay cached; changes
+# invalidate them sooner through a per-user version and the catalog version
+FAVOURITES_CACHE_TIMEOUT = env.int("FAVOURITES_CACHE_TIMEOUT", default=3600)
+
+# Seconds the fields authentication needs for a user stay cached, in the
+# shared cache and in each process; saves invalidate both, but other
+# processes can hold a local copy for up to USER_CACHE_LOCAL_TIMEOUT
+USER_CACHE_TIMEOUT = env.int("USER_CACHE_TIMEOUT", default=300)
+USER_CACHE_LOCAL_TIMEOUT = env.int("USER_CACHE_LOCAL_TIMEOUT", default=5)
+
+# Largest profile picture upload accepted; decoding and resizing happen in
+# a Celery task, so the request only streams the file to storage
+PROFILE_PICTURE_MAX_BYTES = env.int("PROFILE_PICTURE_MAX_BYTES", default=20 * 1024 ** 2)
+
+# Stream uploads to a temporary file in chunks rather than buffering them in
+# memory; FileSystemStorage then moves the file into place without a copy
+FILE_UPLOAD_HANDLERS = ["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
+
+# Months of per-run trending snapshots kept before their partitions are dropped
+TRENDING_HISTORY_MONTHS = env.int("TRENDING_HISTORY_MONTHS", default=12)
+
 CELERY_BEAT_SCHEDULE = {
     'fetch-trending-every-hour': {
         'task': 'movies.tasks.fetch_trending_movies_shows',
         'schedule': 7200.0,
     },
+    'sync-catalog-changes-every-hour': {
+        'task': 'movies.tasks.sync_catalog_changes',
+        'schedule': 3600.0,
+    },
 }
 
 LOGGING = {
@@ -276,3 +358,38 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
 TMDB_API_KEY = env("TMDB_API_KEY")
+TMDB_API_URL = env("TMDB_API_URL", default="https://api.themoviedb.org/3")
+TMDB_IMAGE_URL = env("TMDB_IMAGE_URL", default="https://image.tmdb.org/t/p/original")
+
+# TMDb fetcher: max in-flight requests, retry count and backoff (seconds)
+TMDB_FETCH_CONCURRENCY = env.int("TMDB_FETCH_CONCURRENCY", default=5)
+TMDB_FETCH_RETRIES = env.int("TMDB_FETCH_RETRIES", default=3)
+TMDB_FETCH_BACKOFF = env.float("TMDB_FETCH_BACKOFF", default=0.5)
+TMDB_FETCH_BACKOFF_MAX = env.float("TMDB_FETCH_BACKOFF_MAX", default=8.0)
+TMDB_FETCH_TIMEOUT = env.float("TMDB_FETCH_TIMEOUT", default=10.0)
+
+# TMDb requests per second shared by every worker (0 disables the budget)
+TMDB_RATE_LIMIT = env.int("TMDB_RATE_LIMIT", default=40)
+
+# Trending ingestion: pages per media type, and pages fetched by each subtask
+TMDB_TRENDING_PAGES = env.int("TMDB_TRENDING_PAGES", default=10)
+TMDB_PAGES_PER_TASK = env.int("TMDB_PAGES_PER_TASK", default=2)
+
+# Incremental sync: days per changes-feed request (TMDb's limit) and days
+# looked back on the first run, before any watermark is stored
+TMDB_CHANGES_MAX_DAYS = env.int("TMDB_CHANGES_MAX_DAYS", default=14)
+TMDB_SYNC_INITIAL_DAYS = env.int("TMDB_SYNC_INITIAL_DAYS", default=1)
+
+# Detail enrichment: days before a title's details are refetched, titles
+# enriched per run and per chunk task, and cast members kept per title
+TMDB_ENRICH_TTL_DAYS = env.int("TMDB_ENRICH_TTL_DAYS", default=7)
+TMDB_ENRICH_MAX_TITLES = env.int("TMDB_ENRICH_MAX_TITLES", default=5000)
+TMDB_ENRICH_CHUNK_SIZE = env.int("TMDB_ENRICH_CHUNK_SIZE", default=100)
+TMDB_CAST_LIMIT = env.int("TMDB_CAST_LIMIT", default=20)
+
+# Image proxy: disk cache location and size cap (least recently used
+# variants are evicted), encoder quality, and seconds clients may keep an image
+IMAGE_CACHE_DIR = env("IMAGE_CACHE_DIR", default=os.path.join(BASE_DIR, "image_cache"))
+IMAGE_CACHE_MAX_BYTES = env.int("IMAGE_CACHE_MAX_BYTES", default=1024 ** 3)
+IMAGE_QUALITY = env.int("IMAGE_QUALITY", default=80)
+IMAGE_CACHE_MAX_AGE = env.int("IMAGE_CACHE_MAX_AGE", default=30 * 24 * 3600)
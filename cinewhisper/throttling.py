@@ -0,0 +1,143 @@
+import hashlib
+import logging
+from collections.abc import Mapping
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# Token buckets, checked and charged atomically in one round trip. ARGV
+# holds (capacity, refill period in ms) per key. A request is let through
+# only if every bucket has a token, and then takes one from each. Returns
+# 0 when allowed, otherwise the milliseconds until all buckets have a token.
+# Redis's own clock is used so every web pod agrees on the time.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local period = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    available = math.min(capacity, available + elapsed * capacity / period)
+    if available < 1 then
+        wait = math.max(wait, math.ceil((1 - available) * period / capacity))
+    end
+    tokens[i] = available
+end
+for i, key in ipairs(KEYS) do
+    local left = tokens[i]
+    if wait == 0 then
+        left = left - 1
+    end
+    redis.call('HSET', key, 'tokens', left, 'ts', now)
+    redis.call('PEXPIRE', key, tonumber(ARGV[2 * i]))
+end
+return wait
+"""
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+_client = None
+_script = None
+
+
+def get_script():
+    """Return the registered token bucket script, loaded once per process"""
+    global _client, _script
+    if _script is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+        _script = _client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _script
+
+
+def parse_rate(rate: str):
+    """(requests, period in ms) of a DRF-style rate such as 10/min or 100/hour"""
+    num, period = rate.split("/")
+    return int(num), PERIODS[period[0]] * 1000
+
+
+class RedisRateThrottle(BaseThrottle):
+    """
+    Token bucket throttle shared by every web process through Redis.
+
+    Views name a throttle_scope; each "<scope>.<kind>" entry of
+    DEFAULT_THROTTLE_RATES adds a bucket for that kind of identity:
+
+      ip       the client address
+      user     the authenticated user
+      account  the account a login attempt names, so credential stuffing
+               spread over many addresses is still limited per victim
+
+    A rate like "10/min" allows bursts of 10 and refills one token every
+    6 seconds. All of a request's buckets are checked in one script call;
+    if Redis is unreachable the request is let through.
+    """
+    kinds = ("ip", "user", "account")
+
+    def __init__(self):
+        self.retry_after = None
+
+    def identity(self, kind: str, request):
+        if kind == "ip":
+            return self.get_ident(request)
+        if kind == "user":
+            return str(request.user.pk) if request.user and request.user.is_authenticated else None
+        if kind == "account":
+            data = request.data
+            account = data.get(get_user_model().USERNAME_FIELD) if isinstance(data, Mapping) else None
+            if not isinstance(account, str) or not account.strip():
+                return None
+            return hashlib.md5(account.strip().lower().encode()).hexdigest()
+        return None
+
+    def buckets(self, request, view) -> list:
+        """(key, capacity, period in ms) of each bucket that applies to the request"""
+        scope = getattr(view, "throttle_scope", None)
+        if scope is None:
+            return []
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        buckets = []
+        for kind in self.kinds:
+            rate = rates.get(f"{scope}.{kind}")
+            ident = self.identity(kind, request) if rate else None
+            if ident is None:
+                continue
+            buckets.append((f"throttle:{scope}:{kind}:{ident}", *parse_rate(rate)))
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.buckets(request, view)
+        if not buckets:
+            return True
+        args = [value for _, capacity, period in buckets for value in (capacity, period)]
+        try:
+            wait = get_script()(keys=[key for key, _, _ in buckets], args=args)
+        except redis.RedisError as e:
+            logger.warning(f"Throttle unavailable, allowing request: {e}")
+            return True
+        if wait:
+            self.retry_after = wait / 1000
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class ThrottledWritesMixin:
+    """Throttles a viewset's writes under throttle_scope; reads are not throttled at all"""
+    throttle_classes = [RedisRateThrottle]
+
+    def get_throttles(self):
+        if self.request.method in SAFE_METHODS:
+            return []
+        return super().get_throttles()
@@ -0,0 +1,9 @@
+import os
+
+# SERVER_MODE=asgi serves the ASGI app through uvicorn workers, so the async
+# read views run on an event loop; anything else keeps the sync WSGI workers
+if os.environ.get("SERVER_MODE", "wsgi") == "asgi":
+    wsgi_app = "cinewhisper.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "cinewhisper.wsgi:application"
@@ -0,0 +1,230 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from redis.exceptions import RedisError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import Movie, TvShow
+from .pagination import CatalogPagination
+from .renderers import ORJSONRenderer
+from .serializers import MovieSerializer, TvShowSerializer
+from .trending import apublished_count, apublished_slice, ids_key, items_key, merged_ids_key
+from .versioning import acatalog_version
+from .views import MovieViewSet, TrendingAllViewSet, TvShowViewSet, serializer_field_names, value_rows
+
+# The DRF views behind each async route, built the way DefaultRouter builds them
+DELEGATES = {
+    "movie-list": MovieViewSet.as_view({'get': 'list', 'post': 'create'}, basename='movies', detail=False),
+    "movie-detail": MovieViewSet.as_view(
+        {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'},
+        basename='movies', detail=True,
+    ),
+    "movie-trending": MovieViewSet.as_view({'get': 'trending_movies'}, basename='movies', detail=False),
+    "tv-list": TvShowViewSet.as_view({'get': 'list', 'post': 'create'}, basename='tvshow', detail=False),
+    "tv-detail": TvShowViewSet.as_view(
+        {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'},
+        basename='tvshow', detail=True,
+    ),
+    "tv-trending": TvShowViewSet.as_view({'get': 'trending_tv_shows'}, basename='tvshow', detail=False),
+    "all-trending": TrendingAllViewSet.as_view({'get': 'list'}, basename='trending-all', detail=False),
+}
+
+CATALOGS = {
+    "movie": (Movie, MovieSerializer),
+    "tv": (TvShow, TvShowSerializer),
+}
+
+
+async def delegate(name, request, **kwargs):
+    """Hand a request the async path does not cover to the DRF view"""
+    return await sync_to_async(DELEGATES[name])(request, **kwargs)
+
+
+def servable(request, params) -> bool:
+    """
+    Anonymous JSON GETs using only the given query parameters. Anything else
+    (writes, filters, sparse fields, cursors, other formats, credentials that
+    DRF would check) goes to the DRF views, so both paths answer every
+    request the same way.
+    """
+    accept = request.headers.get("Accept", "")
+    return (
+        request.method == "GET"
+        and set(request.GET) <= params
+        and "Authorization" not in request.headers
+        and (not accept or "application/json" in accept or "*/*" in accept)
+        and "text/html" not in accept
+    )
+
+
+def positive_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def page_bounds(request, count: int, page_size: int):
+    """(number, start, stop, pages) of the requested page, or None where the paginator would reject it"""
+    number = positive_int(request.GET.get("page", 1))
+    pages = max(1, math.ceil(count / page_size))
+    if number is None or number > pages:
+        return None
+    start = (number - 1) * page_size
+    return number, start, min(start + page_size, count), pages
+
+
+def paginated(request, count: int, number: int, pages: int, results: list) -> dict:
+    """The body PageNumberPagination returns for a page"""
+    url = request.build_absolute_uri()
+    previous = None
+    if number == 2:
+        previous = remove_query_param(url, "page")
+    elif number > 2:
+        previous = replace_query_param(url, "page", number - 1)
+    return {
+        "count": count,
+        "next": replace_query_param(url, "page", number + 1) if number < pages else None,
+        "previous": previous,
+        "results": results,
+    }
+
+
+async def catalog_validators():
+    """(etag, last_modified) as ConditionalCatalogMixin builds them for JSON, or None"""
+    version = await acatalog_version()
+    if version is None:
+        return None
+    return f'"{version}-json"', version // 10 ** 9
+
+
+def finalize(response, validators):
+    if validators:
+        response["ETag"] = validators[0]
+        response["Last-Modified"] = http_date(validators[1])
+        patch_cache_control(response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+async def conditional(request, build):
+    """
+    Answer from the catalog version alone when the client is current,
+    otherwise render build()'s data; build() returns None to delegate.
+    """
+    validators = await catalog_validators()
+    if validators and get_conditional_response(
+        request, etag=validators[0], last_modified=validators[1]
+    ) is not None:
+        return finalize(HttpResponseNotModified(), validators)
+
+    data = await build()
+    if data is None:
+        return None
+    response = HttpResponse(ORJSONRenderer().render(data), content_type="application/json")
+    return finalize(response, validators)
+
+
+async def trending_page(request, ids: str, items: str, media_types):
+    """One page of a published trending list, or None to delegate (nothing published, bad page)"""
+    page_size = positive_int(request.GET.get("page_size", 10))
+    if page_size is None:
+        return None
+    try:
+        count = await apublished_count(ids, media_types)
+        bounds = page_bounds(request, count, page_size) if count else None
+        if bounds is None:
+            return None
+        number, start, stop, pages = bounds
+        results = await apublished_slice(ids, items, start, stop)
+    except RedisError:
+        return None
+    return paginated(request, count, number, pages, results)
+
+
+def trending_view(media_type: str):
+    name = f"{media_type}-trending"
+
+    @csrf_exempt
+    async def view(request):
+        """GET /<media>/trending - the published trending list, read over asyncio Redis"""
+        if servable(request, {"page", "page_size"}):
+            response = await conditional(
+                request, lambda: trending_page(request, ids_key(media_type), items_key(media_type), [media_type])
+            )
+            if response is not None:
+                return response
+        return await delegate(name, request)
+
+    return view
+
+
+@csrf_exempt
+async def trending_all(request):
+    """GET /trending/all?media_type=movie|tv - the merged feed, read over asyncio Redis"""
+    media_type = request.GET.get("media_type") or None
+    if servable(request, {"page", "page_size", "media_type"}) and media_type in (None, *CATALOGS):
+        response = await conditional(
+            request, lambda: trending_page(request, merged_ids_key(media_type), items_key("all"), list(CATALOGS))
+        )
+        if response is not None:
+            return response
+    return await delegate("all-trending", request)
+
+
+def list_view(media_type: str):
+    model, serializer_class = CATALOGS[media_type]
+    name = f"{media_type}-list"
+
+    async def build(request):
+        # As CatalogPagination: invalid sizes fall back to the default, large ones are capped
+        page_size = CatalogPagination.page_size
+        if "page_size" in request.GET:
+            page_size = min(positive_int(request.GET["page_size"]) or page_size, CatalogPagination.max_page_size)
+
+        queryset, row = value_rows(model.objects.all(), serializer_field_names(serializer_class), media_type)
+        count = await queryset.acount()
+        bounds = page_bounds(request, count, page_size)
+        if bounds is None:
+            return None
+        number, start, stop, pages = bounds
+        results = [row(values) async for values in queryset[start:stop]]
+        return paginated(request, count, number, pages, results)
+
+    @csrf_exempt
+    async def view(request):
+        """GET /<media>/ - the catalog by popularity, through the async ORM"""
+        if servable(request, {"page", "page_size"}):
+            response = await conditional(request, lambda: build(request))
+            if response is not None:
+                return response
+        return await delegate(name, request)
+
+    return view
+
+
+def detail_view(media_type: str):
+    model, serializer_class = CATALOGS[media_type]
+    name = f"{media_type}-detail"
+
+    async def build(pk):
+        queryset, row = value_rows(model.objects.filter(pk=pk), serializer_field_names(serializer_class), media_type)
+        values = await queryset.afirst()
+        return row(values) if values is not None else None
+
+    @csrf_exempt
+    async def view(request, pk):
+        """GET /<media>/{id}/ - one title through the async ORM"""
+        if servable(request, set()):
+            response = await conditional(request, lambda: build(pk))
+            if response is not None:
+                return response
+        return await delegate(name, request, pk=str(pk))
+
+    return view
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import TitleCredit, TitleDetails
+from .sync import DETAIL_URLS, MODELS
+from .tmdb import get_many
+
+logger = logging.getLogger(__name__)
+
+# Crew jobs worth showing on a detail screen; the full crew runs to hundreds
+CREW_JOBS = {"Director", "Screenplay", "Writer", "Novel", "Original Music Composer", "Creator"}
+
+
+def stale_titles(media_type: str, limit: int) -> list:
+    """
+    (id, tmdb_id) of titles with no details or details older than
+    TMDB_ENRICH_TTL_DAYS, most popular first.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.TMDB_ENRICH_TTL_DAYS)
+    model = MODELS[media_type]
+    fresh = TitleDetails.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id=OuterRef('pk'), fetched_at__gte=cutoff
+    )
+    return list(
+        model.objects
+        .filter(~Exists(fresh))
+        .order_by('-popularity', '-id')
+        .values_list('id', 'tmdb_id')[:limit]
+    )
+
+
+def parse_details(media_type: str, body: dict):
+    """Map a details payload with credits and keywords appended onto (details, credits)"""
+    if media_type == "movie":
+        runtime = body.get("runtime")
+        keywords = body.get("keywords", {}).get("keywords", [])
+    else:
+        runtime = next(iter(body.get("episode_run_time") or []), None)
+        keywords = body.get("keywords", {}).get("results", [])
+
+    credits = body.get("credits", {})
+    cast = sorted(credits.get("cast", []), key=lambda person: person.get("order", 0))
+    rows = [
+        (TitleCredit.CAST, person["id"], person.get("name", ""), person.get("character", ""), order)
+        for order, person in enumerate(cast[:settings.TMDB_CAST_LIMIT])
+    ]
+    crew = [
+        (person["id"], person.get("name", ""), "Creator") for person in body.get("created_by", [])
+    ] + [
+        (person["id"], person.get("name", ""), person["job"])
+        for person in credits.get("crew", []) if person.get("job") in CREW_JOBS
+    ]
+    rows += [(TitleCredit.CREW, *person, order) for order, person in enumerate(crew)]
+
+    details = {
+        "runtime": runtime or None,
+        "status": body.get("status") or "",
+        "tagline": (body.get("tagline") or "")[:255],
+        "keywords": [keyword["name"] for keyword in keywords],
+    }
+    return details, rows
+
+
+def details_hash(details: dict, credits: list) -> str:
+    payload = json.dumps([details, credits], sort_keys=True, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def store_details(media_type: str, parsed: dict) -> int:
+    """
+    Write the details of one chunk, keyed by catalog id, in batched statements.
+
+    Every title's fetched_at moves forward; credits are only replaced for
+    titles whose details actually changed. Returns the number changed.
+    """
+    now = timezone.now()
+    content_type = ContentType.objects.get_for_model(MODELS[media_type])
+    stored = dict(
+        TitleDetails.objects
+        .filter(content_type=content_type, object_id__in=list(parsed))
+        .values_list('object_id', 'content_hash')
+    )
+    rows, credits, changed = [], [], []
+    for object_id, (details, credit_rows) in parsed.items():
+        digest = details_hash(details, credit_rows)
+        rows.append(TitleDetails(
+            content_type=content_type, object_id=object_id, content_hash=digest, fetched_at=now, **details
+        ))
+        if stored.get(object_id) != digest:
+            changed.append(object_id)
+            credits += [
+                TitleCredit(
+                    content_type=content_type, object_id=object_id,
+                    role=role, person_id=person_id, name=name[:255], credit=credit[:255], order=order,
+                )
+                for role, person_id, name, credit, order in credit_rows
+            ]
+
+    with transaction.atomic():
+        TitleDetails.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["content_type", "object_id"],
+            update_fields=["runtime", "status", "tagline", "keywords", "content_hash", "fetched_at"],
+        )
+        if changed:
+            TitleCredit.objects.filter(content_type=content_type, object_id__in=changed).delete()
+            TitleCredit.objects.bulk_create(credits, batch_size=1000)
+    return len(changed)
+
+
+def enrich_chunk(media_type: str, titles: list) -> dict:
+    """
+    Fetch and store details, credits and keywords for (id, tmdb_id) titles.
+
+    One request per title (credits and keywords are appended to it), at
+    most TMDB_FETCH_CONCURRENCY in flight and within the shared rate budget.
+    Titles TMDb no longer has are stored empty so the TTL applies to them;
+    failed titles are left stale and retried on the next run.
+    """
+    url = f"{settings.TMDB_API_URL}{DETAIL_URLS[media_type]}"
+    params = {"append_to_response": "credits,keywords"}
+    tmdb_to_id = {tmdb_id: object_id for object_id, tmdb_id in titles}
+    bodies, failed = get_many({tmdb_id: (url.format(tmdb_id), params) for tmdb_id in tmdb_to_id})
+
+    parsed = {
+        tmdb_to_id[tmdb_id]: parse_details(media_type, body or {})
+        for tmdb_id, body in bodies.items()
+    }
+    changed = store_details(media_type, parsed) if parsed else 0
+    return {"fetched": len(parsed), "changed": changed, "failed": len(failed)}
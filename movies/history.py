@@ -0,0 +1,200 @@
+import csv
+import io
+import logging
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .models import TrendingSnapshot
+from .sync import MODELS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TABLE = TrendingSnapshot._meta.db_table
+SNAPSHOT_COLUMNS = [
+    "content_type_id", "object_id", "captured_at", "rank", "popularity", "vote_average", "vote_count",
+]
+
+
+def title_type(media_type: str) -> ContentType:
+    return ContentType.objects.get_for_model(MODELS[media_type])
+
+
+def month_start(moment):
+    """First instant of the month containing moment, in UTC"""
+    moment = moment.astimezone(dt_timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def partition_name(moment) -> str:
+    """Name of the monthly partition holding moment"""
+    return f"{SNAPSHOT_TABLE}_y{moment.year}m{moment.month:02d}"
+
+
+def ensure_partition(cursor, moment):
+    """Create the monthly partition for moment if it does not exist yet"""
+    start = month_start(moment)
+    end = month_start(start + timedelta(days=32))
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {SNAPSHOT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def maintain_partitions(moment):
+    """
+    Create the partitions for moment's month and the next, and drop expired
+    ones. Concurrent runs (the movie and tv snapshots of one workflow) take
+    turns on an advisory lock, so a month rollover is created exactly once
+    and the next month already exists before the first run that needs it.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [SNAPSHOT_TABLE])
+        ensure_partition(cursor, moment)
+        ensure_partition(cursor, month_start(moment) + timedelta(days=32))
+        drop_expired_partitions(cursor, moment)
+
+
+def drop_expired_partitions(cursor, now):
+    """Drop monthly partitions older than TRENDING_HISTORY_MONTHS; far cheaper than DELETE"""
+    cutoff = partition_name(month_start(now - timedelta(days=31 * settings.TRENDING_HISTORY_MONTHS)))
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = %s",
+        [SNAPSHOT_TABLE],
+    )
+    for (name,) in cursor.fetchall():
+        # yYYYYmMM suffixes sort chronologically
+        if name < cutoff:
+            cursor.execute(f"DROP TABLE IF EXISTS {name}")
+            logger.info(f"Dropped expired trending history partition {name}")
+
+
+def record_snapshot(media_type: str, items: list, captured_at=None) -> int:
+    """
+    Append the rank, popularity and votes of one trending run.
+
+    Rows reference the catalog record of each item; items not in the catalog
+    keep their place in the ranking but are not recorded. Rows are streamed
+    in with COPY into the monthly partition for the run, once the partitions
+    are in place. Returns the number of rows written.
+    """
+    captured_at = captured_at or timezone.now()
+    content_type = title_type(media_type)
+    catalog_ids = dict(
+        MODELS[media_type].objects
+        .filter(tmdb_id__in=[item["id"] for item in items])
+        .values_list("tmdb_id", "pk")
+    )
+    seen = set()
+    written = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for item in items:
+        if item["id"] in seen:
+            continue
+        seen.add(item["id"])
+        if item["id"] not in catalog_ids:
+            continue
+        writer.writerow([
+            content_type.pk, catalog_ids[item["id"]], captured_at.isoformat(), len(seen),
+            item.get("popularity") or 0.0, item.get("vote_average") or 0.0, item.get("vote_count") or 0,
+        ])
+        written += 1
+    if not written:
+        return 0
+    buffer.seek(0)
+
+    maintain_partitions(captured_at)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {SNAPSHOT_TABLE} ({', '.join(SNAPSHOT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+    logger.info(f"Recorded trending {media_type} snapshot of {written} titles at {captured_at}")
+    return written
+
+
+def latest_run(media_type: str, before=None):
+    """Capture time of the most recent run, optionally strictly before a moment"""
+    snapshots = TrendingSnapshot.objects.filter(content_type=title_type(media_type))
+    if before is not None:
+        snapshots = snapshots.filter(captured_at__lt=before)
+    return snapshots.aggregate(latest=Max("captured_at"))["latest"]
+
+
+def run_snapshots(media_type: str, captured_at) -> list:
+    """Every row of one run, best rank first"""
+    return list(
+        TrendingSnapshot.objects
+        .filter(content_type=title_type(media_type), captured_at=captured_at)
+        .order_by("rank")
+    )
+
+
+def rising_titles(media_type: str, hours: int = 24) -> list:
+    """
+    Titles that climbed the ranking, comparing the latest run with the one
+    in effect `hours` earlier. Biggest climbers first.
+    """
+    latest = latest_run(media_type)
+    if latest is None:
+        return []
+    # Fall back to the previous run while history is shorter than the window
+    baseline = (
+        latest_run(media_type, before=latest - timedelta(hours=hours))
+        or latest_run(media_type, before=latest)
+    )
+    if baseline is None:
+        return []
+
+    previous = {s.object_id: s for s in run_snapshots(media_type, baseline)}
+    rising = []
+    for snapshot in run_snapshots(media_type, latest):
+        before = previous.get(snapshot.object_id)
+        if before and before.rank > snapshot.rank:
+            rising.append({
+                "snapshot": snapshot,
+                "previous_rank": before.rank,
+                "rank_change": before.rank - snapshot.rank,
+                "popularity_change": snapshot.popularity - before.popularity,
+            })
+    rising.sort(key=lambda entry: (-entry["rank_change"], entry["snapshot"].rank))
+    return rising
+
+
+def new_entries(media_type: str, days: int = 7) -> list:
+    """Titles in the latest run that were not trending at any point in the previous `days` days"""
+    latest = latest_run(media_type)
+    if latest is None:
+        return []
+
+    content_type = title_type(media_type)
+    seen_before = TrendingSnapshot.objects.filter(
+        content_type=content_type,
+        object_id=OuterRef("object_id"),
+        captured_at__gte=latest - timedelta(days=days),
+        captured_at__lt=latest,
+    )
+    return list(
+        TrendingSnapshot.objects
+        .filter(content_type=content_type, captured_at=latest)
+        .exclude(Exists(seen_before))
+        .order_by("rank")
+    )
+
+
+def title_history(title, days: int = 30) -> list:
+    """Snapshots of one catalog title over the last `days` days, oldest first"""
+    return list(
+        title.trending_snapshots
+        .filter(captured_at__gte=timezone.now() - timedelta(days=days))
+        .order_by("captured_at")
+    )
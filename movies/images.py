@@ -0,0 +1,192 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+
+import requests
+from django.conf import settings
+from PIL import Image
+
+from .tmdb import get_session
+
+logger = logging.getLogger(__name__)
+
+# Widths served by the proxy, named like TMDb's own size variants
+SIZES = {"w92": 92, "w185": 185, "w342": 342, "w780": 780}
+
+# Output format name: (Pillow format, content type)
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+# TMDb image paths are a single file name; anything else is not proxied
+IMAGE_PATH = re.compile(r"^/?[A-Za-z0-9_-]+\.(jpg|jpeg|png)$")
+
+_usage_lock = threading.Lock()
+# Bytes in the cache as of the last scan, plus what this process wrote since
+_usage = {"bytes": None, "written": 0}
+
+
+class ImageNotFound(Exception):
+    """The original image does not exist upstream or is not a valid image"""
+
+
+def cache_file(*parts) -> str:
+    """
+    Location of a cached blob, addressed by the digest of what it holds:
+    the source path and, for variants, the size and format.
+    """
+    digest = hashlib.sha256(":".join(parts).encode()).hexdigest()
+    return os.path.join(settings.IMAGE_CACHE_DIR, digest[:2], digest)
+
+
+def touch(path: str) -> bool:
+    """Whether a blob is cached; a hit moves it to the back of the LRU order"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def write_cached(path: str, data: bytes):
+    """
+    Store a blob atomically and keep the cache under IMAGE_CACHE_MAX_BYTES.
+
+    The directory is only rescanned when this process's running total goes
+    over the cap, or after it wrote a tenth of the cap since the last scan
+    (other processes write too), so most writes cost no scan at all.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    cap = settings.IMAGE_CACHE_MAX_BYTES
+    with _usage_lock:
+        _usage["written"] += len(data)
+        if (_usage["bytes"] is None or _usage["written"] > cap // 10
+                or _usage["bytes"] + _usage["written"] > cap):
+            _usage["bytes"], _usage["written"] = evict(cap), 0
+
+
+def evict(cap: int) -> int:
+    """Delete least recently used blobs until the cache fits in cap bytes; returns the size left"""
+    entries = []
+    total = 0
+    for shard in os.scandir(settings.IMAGE_CACHE_DIR):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if entry.name.endswith(".tmp"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    if total > cap:
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= cap:
+                break
+    return total
+
+
+def read_cached(path: str):
+    """Cached bytes, or None on a miss"""
+    if touch(path):
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted between the two calls
+            pass
+    return None
+
+
+def fetch_original(image_path: str) -> bytes:
+    """The full-size image from TMDb's image CDN, fetched at most once while cached"""
+    path = cache_file(image_path)
+    data = read_cached(path)
+    if data is not None:
+        return data
+
+    url = f"{settings.TMDB_IMAGE_URL}/{image_path.lstrip('/')}"
+    try:
+        response = get_session().get(url, timeout=settings.TMDB_FETCH_TIMEOUT)
+        if response.status_code == 404:
+            raise ImageNotFound(image_path)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch image {url}: {e}")
+        raise
+    write_cached(path, response.content)
+    return response.content
+
+
+def resize(original: bytes, width: int, output: str) -> bytes:
+    """Scale an image down to `width` (never up), encoded in the given output format"""
+    try:
+        image = Image.open(io.BytesIO(original))
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageNotFound(str(e))
+
+    if image.width > width:
+        image.thumbnail((width, round(image.height * width / image.width)), Image.LANCZOS)
+    pil_format, _ = FORMATS[output]
+    if pil_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, quality=settings.IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def get_variant(image_path: str, size: str, output: str):
+    """
+    A size variant of a TMDb image as (bytes, content type).
+
+    Served from the disk cache when present; otherwise generated from the
+    cached or freshly fetched original. Raises ImageNotFound for missing or
+    undecodable originals and ValueError for unknown sizes, formats or paths.
+    """
+    if size not in SIZES or output not in FORMATS or not IMAGE_PATH.match(image_path):
+        raise ValueError(f"Unsupported image {size}/{image_path} as {output}")
+
+    image_path = "/" + image_path.lstrip("/")
+    path = cache_file(image_path, size, output)
+    data = read_cached(path)
+    if data is None:
+        data = resize(fetch_original(image_path), SIZES[size], output)
+        write_cached(path, data)
+    return data, FORMATS[output][1]
+
+
+def prefetch_variants(image_paths) -> int:
+    """Generate every size and format of the given images that is not cached yet"""
+    generated = 0
+    for image_path in image_paths:
+        image_path = "/" + image_path.lstrip("/")
+        missing = [
+            (size, output) for size in SIZES for output in FORMATS
+            if not os.path.exists(cache_file(image_path, size, output))
+        ]
+        for size, output in missing:
+            try:
+                get_variant(image_path, size, output)
+                generated += 1
+            except (ImageNotFound, ValueError, requests.RequestException) as e:
+                logger.warning(f"Skipped prefetching {image_path}: {e}")
+                break
+    return generated
@@ -0,0 +1,113 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the app with gunicorn once per SERVER_MODE (sync WSGI workers, then uvicorn "
+        "ASGI workers) and compare their throughput and latency over HTTP on the read endpoints"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="gunicorn workers per server")
+        parser.add_argument("--concurrency", type=int, default=16, help="concurrent client connections")
+        parser.add_argument("--requests", type=int, default=400, help="requests per endpoint and mode")
+
+    def handle(self, *args, **options):
+        pk = Movie.objects.values_list("pk", flat=True).first()
+        if pk is None:
+            raise CommandError("The catalog is empty; ingest or seed some titles first")
+
+        paths = ["/movies/", f"/movies/{pk}/", "/movies/trending/", "/trending/all/"]
+        servers = {}
+        try:
+            for mode in ("wsgi", "asgi"):
+                servers[mode] = self.start(mode, options["workers"])
+            for path in paths:
+                bodies = {mode: self.fetch(url, path) for mode, (_, url) in servers.items()}
+                if any(response.status_code != 200 for response in bodies.values()):
+                    statuses = {mode: response.status_code for mode, response in bodies.items()}
+                    self.stdout.write(f"{path}: skipped, answered {statuses}")
+                    continue
+                if bodies["wsgi"].content != bodies["asgi"].content:
+                    raise CommandError(f"{path}: the asgi server's output differs from the wsgi server's")
+
+                results = {
+                    mode: self.load(url, path, options["concurrency"], options["requests"])
+                    for mode, (_, url) in servers.items()
+                }
+                self.stdout.write(f"{path}: " + ", ".join(
+                    f"{mode} {rate:.0f} req/s p50 {p50:.1f}ms p95 {p95:.1f}ms"
+                    for mode, (rate, p50, p95) in results.items()
+                ) + f" ({results['asgi'][0] / results['wsgi'][0]:.2f}x)")
+            self.stdout.write(
+                f"{options['workers']} workers per server, {options['concurrency']} connections, "
+                f"{options['requests']} requests per endpoint, output identical"
+            )
+        finally:
+            for process, _ in servers.values():
+                process.terminate()
+                process.wait()
+
+    def start(self, mode: str, workers: int):
+        """A gunicorn server configured by gunicorn.conf.py for the mode, once it accepts requests"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+             "--log-level", "warning"],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "SERVER_MODE": mode},
+            stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                requests.get(url + "/movies/", timeout=5)
+                return process, url
+            except requests.RequestException:
+                time.sleep(0.5)
+        process.terminate()
+        process.wait()
+        raise CommandError(f"The {mode} server did not start")
+
+    def fetch(self, url: str, path: str, session=requests):
+        # One Host for both servers, so the pagination links in the bodies match
+        headers = {"Accept": "application/json", "Host": settings.ALLOWED_HOSTS[0]}
+        return session.get(url + path, headers=headers, timeout=30)
+
+    def load(self, url: str, path: str, concurrency: int, total: int):
+        """(requests per second, p50 ms, p95 ms) from concurrent keep-alive connections"""
+        def worker(count):
+            latencies = []
+            with requests.Session() as session:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = self.fetch(url, path, session)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f"{path} answered {response.status_code} under load")
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = sorted(sum(pool.map(worker, [total // concurrency] * concurrency), []))
+        elapsed = time.perf_counter() - started
+        return (
+            len(latencies) / elapsed,
+            statistics.median(latencies),
+            latencies[int(len(latencies) * 0.95) - 1],
+        )
@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from movies.views import MovieViewSet, TvShowViewSet
+
+VIEWSETS = {"movie": (MovieViewSet, "/movies/"), "tv": (TvShowViewSet, "/tvshows/")}
+
+
+class Command(BaseCommand):
+    help = "Compare the serializer read path with the fast read path on list and detail pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--media-type", choices=list(VIEWSETS), default="movie")
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--iterations", type=int, default=200)
+
+    def handle(self, *args, **options):
+        viewset, path = VIEWSETS[options["media_type"]]
+        pk = viewset.queryset.values_list("pk", flat=True).first()
+        if pk is None:
+            raise CommandError("The catalog is empty; ingest or seed some titles first")
+
+        factory = APIRequestFactory()
+        cases = [
+            ("list", {"get": "list"}, f"{path}?page_size={options['page_size']}", {}),
+            ("retrieve", {"get": "retrieve"}, f"{path}{pk}/", {"pk": pk}),
+        ]
+        for name, actions, url, kwargs in cases:
+            baseline = viewset.as_view(actions, fast_reads=False, renderer_classes=[JSONRenderer])
+            fast = viewset.as_view(actions, fast_reads=True)
+
+            def call(view):
+                request = factory.get(url, HTTP_ACCEPT="application/json", HTTP_HOST=settings.ALLOWED_HOSTS[0])
+                response = view(request, **kwargs)
+                return response.render().content
+
+            if call(baseline) != call(fast):
+                raise CommandError(f"{name}: fast path output differs from the serializer output")
+
+            rates = {}
+            for label, view in (("serializer", baseline), ("fast", fast)):
+                started = time.perf_counter()
+                for _ in range(options["iterations"]):
+                    call(view)
+                rates[label] = options["iterations"] / (time.perf_counter() - started)
+
+            self.stdout.write(
+                f"{name} {url}: serializer {rates['serializer']:.0f} req/s, "
+                f"fast {rates['fast']:.0f} req/s ({rates['fast'] / rates['serializer']:.1f}x), output identical"
+            )
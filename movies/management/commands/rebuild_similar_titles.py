@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from movies.similarity import MODELS, rebuild_similar_titles
+from movies.versioning import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar-title lists of the whole catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--media-type", choices=list(MODELS), action="append", dest="media_types",
+            help="Only rebuild this media type (repeatable; default: all)",
+        )
+
+    def handle(self, *args, **options):
+        for media_type in options["media_types"] or MODELS:
+            written = rebuild_similar_titles(media_type)
+            self.stdout.write(self.style.SUCCESS(f"Similar {media_type} titles: rebuilt {written} lists"))
+        bump_catalog_version()
@@ -0,0 +1,42 @@
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.tasks import TRENDING_URLS, fetch_trending_page_range, page_ranges, store_trending
+from movies.trending import get_redis, ids_key, publish_trending, rank_from_database
+
+
+class Command(BaseCommand):
+    help = "Warm the trending cache so the trending endpoints never start cold"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fetch", action="store_true",
+            help="Fetch fresh trending data from TMDb in this process instead of seeding from the catalog",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Rebuild even when a trending list is already published",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.warm(options)
+        except redis.RedisError as e:
+            # The first requests seed the lists themselves; never hold the server back over it
+            self.stderr.write(self.style.WARNING(f"Trending cache unavailable, not warmed: {e}"))
+
+    def warm(self, options):
+        for media_type in TRENDING_URLS:
+            if not options["force"] and get_redis().exists(ids_key(media_type)):
+                self.stdout.write(f"Trending {media_type}: already published, skipping")
+                continue
+
+            if options["fetch"]:
+                ranges = page_ranges(settings.TMDB_TRENDING_PAGES, settings.TMDB_PAGES_PER_TASK)
+                pages = [fetch_trending_page_range(media_type, start, end) for start, end in ranges]
+                stored = store_trending(pages, media_type)["items"]
+            else:
+                stored = publish_trending(media_type, rank_from_database(media_type), fresh=False)
+
+            self.stdout.write(self.style.SUCCESS(f"Trending {media_type}: published {stored} items"))
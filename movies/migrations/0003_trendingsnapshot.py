@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+# Range-partitioned by month on captured_at; ingestion creates each month's
+# partition on first write and drops expired ones. Columns are ordered to
+# avoid alignment padding. Indexes are declared on the parent so every
+# partition inherits them.
+CREATE_SNAPSHOT_TABLE = """
+CREATE TABLE movies_trendingsnapshot (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    captured_at timestamp with time zone NOT NULL,
+    popularity double precision NOT NULL,
+    vote_average double precision NOT NULL,
+    tmdb_id integer NOT NULL,
+    vote_count integer NOT NULL,
+    rank smallint NOT NULL,
+    media_type varchar(5) NOT NULL,
+    PRIMARY KEY (id, captured_at)
+) PARTITION BY RANGE (captured_at);
+CREATE INDEX movies_trendingsnapshot_run_idx
+    ON movies_trendingsnapshot (media_type, captured_at, rank);
+CREATE INDEX movies_trendingsnapshot_title_idx
+    ON movies_trendingsnapshot (media_type, tmdb_id, captured_at);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_type', models.CharField(max_length=5)),
+                ('tmdb_id', models.IntegerField()),
+                ('captured_at', models.DateTimeField()),
+                ('rank', models.SmallIntegerField()),
+                ('popularity', models.FloatField()),
+                ('vote_average', models.FloatField()),
+                ('vote_count', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'movies_trendingsnapshot',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(
+            CREATE_SNAPSHOT_TABLE,
+            reverse_sql="DROP TABLE IF EXISTS movies_trendingsnapshot CASCADE;",
+        ),
+    ]
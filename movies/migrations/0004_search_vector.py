@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# Fill search_vector for rows written before upserts started maintaining it
+BACKFILL_SQL = """
+UPDATE movies_movie SET search_vector =
+    setweight(to_tsvector('{config}', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('{config}', coalesce(original_title, '')), 'B') ||
+    setweight(to_tsvector('{config}', coalesce(overview, '')), 'C');
+UPDATE movies_tvshow SET search_vector =
+    setweight(to_tsvector('{config}', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('{config}', coalesce(original_name, '')), 'B') ||
+    setweight(to_tsvector('{config}', coalesce(overview, '')), 'C');
+""".format(config=settings.SEARCH_CONFIG)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_trendingsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tvshow',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='movie_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tvshow',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='tvshow_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:35
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-popularity', '-id'], name='movie_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['genre_ids'], name='movie_genre_ids_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['original_language', '-popularity'], name='movie_language_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['release_date', '-popularity'], name='movie_release_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['vote_count', '-popularity'], name='movie_vote_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tvshow',
+            index=models.Index(fields=['-popularity', '-id'], name='tvshow_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tvshow',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['genre_ids'], name='tvshow_genre_ids_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tvshow',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['origin_country'], name='tvshow_origin_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tvshow',
+            index=models.Index(fields=['original_language', '-popularity'], name='tvshow_language_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tvshow',
+            index=models.Index(fields=['first_air_date', '-popularity'], name='tvshow_first_air_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tvshow',
+            index=models.Index(fields=['vote_count', '-popularity'], name='tvshow_vote_count_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_catalog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='movie',
+            options={'ordering': ['-popularity', '-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='tvshow',
+            options={'ordering': ['-popularity', '-id']},
+        ),
+    ]
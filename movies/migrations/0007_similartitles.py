@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:39
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_popularity_id_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarTitles',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_type', models.CharField(max_length=5)),
+                ('object_id', models.IntegerField()),
+                ('neighbour_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('scores', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=list, size=None)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('media_type', 'object_id'), name='unique_similar_titles')],
+            },
+        ),
+    ]
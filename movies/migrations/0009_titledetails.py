@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:59
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleCredit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_type', models.CharField(max_length=5)),
+                ('object_id', models.IntegerField()),
+                ('role', models.CharField(choices=[('cast', 'Cast'), ('crew', 'Crew')], max_length=4)),
+                ('person_id', models.IntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('credit', models.CharField(blank=True, max_length=255)),
+                ('order', models.SmallIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['media_type', 'object_id', 'role', 'order'], name='title_credit_title_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TitleDetails',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_type', models.CharField(max_length=5)),
+                ('object_id', models.IntegerField()),
+                ('runtime', models.PositiveIntegerField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('tagline', models.CharField(blank=True, max_length=255)),
+                ('keywords', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, default=list, size=None)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=32)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('media_type', 'object_id'), name='unique_title_details')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:02
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+# media_type values and the catalog models they name
+TITLE_MODELS = {"movie": "movie", "tv": "tvshow"}
+
+
+def set_content_types(apps, schema_editor):
+    """Point each list at its title's content type and drop lists of deleted titles"""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    SimilarTitles = apps.get_model("movies", "SimilarTitles")
+    for media_type, model_name in TITLE_MODELS.items():
+        content_type, _ = ContentType.objects.get_or_create(app_label="movies", model=model_name)
+        titles = apps.get_model("movies", model_name).objects.values("pk")
+        entries = SimilarTitles.objects.filter(media_type=media_type)
+        entries.exclude(object_id__in=titles).delete()
+        entries.update(content_type=content_type)
+    SimilarTitles.objects.filter(content_type__isnull=True).delete()
+
+
+def set_media_types(apps, schema_editor):
+    SimilarTitles = apps.get_model("movies", "SimilarTitles")
+    for media_type, model_name in TITLE_MODELS.items():
+        SimilarTitles.objects.filter(content_type__model=model_name).update(media_type=media_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('movies', '0009_titledetails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similartitles',
+            name='content_type',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AlterField(
+            model_name='similartitles',
+            name='media_type',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.RemoveConstraint(
+            model_name='similartitles',
+            name='unique_similar_titles',
+        ),
+        migrations.RunPython(set_content_types, set_media_types),
+        migrations.RemoveField(
+            model_name='similartitles',
+            name='media_type',
+        ),
+        migrations.AlterField(
+            model_name='similartitles',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AlterField(
+            model_name='similartitles',
+            name='object_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='similartitles',
+            name='neighbour_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None),
+        ),
+        migrations.AddConstraint(
+            model_name='similartitles',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_similar_titles'),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# media_type values and the catalog models they name
+TITLE_MODELS = {"movie": "movie", "tv": "tvshow"}
+
+
+def set_content_types(apps, schema_editor):
+    """Point details and credits at their title's content type and drop those of deleted titles"""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    for model_name in ("TitleDetails", "TitleCredit"):
+        model = apps.get_model("movies", model_name)
+        for media_type, title_model in TITLE_MODELS.items():
+            content_type, _ = ContentType.objects.get_or_create(app_label="movies", model=title_model)
+            titles = apps.get_model("movies", title_model).objects.values("pk")
+            rows = model.objects.filter(media_type=media_type)
+            rows.exclude(object_id__in=titles).delete()
+            rows.update(content_type=content_type)
+        model.objects.filter(content_type__isnull=True).delete()
+
+
+def set_media_types(apps, schema_editor):
+    for model_name in ("TitleDetails", "TitleCredit"):
+        model = apps.get_model("movies", model_name)
+        for media_type, title_model in TITLE_MODELS.items():
+            model.objects.filter(content_type__model=title_model).update(media_type=media_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('movies', '0010_similartitles_content_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='titlecredit',
+            name='content_type',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='titledetails',
+            name='content_type',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AlterField(
+            model_name='titlecredit',
+            name='media_type',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.AlterField(
+            model_name='titledetails',
+            name='media_type',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.RemoveIndex(
+            model_name='titlecredit',
+            name='title_credit_title_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='titledetails',
+            name='unique_title_details',
+        ),
+        migrations.RunPython(set_content_types, set_media_types),
+        migrations.RemoveField(
+            model_name='titlecredit',
+            name='media_type',
+        ),
+        migrations.RemoveField(
+            model_name='titledetails',
+            name='media_type',
+        ),
+        migrations.AlterField(
+            model_name='titlecredit',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AlterField(
+            model_name='titledetails',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AlterField(
+            model_name='titlecredit',
+            name='object_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='titledetails',
+            name='object_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='titlecredit',
+            index=models.Index(fields=['content_type', 'object_id', 'role', 'order'], name='title_credit_title_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='titledetails',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_title_details'),
+        ),
+    ]
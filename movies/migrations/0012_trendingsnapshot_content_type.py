@@ -0,0 +1,114 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# media_type values and the catalog tables they name
+TITLE_TABLES = {"movie": ("movie", "movies_movie"), "tv": ("tvshow", "movies_tvshow")}
+
+# Snapshots of titles missing from the catalog cannot be pointed at a
+# record and are dropped. Altering the parent alters every partition.
+# content_type_id has no database constraint: flush truncates
+# django_content_type but skips unmanaged tables, so a reference from
+# here would make it fail.
+ADD_COLUMNS = """
+ALTER TABLE movies_trendingsnapshot
+    ADD COLUMN object_id bigint,
+    ADD COLUMN content_type_id integer;
+"""
+SET_TITLE = """
+UPDATE movies_trendingsnapshot snapshot
+SET content_type_id = %s, object_id = title.id
+FROM {table} title
+WHERE snapshot.media_type = %s AND title.tmdb_id = snapshot.tmdb_id;
+"""
+REPLACE_COLUMNS = """
+DELETE FROM movies_trendingsnapshot WHERE object_id IS NULL;
+ALTER TABLE movies_trendingsnapshot
+    ALTER COLUMN object_id SET NOT NULL,
+    ALTER COLUMN content_type_id SET NOT NULL,
+    DROP COLUMN media_type,
+    DROP COLUMN tmdb_id;
+CREATE INDEX movies_trendingsnapshot_run_idx
+    ON movies_trendingsnapshot (content_type_id, captured_at, rank);
+CREATE INDEX movies_trendingsnapshot_title_idx
+    ON movies_trendingsnapshot (content_type_id, object_id, captured_at);
+"""
+
+RESTORE_COLUMNS = """
+ALTER TABLE movies_trendingsnapshot
+    ADD COLUMN tmdb_id integer,
+    ADD COLUMN media_type varchar(5);
+"""
+SET_TMDB_ID = """
+UPDATE movies_trendingsnapshot snapshot
+SET media_type = %s, tmdb_id = title.tmdb_id
+FROM {table} title
+WHERE snapshot.content_type_id = %s AND title.id = snapshot.object_id;
+"""
+DROP_TITLE_COLUMNS = """
+ALTER TABLE movies_trendingsnapshot
+    ALTER COLUMN tmdb_id SET NOT NULL,
+    ALTER COLUMN media_type SET NOT NULL,
+    DROP COLUMN content_type_id,
+    DROP COLUMN object_id;
+CREATE INDEX movies_trendingsnapshot_run_idx
+    ON movies_trendingsnapshot (media_type, captured_at, rank);
+CREATE INDEX movies_trendingsnapshot_title_idx
+    ON movies_trendingsnapshot (media_type, tmdb_id, captured_at);
+"""
+
+
+def content_type_ids(apps):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    for media_type, (model, table) in TITLE_TABLES.items():
+        content_type, _ = ContentType.objects.get_or_create(app_label="movies", model=model)
+        yield media_type, table, content_type.pk
+
+
+def reference_titles(apps, schema_editor):
+    """Point each snapshot at its catalog record instead of a TMDb id"""
+    schema_editor.execute(ADD_COLUMNS)
+    for media_type, table, content_type_id in content_type_ids(apps):
+        schema_editor.execute(SET_TITLE.format(table=table), [content_type_id, media_type])
+    # The old indexes go with the columns they cover
+    schema_editor.execute(REPLACE_COLUMNS)
+
+
+def restore_tmdb_ids(apps, schema_editor):
+    schema_editor.execute(RESTORE_COLUMNS)
+    for media_type, table, content_type_id in content_type_ids(apps):
+        schema_editor.execute(SET_TMDB_ID.format(table=table), [media_type, content_type_id])
+    schema_editor.execute(DROP_TITLE_COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('movies', '0011_titledetails_content_type'),
+    ]
+
+    # TrendingSnapshot is unmanaged: the field operations only update the
+    # migration state, the partitioned table is altered by hand
+    operations = [
+        migrations.RunPython(reference_titles, restore_tmdb_ids),
+        migrations.RemoveField(
+            model_name='trendingsnapshot',
+            name='media_type',
+        ),
+        migrations.RemoveField(
+            model_name='trendingsnapshot',
+            name='tmdb_id',
+        ),
+        migrations.AddField(
+            model_name='trendingsnapshot',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='trendingsnapshot',
+            name='object_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
@@ -1,10 +1,47 @@
 from django.db import models
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.conf import settings
 import uuid
 
 
-class Movie(models.Model):
+def weighted_search_vector(weights: dict):
+    """Weighted SearchVector over the given text columns"""
+    vectors = [
+        SearchVector(column, weight=weight, config=settings.SEARCH_CONFIG)
+        for column, weight in weights.items()
+    ]
+    combined = vectors[0]
+    for vector in vectors[1:]:
+        combined = combined + vector
+    return combined
+
+
+class SearchableModel(models.Model):
+    """
+    Keeps search_vector current for records written through the ORM.
+    Bulk upserts build the same vector in SQL from search_weights.
+    """
+    search_weights = {}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        type(self).objects.filter(pk=self.pk).update(
+            search_vector=weighted_search_vector(self.search_weights)
+        )
+
+    class Meta:
+        abstract = True
+
+
+class Movie(SearchableModel):
     """Model to store movies from tmdb"""
+    # Text columns indexed for full-text search; titles outrank the overview
+    search_weights = {"title": "A", "original_title": "B", "overview": "C"}
+
     tmdb_id = models.IntegerField(unique=True)
     backdrop_path = models.CharField(max_length=255, blank=True, null=True)
     title = models.CharField(max_length=255)
@@ -19,15 +56,32 @@ class Movie(models.Model):
     video = models.BooleanField(default=False)
     vote_average = models.FloatField(default=0.0)
     vote_count = models.IntegerField(default=0)
+    content_hash = models.CharField(max_length=32, blank=True, default="")
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Reverse generic relations, so deleting a title deletes its derived rows
+    similar_titles = GenericRelation("SimilarTitles")
+    title_details = GenericRelation("TitleDetails")
+    credits = GenericRelation("TitleCredit")
+    trending_snapshots = GenericRelation("TrendingSnapshot")
 
     def __str__(self):
         return self.title
 
     class Meta:
-        ordering = ['-popularity']
+        ordering = ['-popularity', '-id']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='movie_search_vector_idx'),
+            models.Index(fields=['-popularity', '-id'], name='movie_popularity_idx'),
+            GinIndex(fields=['genre_ids'], name='movie_genre_ids_idx'),
+            models.Index(fields=['original_language', '-popularity'], name='movie_language_popularity_idx'),
+            models.Index(fields=['release_date', '-popularity'], name='movie_release_date_idx'),
+            models.Index(fields=['vote_count', '-popularity'], name='movie_vote_count_idx'),
+        ]
 
-class TvShow(models.Model):
+class TvShow(SearchableModel):
     """Model to store TV show from tmdb"""
+    search_weights = {"name": "A", "original_name": "B", "overview": "C"}
+
     tmdb_id = models.IntegerField(unique=True)
     backdrop_path = models.CharField(max_length=255, blank=True, null=True)
     name = models.CharField(max_length=255)
@@ -42,10 +96,122 @@ class TvShow(models.Model):
     vote_average = models.FloatField(default=0.0)
     vote_count = models.IntegerField(default=0)
     origin_country = ArrayField(models.CharField(max_length=10), blank=True, default=list)
+    content_hash = models.CharField(max_length=32, blank=True, default="")
+    search_vector = SearchVectorField(null=True, editable=False)
+    similar_titles = GenericRelation("SimilarTitles")
+    title_details = GenericRelation("TitleDetails")
+    credits = GenericRelation("TitleCredit")
+    trending_snapshots = GenericRelation("TrendingSnapshot")
 
     def __str__(self):
         return self.name
 
     class Meta:
-        ordering = ['-popularity']
+        ordering = ['-popularity', '-id']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='tvshow_search_vector_idx'),
+            models.Index(fields=['-popularity', '-id'], name='tvshow_popularity_idx'),
+            GinIndex(fields=['genre_ids'], name='tvshow_genre_ids_idx'),
+            GinIndex(fields=['origin_country'], name='tvshow_origin_country_idx'),
+            models.Index(fields=['original_language', '-popularity'], name='tvshow_language_popularity_idx'),
+            models.Index(fields=['first_air_date', '-popularity'], name='tvshow_first_air_date_idx'),
+            models.Index(fields=['vote_count', '-popularity'], name='tvshow_vote_count_idx'),
+        ]
+
+
+
+class TrendingSnapshot(models.Model):
+    """
+    A title's trending position in one ingestion run.
+
+    The table is range-partitioned by month on captured_at (see migrations
+    0003 and 0012), so the schema is managed by hand rather than by Django.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveBigIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    captured_at = models.DateTimeField()
+    rank = models.SmallIntegerField()
+    popularity = models.FloatField()
+    vote_average = models.FloatField()
+    vote_count = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.content_type.model} {self.object_id} #{self.rank} at {self.captured_at}"
+
+    class Meta:
+        managed = False
+        db_table = "movies_trendingsnapshot"
+
+
+class SimilarTitles(models.Model):
+    """Precomputed content-based neighbours of one catalog title, best first"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveBigIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    neighbour_ids = ArrayField(models.BigIntegerField(), default=list)
+    scores = ArrayField(models.FloatField(), default=list)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.content_type.model} {self.object_id}: {len(self.neighbour_ids)} neighbours"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='unique_similar_titles'),
+        ]
+
+
+class SyncWatermark(models.Model):
+    """How far an incremental TMDb sync has got; the next run resumes from here"""
+    name = models.CharField(max_length=50, unique=True)
+    synced_through = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} through {self.synced_through}"
+
+
+class TitleDetails(models.Model):
+    """Per-title details fetched by the enrichment stage, beyond the trending-list fields"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveBigIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    runtime = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=50, blank=True)
+    tagline = models.CharField(max_length=255, blank=True)
+    keywords = ArrayField(models.CharField(max_length=255), blank=True, default=list)
+    content_hash = models.CharField(max_length=32, blank=True, default="")
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.content_type.model} {self.object_id} details"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='unique_title_details'),
+        ]
+
+
+class TitleCredit(models.Model):
+    """One cast member or key crew member of a catalog title"""
+    CAST = "cast"
+    CREW = "crew"
 
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveBigIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    role = models.CharField(max_length=4, choices=[(CAST, "Cast"), (CREW, "Crew")])
+    person_id = models.IntegerField()
+    name = models.CharField(max_length=255)
+    # The character played for cast, the job for crew
+    credit = models.CharField(max_length=255, blank=True)
+    order = models.SmallIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.credit})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'role', 'order'], name='title_credit_title_idx'),
+        ]
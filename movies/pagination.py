@@ -0,0 +1,100 @@
+import base64
+import re
+
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode for lists.
+
+    Passing ?paginate=cursor (or a cursor from a previous response) switches
+    the list endpoints to keyset pagination on (popularity, id): each page
+    is an index range scan starting after the last row of the previous one,
+    so deep pages cost the same as the first and no OFFSET is used. The
+    COUNT(*) is skipped unless ?count=exact or ?count=estimate is given.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (
+            getattr(view, 'action', None) == 'list'
+            and (request.query_params.get('paginate') == 'cursor' or self.cursor_query_param in request.query_params)
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request.query_params.get('count'))
+
+        queryset = queryset.order_by('-popularity', '-id')
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            popularity, pk = self.decode_cursor(cursor)
+            table = queryset.model._meta.db_table
+            # Row comparison so Postgres can seek straight into the (popularity, id) index
+            queryset = queryset.extra(
+                where=[f'("{table}"."popularity", "{table}"."id") < (%s, %s)'],
+                params=[popularity, pk],
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        payload = {'next': self.get_next_cursor_link()}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_next_cursor_link(self):
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def encode_cursor(self, row):
+        # Rows are model instances, or dicts on the fast read path
+        popularity, pk = (row['popularity'], row['id']) if isinstance(row, dict) else (row.popularity, row.pk)
+        # repr() round-trips floats exactly, so ties on popularity resolve on id
+        return base64.urlsafe_b64encode(f"{popularity!r}:{pk}".encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            popularity, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+            return float(popularity), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+    def get_count(self, queryset, mode):
+        """Exact COUNT(*), a planner estimate, or nothing (the default)"""
+        if mode == 'exact':
+            return queryset.count()
+        if mode != 'estimate':
+            return None
+
+        if not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            return max(row[0], 0) if row else 0
+
+        match = re.search(r'rows=(\d+)', queryset.order_by().explain())
+        return int(match.group(1)) if match else None
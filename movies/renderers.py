@@ -0,0 +1,35 @@
+import re
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+# Floats json.dumps writes in exponent form (>= 1e16 or < 1e-4) come out
+# differently from orjson: 1e16 for 1e+16, 0.00001 or 1e-7 for 1e-05 / 1e-07
+EXPONENT = re.compile(rb'[0-9]e-?[0-9]|0\.0000')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same bytes through orjson.
+
+    Matches DRF's compact, non-ASCII-escaping output. Responses containing
+    a float that json.dumps would write in exponent form (rare; a string
+    that merely looks like one also counts) are rendered by JSONRenderer
+    instead, so the two renderers never disagree. Indented output and data
+    orjson cannot encode natively fall back the same way.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_UTC_Z)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if EXPONENT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping of the JavaScript line terminators as JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -1,12 +1,12 @@
 from rest_framework import serializers
-from .models import Movie, TvShow
+from .models import Movie, TvShow, TrendingSnapshot
 
 class MovieSerializer(serializers.ModelSerializer):
     media_type = serializers.SerializerMethodField()
 
     class Meta:
         model = Movie
-        fields = '__all__' 
+        exclude = ['content_hash', 'search_vector']
 
     def get_media_type(self, obj):
         return "movie"
@@ -17,7 +17,23 @@ class TvShowSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TvShow
-        fields = '__all__' 
+        exclude = ['content_hash', 'search_vector']
 
     def get_media_type(self, obj):
         return "tv"
+
+
+class TrendingSnapshotSerializer(serializers.ModelSerializer):
+    """One point of a title's trending history"""
+
+    class Meta:
+        model = TrendingSnapshot
+        fields = ["captured_at", "rank", "popularity", "vote_average", "vote_count"]
+
+
+TITLE_SERIALIZERS = {"movie": MovieSerializer, "tvshow": TvShowSerializer}
+
+
+def serialize_title(title):
+    """Serialize a Movie or TvShow with its own serializer"""
+    return TITLE_SERIALIZERS[title._meta.model_name](title).data
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Movie, TvShow
+from .versioning import bump_catalog_version
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=TvShow)
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=TvShow)
+def catalog_changed(sender, **kwargs):
+    """Titles written through the ORM (API writes, admin) change the catalog too"""
+    bump_catalog_version()
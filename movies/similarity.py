@@ -0,0 +1,227 @@
+import logging
+import math
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from .models import Movie, SimilarTitles, TvShow
+
+logger = logging.getLogger(__name__)
+
+MODELS = {"movie": Movie, "tv": TvShow}
+DATE_FIELDS = {"movie": "release_date", "tv": "first_air_date"}
+
+# TMDb's movie and TV genre ids; fixed so feature columns stay stable between runs
+GENRE_IDS = [
+    28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37,
+    10759, 10762, 10763, 10764, 10765, 10766, 10767, 10768,
+]
+GENRE_COLUMNS = {genre_id: column for column, genre_id in enumerate(GENRE_IDS)}
+LANGUAGE_BUCKETS = 32
+FIRST_DECADE, LAST_DECADE = 1920, 2030
+ERA_BUCKETS = (LAST_DECADE - FIRST_DECADE) // 10 + 1
+
+# Relative influence of each feature block on the cosine similarity
+GENRE_WEIGHT = 1.0
+LANGUAGE_WEIGHT = 0.6
+ERA_WEIGHT = 0.5
+VOTE_WEIGHT = 0.3
+POPULARITY_WEIGHT = 0.2
+
+LANGUAGE_OFFSET = len(GENRE_IDS)
+ERA_OFFSET = LANGUAGE_OFFSET + LANGUAGE_BUCKETS
+VOTE_COLUMN = ERA_OFFSET + ERA_BUCKETS
+POPULARITY_COLUMN = VOTE_COLUMN + 1
+FEATURES = POPULARITY_COLUMN + 1
+
+# Rows scored against the catalog per matrix multiply; bounds peak memory
+BATCH_SIZE = 1024
+
+
+def feature_matrix(media_type: str):
+    """
+    Build the L2-normalised feature matrix for a media type.
+
+    Columns: multi-hot genres, hashed original language, release decade,
+    vote average and log-scaled popularity, each block weighted so genres
+    dominate. Returns (ids, matrix) with one row per catalog title.
+    """
+    rows = list(MODELS[media_type].objects.order_by("id").values_list(
+        "id", "genre_ids", "original_language", DATE_FIELDS[media_type], "vote_average", "popularity",
+    ))
+    ids = []
+    matrix = np.zeros((len(rows), FEATURES), dtype=np.float32)
+    popularity_scale = math.log1p(1000)
+
+    for row_index, (pk, genre_ids, language, released, vote_average, popularity) in enumerate(rows):
+        ids.append(pk)
+        for genre_id in genre_ids or []:
+            if genre_id in GENRE_COLUMNS:
+                matrix[row_index, GENRE_COLUMNS[genre_id]] = GENRE_WEIGHT
+        if language:
+            matrix[row_index, LANGUAGE_OFFSET + zlib.crc32(language.encode()) % LANGUAGE_BUCKETS] = LANGUAGE_WEIGHT
+        if released:
+            decade = min(max(released.year // 10 * 10, FIRST_DECADE), LAST_DECADE)
+            matrix[row_index, ERA_OFFSET + (decade - FIRST_DECADE) // 10] = ERA_WEIGHT
+        matrix[row_index, VOTE_COLUMN] = VOTE_WEIGHT * (vote_average or 0.0) / 10
+        matrix[row_index, POPULARITY_COLUMN] = POPULARITY_WEIGHT * min(
+            math.log1p(popularity or 0.0) / popularity_scale, 1.0
+        )
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.array(ids, dtype=np.int64), matrix / norms
+
+
+def top_k(scores, k: int):
+    """
+    Column indexes and scores of the k best entries of each row, best first.
+    Equal scores go to the lower column, so the order is fully determined.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    thresholds = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+    columns = np.empty((scores.shape[0], k), dtype=np.int64)
+    for row, threshold in enumerate(thresholds):
+        # Everything tied with the k-th score competes for the last places
+        candidates = np.flatnonzero(scores[row] >= threshold)
+        columns[row] = candidates[np.lexsort((candidates, -scores[row, candidates]))[:k]]
+    return columns, np.take_along_axis(scores, columns, axis=1)
+
+
+def score_rows(matrix, rows, columns):
+    """Cosine similarities of rows against columns, at the precision they are stored with"""
+    return (matrix[rows] @ matrix[columns].T).astype(np.float64).round(4)
+
+
+def neighbour_rows(ids, matrix, row_indexes, k: int):
+    """Top-k neighbours of the given rows against the whole catalog, in batches"""
+    everything = np.arange(len(ids))
+    for start in range(0, len(row_indexes), BATCH_SIZE):
+        batch = row_indexes[start:start + BATCH_SIZE]
+        scores = score_rows(matrix, batch, everything)
+        scores[np.arange(len(batch)), batch] = -np.inf  # a title is not its own neighbour
+        columns, values = top_k(scores, k)
+        for offset, row_index in enumerate(batch):
+            finite = np.isfinite(values[offset])
+            yield (
+                int(ids[row_index]),
+                ids[columns[offset][finite]].tolist(),
+                values[offset][finite].tolist(),
+            )
+
+
+def save_neighbours(media_type: str, entries) -> int:
+    """Upsert neighbour lists in batches"""
+    now = timezone.now()
+    content_type = ContentType.objects.get_for_model(MODELS[media_type])
+    batch = []
+    written = 0
+    for object_id, neighbour_ids, scores in entries:
+        batch.append(SimilarTitles(
+            content_type=content_type, object_id=object_id,
+            neighbour_ids=neighbour_ids, scores=scores, updated_at=now,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            written += flush_neighbours(batch)
+            batch = []
+    return written + flush_neighbours(batch)
+
+
+def flush_neighbours(batch: list) -> int:
+    SimilarTitles.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=["content_type", "object_id"],
+        update_fields=["neighbour_ids", "scores", "updated_at"],
+    )
+    return len(batch)
+
+
+def rebuild_similar_titles(media_type: str) -> int:
+    """Recompute the neighbour list of every title"""
+    ids, matrix = feature_matrix(media_type)
+    written = save_neighbours(
+        media_type, neighbour_rows(ids, matrix, np.arange(len(ids)), settings.SIMILAR_TITLES_K)
+    )
+    logger.info(f"Rebuilt similar {media_type} titles for {written} titles")
+    return written
+
+
+def update_similar_titles(media_type: str, changed_ids: list) -> int:
+    """
+    Refresh neighbour lists after some titles were inserted or changed.
+
+    Changed titles get a full top-k against the catalog. Every other title
+    only merges the changed titles into its stored list: stored scores
+    between two unchanged titles are still valid, so the catalog is scored
+    against the changed rows alone (n x c rather than n x n). Titles with no
+    stored list are computed in full; with no lists at all this is a rebuild.
+    """
+    k = settings.SIMILAR_TITLES_K
+    ids, matrix = feature_matrix(media_type)
+    if not len(ids):
+        return 0
+
+    content_type = ContentType.objects.get_for_model(MODELS[media_type])
+    stored = {
+        entry.object_id: entry
+        for entry in SimilarTitles.objects.filter(content_type=content_type).only("object_id", "neighbour_ids", "scores")
+    }
+    if not stored:
+        return rebuild_similar_titles(media_type)
+
+    position = {int(pk): row_index for row_index, pk in enumerate(ids)}
+    changed = np.array(sorted({position[pk] for pk in changed_ids if pk in position}), dtype=np.int64)
+    missing = np.array([row_index for pk, row_index in position.items() if pk not in stored], dtype=np.int64)
+    recompute = np.union1d(changed, missing).astype(np.int64)
+    written = save_neighbours(media_type, neighbour_rows(ids, matrix, recompute, k))
+
+    if len(changed):
+        changed_set = {int(ids[row_index]) for row_index in changed}
+        others = np.setdiff1d(np.arange(len(ids)), recompute)
+        stale = []
+        written += save_neighbours(
+            media_type, merge_changed(ids, matrix, others, changed, changed_set, stored, k, stale)
+        )
+        # Lists a changed title dropped out of may now miss an unchanged title
+        written += save_neighbours(media_type, neighbour_rows(ids, matrix, np.array(stale, dtype=np.int64), k))
+        recompute = np.union1d(recompute, stale)
+
+    logger.info(f"Updated similar {media_type} titles: {len(recompute)} recomputed, {written} lists written")
+    return written
+
+
+def merge_changed(ids, matrix, others, changed, changed_set, stored, k, stale):
+    """
+    Yield the merged neighbour lists of unchanged titles whose list actually
+    changes. Rows where a listed changed title lost score cannot be merged
+    safely and are appended to stale for a full recompute instead.
+    """
+    changed_ids = ids[changed]
+    for start in range(0, len(others), BATCH_SIZE):
+        batch = others[start:start + BATCH_SIZE]
+        scores = score_rows(matrix, batch, changed)
+        for offset, row_index in enumerate(batch):
+            object_id = int(ids[row_index])
+            entry = stored[object_id]
+            new_scores = dict(zip(changed_ids.tolist(), scores[offset].tolist()))
+            if any(
+                neighbour in changed_set and new_scores[neighbour] < score
+                for neighbour, score in zip(entry.neighbour_ids, entry.scores)
+            ):
+                stale.append(row_index)
+                continue
+            kept = [
+                (neighbour, score) for neighbour, score in zip(entry.neighbour_ids, entry.scores)
+                if neighbour not in changed_set
+            ]
+            # Same order as top_k: ids ascend with matrix rows
+            merged = sorted(kept + list(new_scores.items()), key=lambda pair: (-pair[1], pair[0]))[:k]
+            if merged != list(zip(entry.neighbour_ids, entry.scores)):
+                yield object_id, [neighbour for neighbour, _ in merged], [score for _, score in merged]
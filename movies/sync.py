@@ -0,0 +1,112 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+
+from .models import Movie, SyncWatermark, TvShow
+from .tmdb import get_many
+
+logger = logging.getLogger(__name__)
+
+CHANGES_URLS = {
+    "movie": "/movie/changes",
+    "tv": "/tv/changes",
+}
+
+DETAIL_URLS = {
+    "movie": "/movie/{}",
+    "tv": "/tv/{}",
+}
+
+MODELS = {
+    "movie": Movie,
+    "tv": TvShow,
+}
+
+
+def watermark_name(media_type: str) -> str:
+    return f"changes:{media_type}"
+
+
+def get_watermark(media_type: str, now):
+    """Where the last successful sync stopped, or TMDB_SYNC_INITIAL_DAYS back on the first run"""
+    watermark = SyncWatermark.objects.filter(name=watermark_name(media_type)).first()
+    if watermark is None:
+        return now - timedelta(days=settings.TMDB_SYNC_INITIAL_DAYS)
+    return watermark.synced_through
+
+
+def set_watermark(media_type: str, synced_through):
+    SyncWatermark.objects.update_or_create(
+        name=watermark_name(media_type), defaults={"synced_through": synced_through}
+    )
+
+
+def change_windows(start, end) -> list:
+    """
+    Split start..end into (start_date, end_date) windows TMDb accepts.
+
+    The changes feed works in whole UTC days and allows at most
+    TMDB_CHANGES_MAX_DAYS per request. The watermark's own day is included
+    again, since changes later that day were not seen yet; refetching a
+    title twice costs a request but no write, thanks to content_hash.
+    """
+    first, last = start.date(), end.date()
+    span = timedelta(days=settings.TMDB_CHANGES_MAX_DAYS - 1)
+    windows = []
+    while first <= last:
+        window_end = min(first + span, last)
+        windows.append((first.isoformat(), window_end.isoformat()))
+        first = window_end + timedelta(days=1)
+    return windows
+
+
+def changed_tmdb_ids(media_type: str, start, end):
+    """
+    TMDb ids changed between start and end, as (ids, complete).
+
+    complete is False when any page could not be fetched, in which case
+    the watermark must not move past this range.
+    """
+    url = f"{settings.TMDB_API_URL}{CHANGES_URLS[media_type]}"
+    ids = set()
+    for start_date, end_date in change_windows(start, end):
+        params = {"start_date": start_date, "end_date": end_date}
+        pages, failed = get_many({1: (url, {**params, "page": 1})})
+        if failed:
+            return ids, False
+
+        first = pages[1] or {}
+        ids.update(item["id"] for item in first.get("results", []))
+        rest, failed = get_many({
+            page: (url, {**params, "page": page}) for page in range(2, first.get("total_pages", 1) + 1)
+        })
+        if failed:
+            return ids, False
+        for body in rest.values():
+            ids.update(item["id"] for item in (body or {}).get("results", []))
+    return ids, True
+
+
+def catalog_tmdb_ids(media_type: str, tmdb_ids: set) -> list:
+    """The changed ids that are titles we already store; the rest of TMDb is not ours to sync"""
+    return list(
+        MODELS[media_type].objects.filter(tmdb_id__in=list(tmdb_ids)).values_list('tmdb_id', flat=True)
+    )
+
+
+def as_list_item(details: dict) -> dict:
+    """Reshape a details payload like a list result so the trending parsers accept it"""
+    return {**details, "genre_ids": [genre["id"] for genre in details.get("genres", [])]}
+
+
+def fetch_details(media_type: str, tmdb_ids: list):
+    """
+    Refetch changed titles concurrently, as (items, failed ids).
+
+    Titles TMDb no longer has (404) are skipped and not counted as failures.
+    """
+    url = f"{settings.TMDB_API_URL}{DETAIL_URLS[media_type]}"
+    bodies, failed = get_many({tmdb_id: (url.format(tmdb_id), None) for tmdb_id in tmdb_ids})
+    items = [as_list_item(body) for body in bodies.values() if body is not None]
+    return items, failed
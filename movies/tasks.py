@@ -1,32 +1,25 @@
-import logging
-import requests
+import hashlib
 import json
+import logging
+import time
 from django.conf import settings
-from django.core.cache import cache
-from celery import shared_task
-from django.db import transaction
+from celery import chord, group, shared_task
+from django.db import connection, transaction
+from django.utils import timezone
+from psycopg2.extras import execute_values
 from datetime import datetime
+from .enrichment import enrich_chunk, stale_titles
 from .models import Movie, TvShow
+from .history import record_snapshot
+from .images import prefetch_variants
+from .similarity import update_similar_titles
+from .sync import catalog_tmdb_ids, changed_tmdb_ids, fetch_details, get_watermark, set_watermark
+from .tmdb import fetch_pages
+from .trending import publish_trending
+from .versioning import bump_catalog_version
 
 logger = logging.getLogger(__name__)
 
-def fetch_trending_data(url: str, total_pages: int) -> list:
-    """Fetch trending data from TMDb"""
-    all_results = []
-    for page in range(1, total_pages + 1):
-        params = {
-            'api_key': settings.TMDB_API_KEY,
-            'page': page
-        }
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            all_results.extend(data.get("results", []))
-        except requests.RequestException as e:
-            logger.error(f"Failed to fetch page {page} from {url}: {e}")
-    return all_results
-
 def parse_date(date_str):
     """Convert date string to a date object"""
     if not date_str:
@@ -36,124 +29,342 @@ def parse_date(date_str):
     except ValueError:
         return None
 
-def bulk_upsert_movies(movies: list):
-    """Bulk upsert movie records and cache the results"""
-    if not movies:
-        return
-
-    movie_ids = [movie["id"] for movie in movies]
-
-    # Fetch existing movies by their TMDb id
-    existing_movies = {m.tmdb_id: m for m in Movie.objects.filter(tmdb_id__in=movie_ids)}
-
-    movies_to_create = []
-    movies_to_update = []
-
-    for movie in movies:
-        parsed_data = {
-            "tmdb_id": movie["id"],
-            "backdrop_path": movie.get("backdrop_path", ""),
-            "title": movie.get("title", ""),
-            "original_title": movie.get("original_title", ""),
-            "overview": movie.get("overview", ""),
-            "poster_path": movie.get("poster_path", ""),
-            "adult": movie.get("adult", False),
-            "original_language": movie.get("original_language", ""),
-            "genre_ids": movie.get("genre_ids", []), 
-            "popularity": movie.get("popularity", 0.0),
-            "release_date": parse_date(movie.get("release_date")),
-            "video": movie.get("video", False),
-            "vote_average": movie.get("vote_average", 0.0),
-            "vote_count": movie.get("vote_count", 0)
-        }
-
-        if parsed_data["tmdb_id"] in existing_movies:
-            existing_movie = existing_movies[parsed_data["tmdb_id"]]
-            for key, value in parsed_data.items():
-                setattr(existing_movie, key, value)
-            movies_to_update.append(existing_movie)
-        else:
-            movies_to_create.append(Movie(**parsed_data))
+def content_hash(row: dict) -> str:
+    """Stable hash of a parsed row, used to skip rewriting unchanged records"""
+    payload = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+def search_vector_sql(weights: dict) -> str:
+    """Weighted tsvector expression over the given columns, one placeholder per column"""
+    return " || ".join(
+        f"setweight(to_tsvector('{settings.SEARCH_CONFIG}', coalesce(%s, '')), '{weight}')"
+        for weight in weights.values()
+    )
+
+def execute_values_returning(sql: str, values: list, template: str) -> list:
+    """
+    Run a multi-row statement through psycopg2's execute_values in one round
+    trip and return its RETURNING rows.
+
+    execute_values needs a psycopg2 cursor, which Django's CursorWrapper
+    keeps as its .cursor attribute. The statement runs on Django's
+    connection and inside its transaction, but skips Django's query logging.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        return execute_values(cursor.cursor, sql, values, template=template, page_size=len(values), fetch=True)
+
+def upsert_rows(model, rows: list) -> dict:
+    """
+    Insert or update rows keyed on tmdb_id in a single statement.
+
+    Runs INSERT ... ON CONFLICT (tmdb_id) DO UPDATE, but only for rows whose
+    content_hash differs from the stored one, so unchanged records are never
+    rewritten. search_vector is rebuilt from the row's text columns in the
+    same statement. Returns the inserted, updated and unchanged counts, plus
+    the primary keys of every row that was written as changed_ids.
+    """
+    # ON CONFLICT cannot touch the same row twice; TMDb pages can repeat items
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault(row["tmdb_id"], row)
+    rows = [{**row, "content_hash": content_hash(row)} for row in unique_rows.values()]
+
+    table = model._meta.db_table
+    weights = model.search_weights
+    columns = list(rows[0])
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}" for column in columns + ["search_vector"] if column != "tmdb_id"
+    )
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}, search_vector) VALUES %s "
+        f"ON CONFLICT (tmdb_id) DO UPDATE SET {updates} "
+        f"WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash "
+        f"RETURNING id, (xmax = 0) AS inserted"
+    )
+    template = f"({', '.join(['%s'] * len(columns))}, {search_vector_sql(weights)})"
+    values = [tuple(row[column] for column in columns + list(weights)) for row in rows]
+
+    written = execute_values_returning(sql, values, template)
+
+    inserted = sum(1 for _, is_insert in written if is_insert)
+    return {
+        "inserted": inserted,
+        "updated": len(written) - inserted,
+        "unchanged": len(rows) - len(written),
+        "changed_ids": [pk for pk, _ in written],
+    }
+
+def parse_movie(movie: dict) -> dict:
+    """Map a TMDb movie result onto Movie columns"""
+    return {
+        "tmdb_id": movie["id"],
+        "backdrop_path": movie.get("backdrop_path", ""),
+        "title": movie.get("title", ""),
+        "original_title": movie.get("original_title", ""),
+        "overview": movie.get("overview", ""),
+        "poster_path": movie.get("poster_path", ""),
+        "adult": movie.get("adult", False),
+        "original_language": movie.get("original_language", ""),
+        "genre_ids": movie.get("genre_ids", []),
+        "popularity": movie.get("popularity", 0.0),
+        "release_date": parse_date(movie.get("release_date")),
+        "video": movie.get("video", False),
+        "vote_average": movie.get("vote_average", 0.0),
+        "vote_count": movie.get("vote_count", 0)
+    }
 
-    with transaction.atomic():
-        if movies_to_create:
-            Movie.objects.bulk_create(movies_to_create, ignore_conflicts=True)  # ✅ Avoid duplicate errors
+def parse_tv_show(show: dict) -> dict:
+    """Map a TMDb TV result onto TvShow columns"""
+    return {
+        "tmdb_id": show["id"],
+        "backdrop_path": show.get("backdrop_path", ""),
+        "name": show.get("name", ""),
+        "original_name": show.get("original_name", ""),
+        "overview": show.get("overview", ""),
+        "poster_path": show.get("poster_path", ""),
+        "adult": show.get("adult", False),
+        "original_language": show.get("original_language", ""),
+        "genre_ids": show.get("genre_ids", []),
+        "popularity": show.get("popularity", 0.0),
+        "first_air_date": parse_date(show.get("first_air_date")),
+        "vote_average": show.get("vote_average", 0.0),
+        "vote_count": show.get("vote_count", 0),
+        "origin_country": show.get("origin_country", [])
+    }
 
-        if movies_to_update:
-            Movie.objects.bulk_update(movies_to_update, [
-                "backdrop_path", "title", "original_title", "overview", "poster_path",
-                "adult", "original_language", "genre_ids", "popularity",
-                "release_date", "video", "vote_average", "vote_count"
-            ])
+def bulk_upsert_movies(movies: list) -> dict:
+    """Bulk upsert movie records"""
+    if not movies:
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "changed_ids": []}
 
-    cache.set("trending_movies", movies, timeout=14400)
-    logger.info("Successfully fetched, cached, and stored trending movies.")
+    counts = upsert_rows(Movie, [parse_movie(movie) for movie in movies])
+    if counts["changed_ids"]:
+        bump_catalog_version()
+    logger.info(
+        f"Successfully stored movies: {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged"
+    )
+    return counts
 
-def bulk_upsert_tv_shows(tv_shows: list):
-    """Bulk upsert TV show records and cache the results"""
+def bulk_upsert_tv_shows(tv_shows: list) -> dict:
+    """Bulk upsert TV show records"""
     if not tv_shows:
-        return
-
-    tv_show_ids = [show["id"] for show in tv_shows]
-
-    # Fetch existing TV shows by their TMDb ID
-    existing_tv_shows = {s.tmdb_id: s for s in TvShow.objects.filter(tmdb_id__in=tv_show_ids)}
-
-    tv_shows_to_create = []
-    tv_shows_to_update = []
-
-    for show in tv_shows:
-        parsed_data = {
-            "tmdb_id": show["id"],
-            "backdrop_path": show.get("backdrop_path", ""),
-            "name": show.get("name", ""),
-            "original_name": show.get("original_name", ""),
-            "overview": show.get("overview", ""),
-            "poster_path": show.get("poster_path", ""),
-            "adult": show.get("adult", False),
-            "original_language": show.get("original_language", ""),
-            "genre_ids": show.get("genre_ids", []),
-            "popularity": show.get("popularity", 0.0),
-            "first_air_date": parse_date(show.get("first_air_date")),
-            "vote_average": show.get("vote_average", 0.0),
-            "vote_count": show.get("vote_count", 0),
-            "origin_country": show.get("origin_country", [])
-            }
-
-        if parsed_data["tmdb_id"] in existing_tv_shows:
-            existing_show = existing_tv_shows[parsed_data["tmdb_id"]]
-            for key, value in parsed_data.items():
-                setattr(existing_show, key, value)
-            tv_shows_to_update.append(existing_show)
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "changed_ids": []}
+
+    counts = upsert_rows(TvShow, [parse_tv_show(show) for show in tv_shows])
+    if counts["changed_ids"]:
+        bump_catalog_version()
+    logger.info(
+        f"Successfully stored TV shows: {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged"
+    )
+    return counts
+
+TRENDING_URLS = {
+    "movie": "/trending/movie/day",
+    "tv": "/trending/tv/day",
+}
+
+UPSERTS = {
+    "movie": bulk_upsert_movies,
+    "tv": bulk_upsert_tv_shows,
+}
+
+
+def page_ranges(total_pages: int, pages_per_task: int) -> list:
+    """Split pages 1..total_pages into inclusive (start, end) ranges"""
+    return [
+        (start, min(start + pages_per_task - 1, total_pages))
+        for start in range(1, total_pages + 1, pages_per_task)
+    ]
+
+
+@shared_task
+def fetch_trending_page_range(media_type: str, start: int, end: int) -> list:
+    """Fetch one range of trending pages for a media type"""
+    started = time.perf_counter()
+    url = f"{settings.TMDB_API_URL}{TRENDING_URLS[media_type]}"
+    results = fetch_pages(url, range(start, end + 1))
+    logger.info(
+        f"Fetched {media_type} pages {start}-{end} ({len(results)} items) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return results
+
+
+@shared_task
+def store_trending(page_results: list, media_type: str) -> dict:
+    """Chord callback: upsert the fetched items, publish them to the cache and record the run"""
+    items = [item for results in page_results for item in results]
+    if not items:
+        logger.warning(f"No trending {media_type} items fetched, keeping the cached copy")
+        return {"media_type": media_type, "items": 0}
+
+    started = time.perf_counter()
+    counts = UPSERTS[media_type](items)
+    changed_ids = counts.pop("changed_ids")
+    upsert_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    publish_trending(media_type, items)
+    publish_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    record_snapshot(media_type, items)
+    bump_catalog_version()
+    history_seconds = time.perf_counter() - started
+
+    if changed_ids:
+        refresh_similar_titles.delay(media_type, changed_ids)
+    enrich_titles.delay(media_type)
+    prefetch_images.delay([
+        item[field] for item in items for field in ("poster_path", "backdrop_path") if item.get(field)
+    ])
+
+    logger.info(
+        f"Stored {len(items)} trending {media_type} items: "
+        f"upsert {upsert_seconds:.2f}s, cache publish {publish_seconds:.2f}s, "
+        f"history {history_seconds:.2f}s"
+    )
+    return {
+        "media_type": media_type,
+        "items": len(items),
+        **counts,
+        "upsert_seconds": round(upsert_seconds, 3),
+        "publish_seconds": round(publish_seconds, 3),
+        "history_seconds": round(history_seconds, 3),
+    }
+
+
+@shared_task
+def refresh_similar_titles(media_type: str, changed_ids: list):
+    """Fold changed titles into the precomputed similar-title lists"""
+    started = time.perf_counter()
+    written = update_similar_titles(media_type, changed_ids)
+    if written:
+        bump_catalog_version()
+    logger.info(
+        f"Refreshed similar {media_type} titles for {len(changed_ids)} changed titles "
+        f"({written} lists written) in {time.perf_counter() - started:.2f}s"
+    )
+    return written
+
+
+@shared_task
+def sync_catalog_changes(media_type: str = None):
+    """
+    Refetch only the catalog titles TMDb reports as changed since the last sync.
+
+    Reads the changes feed from the stored watermark up to now, refetches
+    the changed titles we store and upserts them. The watermark only moves
+    forward when every page and title was fetched, so a failed run is
+    retried in full next time.
+    """
+    results = {}
+    for media_type in [media_type] if media_type else list(UPSERTS):
+        started = time.perf_counter()
+        now = timezone.now()
+        changed, complete = changed_tmdb_ids(media_type, get_watermark(media_type, now), now)
+        tmdb_ids = catalog_tmdb_ids(media_type, changed) if changed else []
+        items, failed = fetch_details(media_type, tmdb_ids)
+
+        counts = UPSERTS[media_type](items)
+        changed_ids = counts.pop("changed_ids")
+        if changed_ids:
+            refresh_similar_titles.delay(media_type, changed_ids)
+
+        if complete and not failed:
+            set_watermark(media_type, now)
         else:
-            tv_shows_to_create.append(TvShow(**parsed_data))
+            logger.warning(f"Incomplete {media_type} change sync, keeping the watermark")
+
+        logger.info(
+            f"Synced {media_type} changes: {len(changed)} changed on TMDb, "
+            f"{len(tmdb_ids)} in the catalog, {len(failed)} failed, "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        results[media_type] = {"changed": len(changed), "refetched": len(items), **counts}
+    return results
 
-    with transaction.atomic():
-        if tv_shows_to_create:
-            TvShow.objects.bulk_create(tv_shows_to_create, ignore_conflicts=True)  # ✅ Avoid duplicate key errors
 
-        if tv_shows_to_update:
-            TvShow.objects.bulk_update(tv_shows_to_update, [
-                "backdrop_path", "name", "original_name", "overview", "poster_path",
-                "adult", "original_language", "genre_ids", "popularity",
-                "first_air_date", "vote_average", "vote_count", "origin_country"
-            ])
+@shared_task
+def enrich_titles(media_type: str = None):
+    """
+    Fetch details, credits and keywords for new and stale titles.
+
+    Up to TMDB_ENRICH_MAX_TITLES titles per media type are split into chunk
+    tasks of TMDB_ENRICH_CHUNK_SIZE, so the work spreads over the workers
+    while each one only holds a chunk in memory. Titles enriched within
+    TMDB_ENRICH_TTL_DAYS are skipped.
+    """
+    dispatched = {}
+    for media_type in [media_type] if media_type else list(UPSERTS):
+        titles = stale_titles(media_type, settings.TMDB_ENRICH_MAX_TITLES)
+        size = settings.TMDB_ENRICH_CHUNK_SIZE
+        chunks = [titles[start:start + size] for start in range(0, len(titles), size)]
+        if chunks:
+            group(enrich_title_chunk.s(media_type, chunk) for chunk in chunks).apply_async()
+        logger.info(f"Dispatched enrichment of {len(titles)} {media_type} titles in {len(chunks)} chunks")
+        dispatched[media_type] = len(titles)
+    return dispatched
+
+
+@shared_task
+def enrich_title_chunk(media_type: str, titles: list) -> dict:
+    """Enrich one chunk of (id, tmdb_id) titles"""
+    started = time.perf_counter()
+    counts = enrich_chunk(media_type, titles)
+    if counts["changed"]:
+        bump_catalog_version()
+    logger.info(
+        f"Enriched {counts['fetched']} {media_type} titles ({counts['changed']} changed, "
+        f"{counts['failed']} failed) in {time.perf_counter() - started:.2f}s"
+    )
+    return counts
+
+
+@shared_task
+def prefetch_images(image_paths: list) -> int:
+    """
+    Generate the proxy's size variants for trending posters and backdrops.
+    Cached variants are skipped, so only images new to the cache (those of
+    newly trending titles, or replaced artwork) cost a fetch and a resize.
+    """
+    started = time.perf_counter()
+    generated = prefetch_variants(image_paths)
+    logger.info(
+        f"Prefetched {generated} image variants for {len(image_paths)} images "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return generated
+
+
+def trending_workflow(media_type: str):
+    """Chord that fetches every trending page range for a media type, then stores them"""
+    ranges = page_ranges(settings.TMDB_TRENDING_PAGES, settings.TMDB_PAGES_PER_TASK)
+    return chord(
+        group(fetch_trending_page_range.s(media_type, start, end) for start, end in ranges),
+        store_trending.s(media_type),
+    )
+
+
+@shared_task
+def refresh_trending(media_type: str):
+    """Re-run trending ingestion for a single media type"""
+    trending_workflow(media_type).apply_async()
+    return f"Dispatched trending {media_type} ingestion"
 
-    cache.set("trending_tv_shows", tv_shows, timeout=14400)
-    logger.info("Successfully fetched, cached, and stored trending TV shows.")
 
 @shared_task
 def fetch_trending_movies_shows():
-    """Fetch, cache, and store trending movies and TV shows"""
-    total_pages = 10
-    movie_url = 'https://api.themoviedb.org/3/trending/movie/day'
-    tv_url = 'https://api.themoviedb.org/3/trending/tv/day'
-    
-    movies = fetch_trending_data(movie_url, total_pages)
-    tv_shows = fetch_trending_data(tv_url, total_pages)
-    
-    bulk_upsert_movies(movies)
-    bulk_upsert_tv_shows(tv_shows)
-    
-    return "Fetched, cached, and stored trending movies and TV shows"
+    """
+    Fetch, cache, and store trending movies and TV shows.
+
+    Each media type gets a chord: its page ranges are fetched as a group of
+    subtasks spread over the workers, and store_trending upserts and
+    publishes the combined result once every range has come back.
+    """
+    for media_type in TRENDING_URLS:
+        trending_workflow(media_type).apply_async()
 
+    return "Dispatched trending movies and TV shows ingestion"
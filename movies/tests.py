@@ -1,3 +1,1143 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import redis
+import requests
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from . import async_views, images
+from .enrichment import enrich_chunk, stale_titles
+from .history import maintain_partitions, month_start, partition_name, record_snapshot
+from .similarity import rebuild_similar_titles, update_similar_titles
+from .models import Movie, SimilarTitles, SyncWatermark, TitleCredit, TitleDetails, TrendingSnapshot, TvShow, weighted_search_vector
+from cinewhisper.celery import app
+from .tasks import bulk_upsert_movies, enrich_titles, prefetch_images, refresh_similar_titles, sync_catalog_changes, trending_workflow
+from .tmdb import fetch_pages, get_json
+from . import trending
+from .trending import TrendingList, fresh_key, get_redis, get_trending, merge_trending, publish_trending
+from .views import MovieViewSet, TvShowViewSet
+
+
+class CatalogFilterIndexTests(TestCase):
+    """Filtered list endpoints must be answered from indexes, never a sequential scan"""
+
+    size = 20000
+    languages = ["en", "fr", "es", "de", "it", "ja", "ko", "hi", "pt", "sv", "da", "tr", "zh", "ru", "pl"]
+    countries = ["US", "GB", "FR", "DE", "JP", "KR", "IN", "BR", "ES", "IT", "SE", "DK", "TR", "CN", "RU"]
+    genres = [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 53, 10752, 37]
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        start = date(1970, 1, 1)
+        # Realistic row width matters: the planner weighs index use against table size
+        overview = "A sweeping story of ambition, loss and second chances. " * 6
+
+        Movie.objects.bulk_create([
+            Movie(
+                tmdb_id=i,
+                title=f"Movie {i}",
+                overview=overview,
+                poster_path=f"/poster{i}.jpg",
+                backdrop_path=f"/backdrop{i}.jpg",
+                original_language=rng.choice(cls.languages),
+                genre_ids=rng.sample(cls.genres, 2),
+                popularity=rng.uniform(0, 1000),
+                release_date=start + timedelta(days=rng.randrange(20000)),
+                vote_count=int(rng.paretovariate(1.2) * 10),
+            )
+            for i in range(cls.size)
+        ], batch_size=2000)
+
+        TvShow.objects.bulk_create([
+            TvShow(
+                tmdb_id=i,
+                name=f"Show {i}",
+                overview=overview,
+                poster_path=f"/poster{i}.jpg",
+                backdrop_path=f"/backdrop{i}.jpg",
+                original_language=rng.choice(cls.languages),
+                genre_ids=rng.sample(cls.genres, 2),
+                # Skewed like the real catalog: a few countries dominate
+                origin_country=rng.choices(cls.countries, weights=range(len(cls.countries), 0, -1)),
+                popularity=rng.uniform(0, 1000),
+                first_air_date=start + timedelta(days=rng.randrange(20000)),
+                vote_count=int(rng.paretovariate(1.2) * 10),
+            )
+            for i in range(cls.size)
+        ], batch_size=2000)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE movies_movie")
+            cursor.execute("ANALYZE movies_tvshow")
+
+    def assertNoSeqScan(self, url):
+        """Request url and EXPLAIN every catalog query it ran"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        catalog_queries = [
+            query["sql"] for query in context.captured_queries
+            if query["sql"].startswith("SELECT") and ("movies_movie" in query["sql"] or "movies_tvshow" in query["sql"])
+        ]
+        self.assertTrue(catalog_queries)
+        for sql in catalog_queries:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN {sql}")
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+            self.assertNotIn("Seq Scan", plan, f"{url}\n{sql}\n{plan}")
+        return response
+
+    def test_movie_genre_filter(self):
+        response = self.assertNoSeqScan("/movies/?genre=28,878")
+        for movie in response.json()["results"]:
+            self.assertTrue({28, 878} <= set(movie["genre_ids"]))
+
+    def test_movie_language_filter(self):
+        response = self.assertNoSeqScan("/movies/?original_language=ko")
+        self.assertTrue(all(m["original_language"] == "ko" for m in response.json()["results"]))
+
+    def test_movie_release_date_range(self):
+        response = self.assertNoSeqScan("/movies/?release_date_from=2020-01-01&release_date_to=2020-06-30")
+        for movie in response.json()["results"]:
+            self.assertTrue("2020-01-01" <= movie["release_date"] <= "2020-06-30")
+
+    def test_movie_min_vote_count(self):
+        response = self.assertNoSeqScan("/movies/?min_vote_count=5000")
+        self.assertTrue(all(m["vote_count"] >= 5000 for m in response.json()["results"]))
+
+    def test_results_ordered_by_popularity(self):
+        response = self.assertNoSeqScan("/movies/?original_language=ja")
+        popularity = [m["popularity"] for m in response.json()["results"]]
+        self.assertEqual(popularity, sorted(popularity, reverse=True))
+
+    def test_tv_origin_country_filter(self):
+        response = self.assertNoSeqScan("/tvshows/?origin_country=dk")
+        self.assertTrue(all("DK" in show["origin_country"] for show in response.json()["results"]))
+
+    def test_tv_first_air_date_and_genre(self):
+        response = self.assertNoSeqScan("/tvshows/?genre=18&first_air_date_from=2010-01-01&first_air_date_to=2012-12-31")
+        for show in response.json()["results"]:
+            self.assertIn(18, show["genre_ids"])
+            self.assertTrue("2010-01-01" <= show["first_air_date"] <= "2012-12-31")
+
+    def test_invalid_filter_value(self):
+        self.assertEqual(self.client.get("/movies/?release_date_from=yesterday").status_code, 400)
+        self.assertEqual(self.client.get("/movies/?genre=drama").status_code, 400)
+        for value in (",", "5,10", "many"):
+            response = self.client.get(f"/movies/?min_vote_count={value}")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("min_vote_count", response.json())
+
+
+class TrendingHistoryTests(TestCase):
+    """Runs are appended to monthly partitions and compared for climbers, newcomers and per-title history"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = {i: Movie.objects.create(tmdb_id=i, title=f"Movie {i}", popularity=float(i)) for i in range(1, 6)}
+        cls.now = timezone.now()
+        record_snapshot("movie", [{"id": 5}, {"id": 1}, {"id": 2}], cls.now - timedelta(days=10))
+        record_snapshot("movie", [{"id": 1}, {"id": 2}, {"id": 3}], cls.now - timedelta(hours=30))
+        record_snapshot("movie", [{"id": 3, "popularity": 9.5}, {"id": 1}, {"id": 4}, {"id": 2}], cls.now)
+
+    def partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent WHERE parent.relname = %s",
+                ["movies_trendingsnapshot"],
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def test_rising(self):
+        results = self.client.get("/movies/trending/rising/").json()["results"]
+        self.assertEqual([(r["tmdb_id"], r["rank"], r["previous_rank"]) for r in results], [(3, 1, 3)])
+        self.assertEqual(results[0]["title"], "Movie 3")
+
+    def test_new_entries(self):
+        results = self.client.get("/movies/trending/new/?days=7").json()["results"]
+        self.assertEqual([r["tmdb_id"] for r in results], [4])
+        # The previous run is 30 hours old, outside a one-day window
+        results = self.client.get("/movies/trending/new/?days=1").json()["results"]
+        self.assertEqual([r["tmdb_id"] for r in results], [3, 1, 4, 2])
+
+    def test_title_history(self):
+        history = self.client.get(f"/movies/{self.movies[1].pk}/history/?days=5").json()
+        self.assertEqual([point["rank"] for point in history], [1, 2])
+        self.assertEqual(self.client.get(f"/movies/{self.movies[1].pk}/history/?days=0").status_code, 400)
+
+    def test_deleted_title_drops_history(self):
+        Movie.objects.get(tmdb_id=3).delete()
+        self.assertEqual(self.client.get("/movies/trending/rising/").json()["results"], [])
+        self.assertFalse(TrendingSnapshot.objects.filter(object_id=self.movies[3].pk).exists())
+        self.assertEqual(TrendingSnapshot.objects.filter(object_id=self.movies[1].pk).count(), 3)
+
+    @override_settings(TRENDING_HISTORY_MONTHS=3)
+    def test_expired_partitions_dropped(self):
+        old = self.now - timedelta(days=200)
+        record_snapshot("movie", [{"id": 1}], old)
+        self.assertIn(partition_name(old), self.partitions())
+
+        record_snapshot("movie", [{"id": 1}, {"id": 1}])
+        partitions = self.partitions()
+        self.assertNotIn(partition_name(old), partitions)
+        self.assertIn(partition_name(self.now), partitions)
+        # The next month is created ahead of its first run
+        self.assertIn(partition_name(month_start(self.now) + timedelta(days=32)), partitions)
+
+
+class TrendingPartitionTests(TestCase):
+    """Snapshot runs racing on a month rollover create its partition once"""
+
+    @override_settings(TRENDING_HISTORY_MONTHS=1200)
+    def test_concurrent_rollover_creates_partition_once(self):
+        # Far enough ahead that no other test touches these partitions
+        moment = timezone.now() + timedelta(days=800)
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def run(work):
+            try:
+                work()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def rollover():
+            barrier.wait()
+            maintain_partitions(moment)
+
+        def drop():
+            with connection.cursor() as cursor:
+                for month in (moment, month_start(moment) + timedelta(days=32)):
+                    cursor.execute(f"DROP TABLE IF EXISTS {partition_name(month_start(month))}")
+
+        threads = [threading.Thread(target=run, args=(rollover,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cleanup = threading.Thread(target=run, args=(drop,))
+        cleanup.start()
+        cleanup.join()
+        self.assertEqual(errors, [])
+
+
+class TrendingHistoryIndexTests(TestCase):
+    """Trend analytics read the snapshot history through its indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        # Snapshots are only recorded for titles in the catalog
+        Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}") for i in range(1, 400)])
+        TvShow.objects.bulk_create([TvShow(tmdb_id=i, name=f"Show {i}") for i in range(1, 400)])
+        cls.movie = Movie.objects.get(tmdb_id=17)
+        now = timezone.now()
+        # 60 days of runs every six hours, 200 titles each, both media types
+        for run in range(240, -1, -1):
+            for media_type in ("movie", "tv"):
+                ids = rng.sample(range(1, 400), 200)
+                record_snapshot(media_type, [{"id": i, "popularity": rng.uniform(0, 100)} for i in ids],
+                                now - timedelta(hours=6 * run))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE movies_trendingsnapshot")
+
+    def test_no_seq_scan(self):
+        # Next month's partition is created ahead and still empty, so any plan may scan it
+        ahead = f"Seq Scan on {partition_name(month_start(timezone.now()) + timedelta(days=32))} "
+        for url in ("/movies/trending/rising/", "/movies/trending/new/", f"/movies/{self.movie.pk}/history/"):
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            snapshot_queries = [
+                query["sql"] for query in context.captured_queries if "movies_trendingsnapshot" in query["sql"]
+            ]
+            self.assertTrue(snapshot_queries)
+            for sql in snapshot_queries:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN {sql}")
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                scanned = [line for line in plan.splitlines() if "Seq Scan on movies_trendingsnapshot" in line]
+                self.assertFalse([line for line in scanned if ahead not in line], f"{url}\n{sql}\n{plan}")
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages must walk the catalog in (popularity, id) order without gaps or repeats"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Plenty of popularity ties so the id tie-break is exercised
+        Movie.objects.bulk_create([
+            Movie(tmdb_id=i, title=f"Movie {i}", popularity=float(i % 7)) for i in range(95)
+        ])
+
+    def test_walks_every_row_once(self):
+        expected = list(Movie.objects.order_by('-popularity', '-id').values_list('id', flat=True))
+        seen = []
+        url = "/movies/?paginate=cursor&page_size=10"
+        while url:
+            body = self.client.get(url).json()
+            self.assertNotIn("count", body)
+            seen.extend(movie["id"] for movie in body["results"])
+            url = body["next"]
+        self.assertEqual(seen, expected)
+
+    def test_counts_on_request(self):
+        body = self.client.get("/movies/?paginate=cursor&count=exact").json()
+        self.assertEqual(body["count"], 95)
+        self.assertIn("count", self.client.get("/movies/?paginate=cursor&count=estimate").json())
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/movies/?cursor=not-a-cursor").status_code, 400)
+
+
+class ConditionalCatalogTests(TestCase):
+    """Catalog responses carry ingestion-version validators and 304 without touching the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(tmdb_id=1, title="Movie 1", popularity=1.0)
+
+    def test_not_modified_before_any_query(self):
+        response = self.client.get("/movies/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertTrue(response["Last-Modified"])
+
+        for url in ("/movies/", f"/movies/{self.movie.pk}/"):
+            etag = self.client.get(url)["ETag"]
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+
+    def test_catalog_change_invalidates(self):
+        etag = self.client.get("/movies/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.vote_count = 10
+            self.movie.save()
+        response = self.client.get("/movies/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_writes_are_not_conditional(self):
+        self.assertNotIn("ETag", self.client.delete(f"/movies/{self.movie.pk}/"))
+
+
+class FastReadPathTests(TestCase):
+    """The serializer-free read path must render exactly the serializer's bytes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create([
+            Movie(tmdb_id=1, title="Amélie   \"quoted\"", overview="naïve – 東京", popularity=0.00001,
+                  vote_average=7.25, genre_ids=[18, 35], release_date=date(2001, 4, 25)),
+            Movie(tmdb_id=2, title="Big", popularity=1e16, poster_path=None),
+            Movie(tmdb_id=3, title="Plain", popularity=12.5, vote_count=3),
+        ])
+        TvShow.objects.create(tmdb_id=1, name="Show", origin_country=["GB"], popularity=3.0)
+
+    def assertSameBytes(self, viewset, actions, url, **kwargs):
+        factory = APIRequestFactory()
+        baseline = viewset.as_view(actions, fast_reads=False, renderer_classes=[JSONRenderer])
+        fast = viewset.as_view(actions, fast_reads=True)
+        rendered = [
+            view(factory.get(url, HTTP_ACCEPT="application/json"), **kwargs).render().content
+            for view in (baseline, fast)
+        ]
+        self.assertEqual(rendered[0], rendered[1])
+
+    def test_list_and_detail(self):
+        self.assertSameBytes(MovieViewSet, {"get": "list"}, "/movies/")
+        self.assertSameBytes(MovieViewSet, {"get": "list"}, "/movies/?paginate=cursor&page_size=2")
+        self.assertSameBytes(TvShowViewSet, {"get": "list"}, "/tvshows/?origin_country=gb")
+        for movie in Movie.objects.all():
+            self.assertSameBytes(MovieViewSet, {"get": "retrieve"}, f"/movies/{movie.pk}/", pk=movie.pk)
+
+    def test_missing_detail(self):
+        with self.settings(CATALOG_FAST_READS=True):
+            self.assertEqual(self.client.get("/movies/999999/").status_code, 404)
+
+    def test_opt_in(self):
+        def loads_model_columns():
+            with CaptureQueriesContext(connection) as context:
+                self.client.get("/movies/")
+            return any("content_hash" in query["sql"] for query in context.captured_queries)
+
+        self.assertTrue(loads_model_columns())
+        with self.settings(CATALOG_FAST_READS=True):
+            self.assertFalse(loads_model_columns())
+
+
+class AsyncReadTests(TestCase):
+    """The async read views answer with the DRF views' bytes and validators, and hand over the rest"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create([
+            Movie(tmdb_id=i, title=f"Movie {i}", overview="naïve – 東京", popularity=float(i), genre_ids=[18])
+            for i in range(1, 26)
+        ])
+        TvShow.objects.create(tmdb_id=1, name="Show", origin_country=["GB"], popularity=3.0)
+
+    def setUp(self):
+        publish_trending("movie", [{"id": i, "title": f"Movie {i}", "popularity": float(i)} for i in range(1, 16)])
+        publish_trending("tv", [{"id": 1, "name": "Show", "popularity": 12.5}])
+
+    def tearDown(self):
+        get_redis().delete(*get_redis().keys("trending:*"))
+
+    def get(self, view, url, **kwargs):
+        request = RequestFactory().get(url, HTTP_ACCEPT="application/json")
+        response = async_to_sync(view)(request, **kwargs)
+        # Delegated DRF responses are rendered by the request handler
+        return response.render() if hasattr(response, "render") else response
+
+    def assertSameResponse(self, view, url, **kwargs):
+        expected = self.client.get(url, HTTP_ACCEPT="application/json")
+        response = self.get(view, url, **kwargs)
+        self.assertEqual(expected.status_code, 200, expected.content)
+        self.assertEqual(response.content, expected.content, url)
+        for header in ("ETag", "Last-Modified", "Cache-Control", "Content-Type"):
+            self.assertEqual(response[header], expected[header], header)
+        self.assertEqual(response["Vary"], "Accept")
+        return response
+
+    def test_lists_and_details(self):
+        for url in ("/movies/", "/movies/?page=2", "/movies/?page=3&page_size=10", "/movies/?page_size=7&page=3",
+                    "/movies/?page_size=0"):
+            self.assertSameResponse(async_views.list_view("movie"), url)
+        self.assertSameResponse(async_views.list_view("tv"), "/tvshows/")
+        movie = Movie.objects.first()
+        self.assertSameResponse(async_views.detail_view("movie"), f"/movies/{movie.pk}/", pk=movie.pk)
+
+    def test_trending(self):
+        for url in ("/movies/trending/", "/movies/trending/?page=2", "/movies/trending/?page_size=4&page=4"):
+            self.assertSameResponse(async_views.trending_view("movie"), url)
+        self.assertSameResponse(async_views.trending_view("tv"), "/tvshows/trending/")
+        for url in ("/trending/all/", "/trending/all/?media_type=tv", "/trending/all/?page=2"):
+            self.assertSameResponse(async_views.trending_all, url)
+
+    def test_not_modified_before_any_query(self):
+        etag = self.get(async_views.list_view("movie"), "/movies/")["ETag"]
+        request = RequestFactory().get("/movies/", HTTP_IF_NONE_MATCH=etag)
+        with self.assertNumQueries(0):
+            response = async_to_sync(async_views.list_view("movie"))(request)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unsupported_requests_are_delegated(self):
+        body = json.loads(self.get(async_views.list_view("movie"), "/movies/?fields=id,title").content)
+        self.assertEqual(list(body["results"][0]), ["id", "title"])
+        self.assertEqual(self.get(async_views.list_view("movie"), "/movies/?page=9").status_code, 404)
+        self.assertEqual(self.get(async_views.detail_view("movie"), "/movies/999999/", pk=999999).status_code, 404)
+        self.assertEqual(self.get(async_views.trending_all, "/trending/all/?media_type=person").status_code, 400)
+
+        # Nothing published: the DRF view rebuilds the list from the catalog
+        get_redis().delete(*get_redis().keys("trending:tv:*"))
+        response = self.get(async_views.trending_view("tv"), "/tvshows/trending/")
+        self.assertEqual(json.loads(response.content)["count"], 1)
+
+
+class SearchTests(TestCase):
+    """Full-text search ranks title matches first, understands web-search syntax and follows edits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.heat = Movie.objects.create(tmdb_id=1, title="Heat", overview="A detective hunts a crew of thieves in Los Angeles.", popularity=5.0)
+        Movie.objects.create(tmdb_id=2, title="Ronin", overview="Mercenaries plan a heist in Paris.", popularity=50.0)
+        Movie.objects.create(tmdb_id=3, title="The Heist", overview="A crew of thieves plans one last job.", popularity=1.0)
+        Movie.objects.create(tmdb_id=4, title="Le Cercle Rouge", original_title="Le Cercle Rouge", overview="A Paris heist.", popularity=20.0)
+        TvShow.objects.create(tmdb_id=1, name="Heist Club", overview="Thieves at work.", popularity=1.0)
+
+    def search(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [result["tmdb_id"] for result in response.json()["results"]]
+
+    def test_title_matches_rank_first(self):
+        # Stemmed: "heists" finds "heist"; the title match beats more popular overview matches
+        self.assertEqual(self.search("/movies/search/?q=heists"), [3, 2, 4])
+        self.assertEqual(self.search("/tvshows/search/?q=heist"), [1])
+
+    def test_websearch_syntax(self):
+        self.assertCountEqual(self.search('/movies/search/?q="crew of thieves"'), [1, 3])
+        self.assertEqual(self.search('/movies/search/?q="thieves of crew"'), [])
+        self.assertEqual(self.search("/movies/search/?q=heist -paris"), [3])
+        self.assertEqual(self.search("/movies/search/?q=detective or mercenaries"), [2, 1])
+        self.assertEqual(self.client.get("/movies/search/?q=%20").status_code, 400)
+
+    def test_vector_follows_orm_and_bulk_writes(self):
+        self.heat.title = "Heat (1995)"
+        self.heat.overview = "A cat-and-mouse thriller."
+        self.heat.save()
+        self.assertEqual(self.search("/movies/search/?q=detective"), [])
+        self.assertEqual(self.search("/movies/search/?q=thriller"), [1])
+
+        bulk_upsert_movies([{"id": 1, "title": "Heat", "overview": "A detective returns."}, {"id": 5, "title": "Thief"}])
+        self.assertEqual(self.search("/movies/search/?q=thriller"), [])
+        self.assertEqual(self.search("/movies/search/?q=detective"), [1])
+        self.assertEqual(self.search("/movies/search/?q=thief"), [5])
+
+
+class SimilarTitlesTests(TestCase):
+    """Folding changed titles into the stored lists gives what a full rebuild would"""
+
+    genres = [28, 12, 16, 35, 80, 18, 27, 878]
+
+    def random_fields(self, rng):
+        return {
+            "genre_ids": rng.sample(self.genres, rng.randint(1, 3)),
+            "original_language": rng.choice(["en", "fr", "ja", "ko"]),
+            "release_date": date(rng.randint(1950, 2024), 1, 1),
+            "vote_average": round(rng.uniform(3, 9), 2),
+            "popularity": round(rng.uniform(0, 900), 2),
+        }
+
+    def stored(self):
+        return {
+            entry.object_id: list(zip(entry.neighbour_ids, entry.scores))
+            for entry in SimilarTitles.objects.filter(content_type=ContentType.objects.get_for_model(Movie))
+        }
+
+    @override_settings(SIMILAR_TITLES_K=8)
+    def test_incremental_update_matches_rebuild(self):
+        rng = random.Random(3)
+        Movie.objects.bulk_create([
+            Movie(tmdb_id=i, title=f"Movie {i}", **self.random_fields(rng)) for i in range(300)
+        ])
+        rebuild_similar_titles("movie")
+
+        # Some titles change (including neighbours of many others), some are new
+        changed = rng.sample(list(Movie.objects.all()), 12)
+        for movie in changed:
+            for field, value in self.random_fields(rng).items():
+                setattr(movie, field, value)
+        Movie.objects.bulk_update(changed, list(self.random_fields(rng)))
+        added = Movie.objects.bulk_create([
+            Movie(tmdb_id=1000 + i, title=f"New {i}", **self.random_fields(rng)) for i in range(3)
+        ])
+
+        update_similar_titles("movie", [movie.pk for movie in changed + added])
+        incremental = self.stored()
+        rebuild_similar_titles("movie")
+        self.assertEqual(incremental, self.stored())
+
+        # Lists are best first and never contain the title itself
+        for object_id, neighbours in incremental.items():
+            scores = [score for _, score in neighbours]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+            self.assertNotIn(object_id, [neighbour for neighbour, _ in neighbours])
+
+    def test_endpoint_order(self):
+        rng = random.Random(5)
+        movies = Movie.objects.bulk_create([
+            Movie(tmdb_id=i, title=f"Movie {i}", **self.random_fields(rng)) for i in range(20)
+        ])
+        rebuild_similar_titles("movie")
+        results = self.client.get(f"/movies/{movies[0].pk}/similar/").json()["results"]
+        entry = SimilarTitles.objects.get(content_type=ContentType.objects.get_for_model(Movie), object_id=movies[0].pk)
+        self.assertEqual([result["id"] for result in results], entry.neighbour_ids)
+
+    def test_deleted_title_drops_list(self):
+        rng = random.Random(7)
+        movies = Movie.objects.bulk_create([
+            Movie(tmdb_id=i, title=f"Movie {i}", **self.random_fields(rng)) for i in range(5)
+        ])
+        rebuild_similar_titles("movie")
+        movies[0].delete()
+        self.assertEqual(SimilarTitles.objects.count(), 4)
+        self.assertFalse(SimilarTitles.objects.filter(object_id=movies[0].pk).exists())
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= and ?exclude= trim the payload and the columns read"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create([
+            Movie(tmdb_id=i, title=f"Heist {i}", overview="A long overview of the heist " * 20, popularity=float(i))
+            for i in range(5)
+        ])
+        Movie.objects.update(search_vector=weighted_search_vector(Movie.search_weights))
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        catalog_sql = [query["sql"] for query in context.captured_queries if "movies_movie" in query["sql"]]
+        self.assertTrue(catalog_sql)
+        return response.json(), catalog_sql
+
+    def test_fields_projects_columns(self):
+        grid = ["id", "title", "poster_path", "vote_average"]
+        for url in ("/movies/?fields=id,title,poster_path,vote_average",
+                    "/movies/?paginate=cursor&fields=id,title,poster_path,vote_average",
+                    "/movies/search/?q=heist&fields=id,title,poster_path,vote_average"):
+            body, queries = self.get(url)
+            self.assertEqual([list(movie) for movie in body["results"]], [grid] * 5)
+            self.assertFalse([sql for sql in queries if "overview" in sql], url)
+
+        movie = Movie.objects.first()
+        body, queries = self.get(f"/movies/{movie.pk}/?exclude=overview,genre_ids")
+        self.assertNotIn("overview", body)
+        self.assertNotIn("genre_ids", body)
+        self.assertIn("media_type", body)
+        self.assertFalse([sql for sql in queries if "overview" in sql])
+
+    def test_unknown_field(self):
+        self.assertEqual(self.client.get("/movies/?fields=id,budget").status_code, 400)
+
+    @mock.patch("movies.tasks.refresh_trending.delay")
+    def test_trending_fields_checked(self, refresh):
+        get_redis().delete(*get_redis().keys("trending:*") or ["trending:none"])
+        self.addCleanup(lambda: get_redis().delete(*get_redis().keys("trending:*") or ["trending:none"]))
+        for url in ("/movies/trending/", "/trending/all/"):
+            body = self.client.get(f"{url}?fields=id,title,media_type").json()
+            self.assertTrue(body["results"], url)
+            self.assertLessEqual({key for item in body["results"] for key in item}, {"id", "title", "media_type"})
+            response = self.client.get(f"{url}?fields=id,bogus")
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn("bogus", str(response.json()["fields"]))
+            self.assertEqual(self.client.get(f"{url}?exclude=bogus").status_code, 400, url)
+
+
+class MergedTrendingTests(SimpleTestCase):
+    """The mixed-media feed is ordered by popularity, ties resolved by rank"""
+
+    def test_merge_order(self):
+        movies = [{"id": 1, "popularity": 50.0}, {"id": 2, "popularity": 90.0}, {"id": 3, "popularity": 10.0}]
+        shows = [{"id": 1, "popularity": 70.0}, {"id": 2, "popularity": 50.0}]
+        merged = [(media_type, item["id"]) for media_type, item in merge_trending({"movie": movies, "tv": shows})]
+        self.assertEqual(merged, [("movie", 2), ("tv", 1), ("movie", 1), ("tv", 2), ("movie", 3)])
+
+
+class TrendingStoreTests(TestCase):
+    """Published lists swap in whole, slice lazily, and go on being served while one refresh runs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}", popularity=float(i)) for i in range(1, 4)])
+
+    def setUp(self):
+        get_redis().delete(*get_redis().keys("trending:*") or ["trending:none"])
+        self.addCleanup(lambda: get_redis().delete(*get_redis().keys("trending:*") or ["trending:none"]))
+        patcher = mock.patch("movies.tasks.refresh_trending.delay")
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def items(self, *ids):
+        return [{"id": i, "title": f"Title {i}"} for i in ids]
+
+    def test_swap_and_lazy_slices(self):
+        self.assertEqual(publish_trending("movie", self.items(*range(1, 26), 3)), 25)
+        self.assertEqual(publish_trending("movie", self.items(*range(101, 121))), 20)
+
+        listing = TrendingList("movie")
+        self.assertEqual(len(listing), 20)
+        self.assertEqual([item["id"] for item in listing[5:8]], [106, 107, 108])
+        self.assertEqual(listing[19]["id"], 120)
+        self.assertEqual(listing[30:40], [])
+        with self.assertRaises(IndexError):
+            listing[20]
+        # The previous run's payloads and the staged keys are gone
+        self.assertEqual(sorted(key.decode() for key in get_redis().keys("trending:movie:*")),
+                         ["trending:movie:fresh", "trending:movie:ids", "trending:movie:items",
+                          "trending:movie:version"])
+
+    def test_stale_list_served_with_one_refresh(self):
+        publish_trending("movie", self.items(1, 2))
+        get_redis().delete(fresh_key("movie"))
+
+        for _ in range(3):
+            self.assertEqual([item["id"] for item in get_trending("movie")[:]], [1, 2])
+        self.refresh.assert_called_once_with("movie")
+
+        # Publishing the refreshed list releases the refresh lock
+        publish_trending("movie", self.items(3))
+        get_redis().delete(fresh_key("movie"))
+        get_trending("movie")
+        self.assertEqual(self.refresh.call_count, 2)
+
+    def test_cold_start_seeds_from_catalog(self):
+        listing = get_trending("movie")
+        self.assertIsInstance(listing, TrendingList)
+        self.assertEqual([item["id"] for item in listing[:]], [3, 2, 1])
+        self.refresh.assert_called_once_with("movie")
+        self.assertFalse(get_redis().exists(fresh_key("movie")))
+
+    def test_seed_never_replaces_a_fresh_list(self):
+        seed = trending.rank_from_database
+
+        def publish_meanwhile(media_type):
+            publish_trending(media_type, self.items(42))
+            return seed(media_type)
+
+        with mock.patch("movies.trending.rank_from_database", publish_meanwhile):
+            self.assertEqual(trending.rebuild_from_database("movie"), 0)
+        self.assertEqual([item["id"] for item in TrendingList("movie")[:]], [42])
+        self.assertEqual(get_redis().keys("trending:movie:i*:*"), [])
+
+    def test_redis_outage_serves_catalog(self):
+        with mock.patch("movies.trending.get_redis", side_effect=redis.ConnectionError("down")):
+            self.assertEqual([item["id"] for item in get_trending("movie")], [3, 2, 1])
+
+    def test_warm_command_survives_redis_outage(self):
+        stderr = io.StringIO()
+        with mock.patch("movies.management.commands.warm_trending_cache.get_redis",
+                        side_effect=redis.ConnectionError("down")):
+            call_command("warm_trending_cache", stdout=io.StringIO(), stderr=stderr)
+        self.assertIn("not warmed", stderr.getvalue())
+
+    def merged_ids(self):
+        return [item["id"] for item in TrendingList("all", ids=trending.merged_ids_key())[:]]
+
+    def test_merged_rebuild_never_waits_for_the_lock(self):
+        publish_trending("movie", self.items(1))
+        lock = get_redis().lock("trending:all:rebuild", timeout=60)
+        self.assertTrue(lock.acquire(blocking=False))
+        try:
+            started = time.perf_counter()
+            self.assertEqual(publish_trending("movie", self.items(2)), 1)
+            self.assertLess(time.perf_counter() - started, 1)
+            self.assertEqual(self.merged_ids(), [1])
+        finally:
+            lock.release()
+        # The skipped rebuild is left marked for the next one
+        self.assertTrue(get_redis().exists(trending.MERGED_DIRTY_KEY))
+
+    def test_merged_rebuild_picks_up_lists_published_meanwhile(self):
+        build = trending.build_merged_trending
+        calls = []
+
+        def publish_meanwhile(client):
+            calls.append(1)
+            if len(calls) == 1:
+                publish_trending("movie", self.items(7))
+            return build(client)
+
+        with mock.patch("movies.trending.build_merged_trending", publish_meanwhile):
+            publish_trending("movie", self.items(6))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.merged_ids(), [7])
+        self.assertFalse(get_redis().exists(trending.MERGED_DIRTY_KEY))
+
+    def test_unmerged_lists_read_in_one_slice(self):
+        publish_trending("movie", self.items(1, 2, 3))
+        get_redis().delete(trending.merged_ids_key())
+        with mock.patch.object(TrendingList, "__getitem__", autospec=True,
+                               side_effect=TrendingList.__getitem__) as getitem:
+            self.assertEqual([item["id"] for item in trending.get_merged_trending("movie")], [1, 2, 3])
+        self.assertEqual([call.args[1] for call in getitem.call_args_list], [slice(None)])
+
+
+class StandInTMDb(BaseHTTPRequestHandler):
+    """
+    Serves paged /trending and /movie/changes feeds, /movie/{id} details and
+    original images from class state. failures queues (status, headers)
+    replies per (path, page) ahead of the real one; page_delays slows pages
+    down, and peak_in_flight records the most requests served at once.
+    """
+
+    changed = []
+    details = {}
+    images = {}
+    broken = set()
+    requests = []
+    trending = {}
+    failures = {}
+    page_delays = {}
+    in_flight = 0
+    peak_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        type(self).requests.append((url.path, query))
+        if url.path.startswith("/trending/"):
+            self.trending_page(url.path, int(query["page"][0]))
+            return
+        if url.path.startswith("/t/p/original/"):
+            image = self.images.get(url.path.rsplit("/", 1)[1])
+            if image is None:
+                self.reply(404, {})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+            return
+        if url.path == "/movie/changes":
+            page = int(parse_qs(url.query)["page"][0])
+            results = [{"id": tmdb_id} for tmdb_id in self.changed[(page - 1) * 2:page * 2]]
+            self.reply(200, {"page": page, "results": results, "total_pages": max(1, -(-len(self.changed) // 2))})
+            return
+        tmdb_id = int(url.path.rsplit("/", 1)[1])
+        if tmdb_id in self.broken:
+            self.reply(500, {})
+        elif tmdb_id in self.details:
+            self.reply(200, self.details[tmdb_id])
+        else:
+            self.reply(404, {"status_code": 34})
+
+    def trending_page(self, path, page):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak_in_flight = max(cls.peak_in_flight, cls.in_flight)
+            queued = cls.failures.get((path, page))
+            failure = queued.pop(0) if queued else None
+        try:
+            if page in cls.page_delays:
+                time.sleep(cls.page_delays[page])
+            if failure:
+                status, headers = failure
+                self.reply(status, {}, headers)
+                return
+            media_type = path.split("/")[2]
+            self.reply(200, {"page": page, "results": cls.trending.get(media_type, [])[(page - 1) * 2:page * 2]})
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInTMDbTestCase(TestCase):
+    """Points the TMDb client at a StandInTMDb server for the duration of the class"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInTMDb)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        address = cls.server_url = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.settings = override_settings(
+            TMDB_API_URL=address, TMDB_IMAGE_URL=f"{address}/t/p/original", TMDB_FETCH_RETRIES=0, TMDB_CAST_LIMIT=2
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class TMDbClientTests(StandInTMDbTestCase):
+    """Retries follow Retry-After or back off, and concurrent pages come back bounded and in order"""
+
+    def setUp(self):
+        StandInTMDb.requests = []
+        StandInTMDb.trending = {"movie": [{"id": i} for i in range(1, 13)]}
+        StandInTMDb.failures = {}
+        StandInTMDb.page_delays = {}
+        StandInTMDb.in_flight = StandInTMDb.peak_in_flight = 0
+        self.url = f"{self.server_url}/trending/movie/day"
+
+    @override_settings(TMDB_FETCH_RETRIES=2, TMDB_FETCH_BACKOFF=0.01, TMDB_RATE_LIMIT=0)
+    def test_retries_429_and_5xx(self):
+        StandInTMDb.failures = {("/trending/movie/day", 1): [(429, {"Retry-After": "3"}), (503, {})]}
+        with mock.patch("movies.tmdb.time.sleep") as sleep:
+            body = get_json(self.url, {"page": 1})
+
+        self.assertEqual([item["id"] for item in body["results"]], [1, 2])
+        self.assertEqual(len(StandInTMDb.requests), 3)
+        (first,), (second,) = [call.args for call in sleep.call_args_list]
+        self.assertEqual(first, 3.0)
+        self.assertTrue(0 <= second <= 0.01 * 2)
+
+    @override_settings(TMDB_FETCH_RETRIES=1, TMDB_FETCH_BACKOFF_MAX=8.0, TMDB_RATE_LIMIT=0)
+    def test_retry_after_capped(self):
+        StandInTMDb.failures = {("/trending/movie/day", 1): [(429, {"Retry-After": "86400"})]}
+        with mock.patch("movies.tmdb.time.sleep") as sleep:
+            get_json(self.url, {"page": 1})
+        sleep.assert_called_once_with(8.0)
+
+    @override_settings(TMDB_FETCH_RETRIES=1, TMDB_FETCH_BACKOFF=0.01, TMDB_RATE_LIMIT=0)
+    def test_gives_up_after_retries(self):
+        StandInTMDb.failures = {("/trending/movie/day", 1): [(500, {})] * 2}
+        with mock.patch("movies.tmdb.time.sleep"), self.assertRaises(requests.HTTPError):
+            get_json(self.url, {"page": 1})
+        self.assertEqual(len(StandInTMDb.requests), 2)
+
+    @override_settings(TMDB_FETCH_CONCURRENCY=3, TMDB_RATE_LIMIT=0)
+    def test_pages_in_order_within_concurrency(self):
+        # Early pages are the slowest, so they finish last
+        StandInTMDb.page_delays = {1: 0.3, 2: 0.2, 3: 0.1}
+        items = fetch_pages(self.url, range(1, 7))
+
+        self.assertEqual([item["id"] for item in items], list(range(1, 13)))
+        self.assertEqual(StandInTMDb.peak_in_flight, 3)
+
+
+class UpsertTests(TestCase):
+    """One statement inserts new titles and rewrites only those whose content changed"""
+
+    def row_version(self, tmdb_id):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT xmin::text FROM movies_movie WHERE tmdb_id = %s", [tmdb_id])
+            return cursor.fetchone()[0]
+
+    def test_counts_and_skipped_rewrites(self):
+        bulk_upsert_movies([{"id": 1, "title": "Heat"}, {"id": 2, "title": "Alien"}])
+        untouched = self.row_version(1)
+
+        counts = bulk_upsert_movies([
+            {"id": 1, "title": "Heat"},
+            {"id": 2, "title": "Aliens"},
+            {"id": 3, "title": "Ronin"},
+            {"id": 3, "title": "Ronin (repeated on a later page)"},
+        ])
+
+        changed = dict(Movie.objects.filter(tmdb_id__in=[2, 3]).values_list("tmdb_id", "pk"))
+        self.assertEqual((counts["inserted"], counts["updated"], counts["unchanged"]), (1, 1, 1))
+        self.assertCountEqual(counts["changed_ids"], changed.values())
+        self.assertEqual(self.row_version(1), untouched)
+        # The first occurrence of a repeated title wins, and search follows the new text
+        self.assertEqual(Movie.objects.get(tmdb_id=3).title, "Ronin")
+        self.assertEqual(list(Movie.objects.filter(search_vector="aliens").values_list("tmdb_id", flat=True)), [2])
+
+
+class TrendingIngestionTests(StandInTMDbTestCase):
+    """The chord fetches every page range, then upserts and publishes the combined list once"""
+
+    def setUp(self):
+        StandInTMDb.requests = []
+        StandInTMDb.failures = {}
+        StandInTMDb.page_delays = {}
+        StandInTMDb.trending = {"movie": [
+            {"id": i, "title": f"Movie {i}", "popularity": 10.0 - i, "release_date": "2024-01-0%d" % i}
+            for i in range(1, 6)
+        ]}
+        app.conf.update(task_always_eager=True, task_eager_propagates=True)
+        self.addCleanup(app.conf.update, task_always_eager=False, task_eager_propagates=False)
+        for task in (refresh_similar_titles, enrich_titles, prefetch_images):
+            patcher = mock.patch.object(task, "delay")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: get_redis().delete(*get_redis().keys("trending:*")))
+
+    @override_settings(TMDB_TRENDING_PAGES=3, TMDB_PAGES_PER_TASK=2, TMDB_RATE_LIMIT=0)
+    def test_chord_stores_and_publishes(self):
+        result = trending_workflow("movie").apply_async().get()
+
+        pages = sorted(int(query["page"][0]) for path, query in StandInTMDb.requests)
+        self.assertEqual(pages, [1, 2, 3])
+        self.assertEqual((result["items"], result["inserted"], result["updated"]), (5, 5, 0))
+        self.assertEqual(Movie.objects.get(tmdb_id=3).release_date, date(2024, 1, 3))
+        self.assertEqual([item["id"] for item in get_trending("movie")[:]], [1, 2, 3, 4, 5])
+
+        # A second run with the same data rewrites nothing
+        result = trending_workflow("movie").apply_async().get()
+        self.assertEqual((result["inserted"], result["updated"], result["unchanged"]), (0, 0, 5))
+
+
+class IncrementalSyncTests(StandInTMDbTestCase):
+    """The changes feed drives refetches of only the catalog titles that changed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}") for i in range(1, 6)])
+
+    def setUp(self):
+        StandInTMDb.requests = []
+        StandInTMDb.broken = set()
+        # 2 and 3 are ours, 100 and 101 are not; 3 has since been removed from TMDb
+        StandInTMDb.changed = [2, 100, 3, 101]
+        StandInTMDb.details = {
+            2: {"id": 2, "title": "Movie 2 (Director's Cut)", "genres": [{"id": 18, "name": "Drama"}]},
+            100: {"id": 100, "title": "Not in the catalog"},
+        }
+        patcher = mock.patch.object(refresh_similar_titles, "delay")
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def detail_requests(self):
+        return sorted(path for path, _ in StandInTMDb.requests if path != "/movie/changes")
+
+    def test_refetches_only_changed_catalog_titles(self):
+        result = sync_catalog_changes("movie")
+
+        self.assertEqual(self.detail_requests(), ["/movie/2", "/movie/3"])
+        self.assertEqual(result["movie"]["updated"], 1)
+        movie = Movie.objects.get(tmdb_id=2)
+        self.assertEqual((movie.title, movie.genre_ids), ("Movie 2 (Director's Cut)", [18]))
+        self.refresh.assert_called_once_with("movie", [movie.pk])
+
+        watermark = SyncWatermark.objects.get(name="changes:movie")
+        pages = [query for path, query in StandInTMDb.requests if path == "/movie/changes"]
+        self.assertEqual(sorted(query["page"][0] for query in pages), ["1", "2"])
+
+        # The next run starts from the stored watermark and has nothing to refetch
+        StandInTMDb.requests, StandInTMDb.changed = [], []
+        sync_catalog_changes("movie")
+        self.assertEqual(self.detail_requests(), [])
+        (_, query), = StandInTMDb.requests
+        self.assertEqual(query["start_date"], [watermark.synced_through.date().isoformat()])
+
+    def test_failure_keeps_watermark(self):
+        StandInTMDb.broken = {3}
+        sync_catalog_changes("movie")
+        self.assertFalse(SyncWatermark.objects.filter(name="changes:movie").exists())
+        # What could be fetched is still stored
+        self.assertEqual(Movie.objects.get(tmdb_id=2).title, "Movie 2 (Director's Cut)")
+
+
+class EnrichmentTests(StandInTMDbTestCase):
+    """Stale titles get details, trimmed credits and keywords; fresh ones are skipped"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = Movie.objects.bulk_create([
+            Movie(tmdb_id=i, title=f"Movie {i}", popularity=i) for i in range(1, 4)
+        ])
+
+    def setUp(self):
+        StandInTMDb.requests = []
+        StandInTMDb.broken = set()
+        # Movie 1 is gone from TMDb
+        StandInTMDb.details = {
+            tmdb_id: {
+                "id": tmdb_id,
+                "runtime": 90 + tmdb_id,
+                "tagline": f"Tagline {tmdb_id}",
+                "status": "Released",
+                "keywords": {"keywords": [{"id": 1, "name": "heist"}]},
+                "credits": {
+                    "cast": [{"id": n, "name": f"Actor {n}", "character": f"Role {n}", "order": n} for n in range(5)],
+                    "crew": [{"id": 50, "name": "Director", "job": "Director"}, {"id": 51, "name": "Grip", "job": "Grip"}],
+                },
+            }
+            for tmdb_id in (2, 3)
+        }
+
+    def test_enriches_stale_titles(self):
+        titles = stale_titles("movie", 10)
+        self.assertEqual([tmdb_id for _, tmdb_id in titles], [3, 2, 1])
+
+        counts = enrich_chunk("movie", titles)
+        self.assertEqual(counts, {"fetched": 3, "changed": 3, "failed": 0})
+        _, query = StandInTMDb.requests[0]
+        self.assertEqual(query["append_to_response"], ["credits,keywords"])
+        self.assertEqual(stale_titles("movie", 10), [])
+
+        movie = self.movies[2]
+        details = movie.title_details.get()
+        self.assertEqual((details.runtime, details.keywords), (93, ["heist"]))
+        credits = movie.credits.all()
+        self.assertEqual(sorted(credits.values_list('role', 'name')), [
+            ("cast", "Actor 0"), ("cast", "Actor 1"), ("crew", "Director"),
+        ])
+
+        body = self.client.get(f"/movies/{movie.pk}/details/").json()
+        self.assertEqual(body["tagline"], "Tagline 3")
+        self.assertEqual(body["cast"][1], {"id": 1, "name": "Actor 1", "character": "Role 1"})
+        self.assertEqual(body["crew"], [{"id": 50, "name": "Director", "job": "Director"}])
+
+    def test_unchanged_details_keep_credits(self):
+        enrich_chunk("movie", stale_titles("movie", 10))
+        credit_ids = set(TitleCredit.objects.values_list('id', flat=True))
+        with override_settings(TMDB_ENRICH_TTL_DAYS=0):
+            titles = stale_titles("movie", 10)
+        self.assertEqual(len(titles), 3)
+
+        StandInTMDb.broken = {2}
+        self.assertEqual(enrich_chunk("movie", titles), {"fetched": 2, "changed": 0, "failed": 1})
+        self.assertEqual(set(TitleCredit.objects.values_list('id', flat=True)), credit_ids)
+
+    def test_deleted_title_drops_details(self):
+        enrich_chunk("movie", stale_titles("movie", 10))
+        movie = Movie.objects.get(pk=self.movies[2].pk)
+        movie.delete()
+        self.assertEqual(TitleDetails.objects.count(), 2)
+        self.assertFalse(TitleCredit.objects.filter(object_id=self.movies[2].pk).exists())
+        self.assertTrue(TitleCredit.objects.exists())
+
+
+class ImageProxyTests(StandInTMDbTestCase):
+    """Variants are generated once from a single fetch of the original and evicted LRU"""
+
+    def setUp(self):
+        original = io.BytesIO()
+        Image.new("RGB", (600, 900), "red").save(original, "JPEG")
+        StandInTMDb.requests = []
+        StandInTMDb.images = {"poster.jpg": original.getvalue()}
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        override = override_settings(IMAGE_CACHE_DIR=cache_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        images._usage.update(bytes=None, written=0)
+
+    def test_variants(self):
+        response = self.client.get("/images/w185/poster.jpg", HTTP_ACCEPT="image/webp,*/*")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("Accept", response["Vary"])
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (185, 278))
+
+        response = self.client.get("/images/w92/poster.jpg?format=jpeg")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(Image.open(io.BytesIO(response.content)).format, "JPEG")
+        self.assertEqual(len(StandInTMDb.requests), 1)
+
+        response = self.client.get("/images/w92/poster.jpg?format=jpeg", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get("/images/w1000/poster.jpg").status_code, 400)
+        self.assertEqual(self.client.get("/images/w92/missing.jpg").status_code, 404)
+
+    def test_prefetch_skips_cached(self):
+        self.assertEqual(images.prefetch_variants(["/poster.jpg", "/missing.jpg"]), 8)
+        self.assertEqual(images.prefetch_variants(["poster.jpg"]), 0)
+        self.assertEqual(len([path for path, _ in StandInTMDb.requests if path.endswith("poster.jpg")]), 1)
+
+    def test_lru_eviction(self):
+        with override_settings(IMAGE_CACHE_MAX_BYTES=3500):
+            paths = [images.cache_file(f"/blob{n}.jpg") for n in range(3)]
+            for n, path in enumerate(paths):
+                images.write_cached(path, b"x" * 1000)
+                os.utime(path, (n, n))
+            images.touch(paths[0])
+            images.write_cached(images.cache_file("/blob3.jpg"), b"x" * 1000)
+
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[1]))
+        self.assertTrue(os.path.exists(paths[2]))
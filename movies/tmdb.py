@@ -0,0 +1,160 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the shared TMDb session so connections are reused across pages and runs"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = settings.TMDB_FETCH_CONCURRENCY
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt"""
+    ceiling = min(settings.TMDB_FETCH_BACKOFF_MAX, settings.TMDB_FETCH_BACKOFF * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def take_rate_budget():
+    """
+    Block until the request budget shared by every worker has room.
+
+    Requests are counted per wall-clock second in the cache, so all
+    processes together stay under TMDB_RATE_LIMIT requests a second. Without
+    the cache the request goes ahead; 429 handling in get_json still applies.
+    """
+    limit = settings.TMDB_RATE_LIMIT
+    if not limit:
+        return
+    while True:
+        second = int(time.time())
+        key = f"tmdb:budget:{second}"
+        try:
+            cache.add(key, 0, timeout=5)
+            used = cache.incr(key)
+        except (RedisError, ValueError) as e:
+            logger.warning(f"TMDb rate budget unavailable: {e}")
+            return
+        if used <= limit:
+            return
+        time.sleep(max(0.0, second + 1 - time.time()))
+
+
+def get_json(url: str, params: dict = None) -> dict:
+    """
+    GET a TMDb resource and decode the JSON body.
+
+    Retries connection errors, timeouts, 429 and 5xx responses with jittered
+    backoff, honouring Retry-After (capped at TMDB_FETCH_BACKOFF_MAX) when
+    TMDb sends one. Raises the last
+    requests.RequestException once the retries are exhausted.
+    """
+    params = {"api_key": settings.TMDB_API_KEY, **(params or {})}
+    retries = settings.TMDB_FETCH_RETRIES
+
+    for attempt in range(retries + 1):
+        take_rate_budget()
+        try:
+            response = get_session().get(url, params=params, timeout=settings.TMDB_FETCH_TIMEOUT)
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                retry_after = response.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff_delay(attempt)
+                # A bad header must not park the worker for minutes
+                delay = min(delay, settings.TMDB_FETCH_BACKOFF_MAX)
+                logger.warning(f"TMDb returned {response.status_code} for {url}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            return response.json()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Request to {url} failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def fetch_page(url: str, page: int) -> list:
+    """Fetch the results of a single page, returning an empty list on failure"""
+    try:
+        return get_json(url, {"page": page}).get("results", [])
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch page {page} from {url}: {e}")
+        return []
+
+
+def fetch_pages(url: str, pages) -> list:
+    """
+    Fetch several pages concurrently over the shared session.
+
+    At most TMDB_FETCH_CONCURRENCY requests are in flight at once and the
+    results are concatenated in the order the pages were given, so wall time
+    tracks the slowest page rather than the sum of all of them.
+    """
+    pages = list(pages)
+    if not pages:
+        return []
+
+    workers = min(settings.TMDB_FETCH_CONCURRENCY, len(pages))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        page_results = executor.map(lambda page: fetch_page(url, page), pages)
+        return [item for results in page_results for item in results]
+
+
+def get_many(resources: dict):
+    """
+    GET several TMDb resources concurrently.
+
+    resources maps a caller-chosen key to (url, params). Returns a dict of
+    key to decoded body, with None for resources TMDb reports as missing
+    (404), and the list of keys that failed after retries.
+    """
+    def fetch(key):
+        url, params = resources[key]
+        try:
+            return key, get_json(url, params), False
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return key, None, False
+            logger.error(f"Failed to fetch {url}: {e}")
+        except requests.RequestException as e:
+            logger.error(f"Failed to fetch {url}: {e}")
+        return key, None, True
+
+    results, failed = {}, []
+    if not resources:
+        return results, failed
+
+    workers = min(settings.TMDB_FETCH_CONCURRENCY, len(resources))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, body, error in executor.map(fetch, list(resources)):
+            if error:
+                failed.append(key)
+            else:
+                results[key] = body
+    return results, failed
@@ -0,0 +1,432 @@
+import asyncio
+import heapq
+import json
+import logging
+import weakref
+
+import redis
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from kombu.exceptions import OperationalError
+
+from .versioning import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Fetch one slice of a trending list: ZRANGE for the ids, HMGET for their payloads
+SLICE_SCRIPT = """
+local ids = redis.call('ZRANGE', KEYS[1], ARGV[1], ARGV[2])
+if #ids == 0 then
+    return {}
+end
+return redis.call('HMGET', KEYS[2], unpack(ids))
+"""
+
+# Model columns served by the catalog fallback, in TMDb result order
+DATABASE_FIELDS = {
+    "movie": [
+        "adult", "backdrop_path", "tmdb_id", "title", "original_language", "original_title",
+        "overview", "poster_path", "genre_ids", "popularity", "release_date", "video",
+        "vote_average", "vote_count",
+    ],
+    "tv": [
+        "adult", "backdrop_path", "tmdb_id", "name", "original_language", "original_name",
+        "overview", "poster_path", "genre_ids", "popularity", "first_air_date",
+        "vote_average", "vote_count", "origin_country",
+    ],
+}
+
+# Set whenever the per-type lists change; cleared by the rebuild that picks it up
+MERGED_DIRTY_KEY = "trending:all:dirty"
+
+_client = None
+_slice_script = None
+
+
+def get_redis() -> redis.Redis:
+    """Return the shared Redis client used for the trending index"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def get_slice_script():
+    """Return the registered slice script, loaded once per process"""
+    global _slice_script
+    if _slice_script is None:
+        _slice_script = get_redis().register_script(SLICE_SCRIPT)
+    return _slice_script
+
+
+# asyncio clients are bound to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis():
+    """Return the asyncio Redis client and slice script of the running event loop"""
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        _async_clients[loop] = (client, client.register_script(SLICE_SCRIPT))
+    return _async_clients[loop]
+
+
+def ids_key(media_type: str) -> str:
+    """Sorted set of TMDb ids scored by trending rank"""
+    return f"trending:{media_type}:ids"
+
+
+def items_key(media_type: str) -> str:
+    """Hash of TMDb id to the pre-serialized TMDb result"""
+    return f"trending:{media_type}:items"
+
+
+def fresh_key(media_type: str) -> str:
+    """Marker that expires when the published trending list goes stale"""
+    return f"trending:{media_type}:fresh"
+
+
+def refresh_lock_key(media_type: str) -> str:
+    """Held while a TMDb refresh of the trending list is in flight"""
+    return f"trending:{media_type}:refresh"
+
+
+def publish_trending(media_type: str, items: list, fresh: bool = True) -> int:
+    """
+    Replace the trending list for a media type.
+
+    The new ranking and payloads are written under versioned keys and then
+    renamed over the live keys in one MULTI block, so readers see either the
+    previous run or this one, never a mix. The live keys never expire; only
+    the freshness marker does, so a stale list keeps being served until the
+    next run replaces it. A list published with fresh=False (a seed from the
+    catalog) is dropped if a fresh list exists by the time of the swap.
+    Returns the number of items stored.
+    """
+    ranks = {}
+    payloads = {}
+    for item in items:
+        tmdb_id = str(item["id"])
+        if tmdb_id not in ranks:
+            ranks[tmdb_id] = len(ranks)
+            payloads[tmdb_id] = json.dumps(item)
+    if not ranks:
+        return 0
+
+    client = get_redis()
+    version = client.incr(f"trending:{media_type}:version")
+    staged_ids = f"{ids_key(media_type)}:{version}"
+    staged_items = f"{items_key(media_type)}:{version}"
+    lock_timeout = settings.TRENDING_LOCK_TIMEOUT
+
+    # Staged keys expire on their own if this process dies before the swap
+    pipe = client.pipeline(transaction=False)
+    pipe.zadd(staged_ids, ranks)
+    pipe.hset(staged_items, mapping=payloads)
+    pipe.expire(staged_ids, lock_timeout)
+    pipe.expire(staged_items, lock_timeout)
+    pipe.execute()
+
+    with client.pipeline(transaction=True) as swap:
+        if not fresh:
+            # A stale seed never replaces a fresh list published while it was built
+            swap.watch(fresh_key(media_type))
+            if swap.exists(fresh_key(media_type)):
+                client.delete(staged_ids, staged_items)
+                logger.info(f"Skipped seeding trending {media_type}: a fresh list is published")
+                return 0
+            swap.multi()
+        swap.rename(staged_ids, ids_key(media_type))
+        swap.rename(staged_items, items_key(media_type))
+        swap.persist(ids_key(media_type))
+        swap.persist(items_key(media_type))
+        if fresh:
+            swap.set(fresh_key(media_type), version, ex=settings.TRENDING_CACHE_TIMEOUT)
+            swap.delete(refresh_lock_key(media_type))
+        try:
+            swap.execute()
+        except redis.WatchError:
+            client.delete(staged_ids, staged_items)
+            logger.info(f"Skipped seeding trending {media_type}: a fresh list was published meanwhile")
+            return 0
+    logger.info(f"Published {len(ranks)} trending {media_type} items as version {version}")
+
+    publish_merged_trending()
+    bump_catalog_version()
+    return len(ranks)
+
+
+def merged_ids_key(media_type: str = None) -> str:
+    """Sorted set of "<media_type>:<tmdb_id>" members in merged order, optionally one media type only"""
+    return ids_key(f"all:{media_type}") if media_type else ids_key("all")
+
+
+def published_items(media_type: str) -> list:
+    """Every item of a published trending list, in rank order"""
+    return TrendingList(media_type)[:]
+
+
+def merge_trending(lists: dict):
+    """
+    Stream the per-media-type lists into one feed, most popular first.
+
+    Each list is ordered by (popularity, rank) and the lists are combined
+    with a k-way heap merge; ties keep the TMDb rank, then the media type.
+    Yields (media_type, item) pairs.
+    """
+    def keyed(media_type, items):
+        ordered = sorted(enumerate(items), key=lambda entry: (-(entry[1].get("popularity") or 0), entry[0]))
+        for rank, item in ordered:
+            yield (-(item.get("popularity") or 0), rank, media_type), item
+
+    merged = heapq.merge(*(keyed(media_type, items) for media_type, items in lists.items()), key=lambda pair: pair[0])
+    for (_, _, media_type), item in merged:
+        yield media_type, item
+
+
+def publish_merged_trending() -> int:
+    """
+    Precompute the mixed-media trending feed from the published lists.
+
+    Never waits for another rebuild: the caller marks the feed dirty and
+    only rebuilds if it gets the lock. The lock holder keeps rebuilding
+    while the feed is marked dirty, so the last rebuild always reads the
+    latest lists. Returns the number of items in the feed, or 0 when the
+    rebuild was left to the process holding the lock.
+    """
+    client = get_redis()
+    client.set(MERGED_DIRTY_KEY, 1)
+    count = 0
+    while True:
+        lock = client.lock("trending:all:rebuild", timeout=settings.TRENDING_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            return count
+        try:
+            while client.delete(MERGED_DIRTY_KEY):
+                count = build_merged_trending(client)
+        finally:
+            lock.release()
+        # Marked dirty by a caller that found the lock taken just before the release
+        if not client.exists(MERGED_DIRTY_KEY):
+            return count
+
+
+def build_merged_trending(client) -> int:
+    """
+    Merge the published lists into the feed. The merged order, a
+    per-media-type subset in the same order and the payloads (tagged with
+    media_type) are staged and renamed in like publish_trending.
+    """
+    lists = {media_type: published_items(media_type) for media_type in DATABASE_FIELDS}
+    order = {}
+    subsets = {media_type: {} for media_type in lists}
+    payloads = {}
+    for media_type, item in merge_trending(lists):
+        member = f"{media_type}:{item['id']}"
+        subsets[media_type][member] = order[member] = len(order)
+        payloads[member] = json.dumps({**item, "media_type": media_type})
+    if not order:
+        return 0
+
+    version = client.incr("trending:all:version")
+    targets = {merged_ids_key(): order, items_key("all"): payloads}
+    targets.update({merged_ids_key(media_type): subset for media_type, subset in subsets.items()})
+
+    pipe = client.pipeline(transaction=False)
+    for key, values in targets.items():
+        if not values:
+            continue
+        staged = f"{key}:{version}"
+        if key == items_key("all"):
+            pipe.hset(staged, mapping=values)
+        else:
+            pipe.zadd(staged, values)
+        pipe.expire(staged, settings.TRENDING_LOCK_TIMEOUT)
+    pipe.execute()
+
+    swap = client.pipeline(transaction=True)
+    for key, values in targets.items():
+        if values:
+            swap.rename(f"{key}:{version}", key)
+            swap.persist(key)
+        else:
+            swap.delete(key)
+    swap.execute()
+
+    logger.info(f"Published {len(order)} merged trending items as version {version}")
+    return len(order)
+
+
+def rank_from_database(media_type: str) -> list:
+    """
+    Build a trending-shaped list from the catalog, most popular first.
+
+    Used when nothing has been published yet (cold start, Redis flush); the
+    items mirror the TMDb result fields the trending endpoints return.
+    """
+    from .models import Movie, TvShow
+
+    limit = settings.TMDB_TRENDING_PAGES * 20
+    if media_type == "movie":
+        rows = Movie.objects.order_by("-popularity").values(*DATABASE_FIELDS["movie"])[:limit]
+        date_field = "release_date"
+    else:
+        rows = TvShow.objects.order_by("-popularity").values(*DATABASE_FIELDS["tv"])[:limit]
+        date_field = "first_air_date"
+
+    items = []
+    for row in rows:
+        row[date_field] = row[date_field].isoformat() if row[date_field] else ""
+        items.append({"id": row.pop("tmdb_id"), **row, "media_type": media_type})
+    return items
+
+
+def request_refresh(media_type: str) -> bool:
+    """
+    Queue a TMDb refresh unless one is already in flight.
+
+    The refresh lock makes this single-flight across every web pod: only the
+    caller that sets it enqueues the task, and publish_trending clears it.
+    """
+    from .tasks import refresh_trending
+
+    client = get_redis()
+    if not client.set(refresh_lock_key(media_type), 1, nx=True, ex=settings.TRENDING_LOCK_TIMEOUT):
+        return False
+    try:
+        refresh_trending.delay(media_type)
+    except OperationalError as e:
+        client.delete(refresh_lock_key(media_type))
+        logger.error(f"Could not queue trending {media_type} refresh: {e}")
+        return False
+    logger.info(f"Queued trending {media_type} refresh")
+    return True
+
+
+def rebuild_from_database(media_type: str) -> int:
+    """Seed the trending list from the catalog under a lock so concurrent misses don't stampede"""
+    lock = get_redis().lock(f"trending:{media_type}:rebuild", timeout=settings.TRENDING_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        return publish_trending(media_type, rank_from_database(media_type), fresh=False)
+    finally:
+        lock.release()
+
+
+def get_trending(media_type: str):
+    """
+    Return the trending list for a media type, serving stale data over errors.
+
+    A stale list is returned as-is while a refresh is queued. When nothing is
+    published, one caller seeds the list from the catalog and the rest read
+    the catalog ranking directly; if Redis is unreachable the catalog ranking
+    is served too.
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.exists(ids_key(media_type))
+        pipe.exists(fresh_key(media_type))
+        has_list, is_fresh = pipe.execute()
+        if has_list:
+            if not is_fresh:
+                request_refresh(media_type)
+            return TrendingList(media_type)
+
+        request_refresh(media_type)
+        if rebuild_from_database(media_type):
+            return TrendingList(media_type)
+    except redis.RedisError as e:
+        logger.error(f"Trending {media_type} cache unavailable, serving catalog ranking: {e}")
+
+    return rank_from_database(media_type)
+
+
+def get_merged_trending(media_type: str = None):
+    """
+    Return the precomputed mixed-media trending feed, optionally one media type.
+
+    Stale per-type lists are refreshed the same way get_trending does. When
+    no feed is published yet the per-type lists are merged in the request;
+    when Redis is unreachable the catalog rankings are merged.
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.exists(merged_ids_key())
+        for name in DATABASE_FIELDS:
+            pipe.exists(fresh_key(name))
+        has_feed, *fresh = pipe.execute()
+        if has_feed:
+            for name, is_fresh in zip(DATABASE_FIELDS, fresh):
+                if not is_fresh:
+                    request_refresh(name)
+            return TrendingList("all", ids=merged_ids_key(media_type))
+    except redis.RedisError as e:
+        logger.error(f"Merged trending cache unavailable, merging per request: {e}")
+
+    names = [media_type] if media_type else list(DATABASE_FIELDS)
+    lists = {name: get_trending(name)[:] for name in names}
+    return [{**item, "media_type": name} for name, item in merge_trending(lists)]
+
+
+class TrendingList:
+    """
+    Lazy, sliceable view over a published trending list.
+
+    Supports len() and slicing so it can be handed straight to a paginator;
+    each slice costs a single round trip and only decodes the requested page.
+    """
+
+    def __init__(self, media_type: str, ids: str = None):
+        self.media_type = media_type
+        self.keys = [ids or ids_key(media_type), items_key(media_type)]
+
+    def __len__(self):
+        return get_redis().zcard(self.keys[0])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+
+        if index.step not in (None, 1):
+            raise ValueError("TrendingList does not support slice steps")
+        start = index.start or 0
+        stop = len(self) if index.stop is None else index.stop
+        if stop <= start:
+            return []
+
+        payloads = get_slice_script()(keys=self.keys, args=[start, stop - 1])
+        return [json.loads(payload) for payload in payloads if payload is not None]
+
+
+async def apublished_count(ids: str, media_types) -> int:
+    """
+    Size of a published trending list for async views, 0 when nothing is
+    published. Lists of the given media types that went stale get a refresh
+    queued, as get_trending does.
+    """
+    client, _ = get_async_redis()
+    pipe = client.pipeline(transaction=False)
+    pipe.zcard(ids)
+    for media_type in media_types:
+        pipe.exists(fresh_key(media_type))
+    count, *fresh = await pipe.execute()
+
+    stale = [media_type for media_type, is_fresh in zip(media_types, fresh) if not is_fresh]
+    if count and stale:
+        await sync_to_async(lambda: [request_refresh(media_type) for media_type in stale])()
+    return count
+
+
+async def apublished_slice(ids: str, items: str, start: int, stop: int) -> list:
+    """Items start..stop (exclusive) of a published trending list, in one round trip"""
+    if stop <= start:
+        return []
+    _, script = get_async_redis()
+    payloads = await script(keys=[ids, items], args=[start, stop - 1])
+    return [json.loads(payload) for payload in payloads if payload is not None]
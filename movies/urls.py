@@ -1,11 +1,28 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MovieViewSet, TvShowViewSet
+from . import async_views
+from .views import MovieViewSet, TrendingAllViewSet, TvShowViewSet, image_proxy
 
 router = DefaultRouter()
 router.register(r'movies', MovieViewSet, basename='movies')
-router.register(r'tvshows', MovieViewSet, basename='tvshow')
+router.register(r'tvshows', TvShowViewSet, basename='tvshow')
+router.register(r'trending/all', TrendingAllViewSet, basename='trending-all')
+
+# Async read routes, matched before the router; each hands what it does not
+# serve (writes, filters, other formats) to the viewset behind the same URL
+async_urlpatterns = [
+    path('movies/', async_views.list_view("movie")),
+    path('movies/trending/', async_views.trending_view("movie")),
+    path('movies/<int:pk>/', async_views.detail_view("movie")),
+    path('tvshows/', async_views.list_view("tv")),
+    path('tvshows/trending/', async_views.trending_view("tv")),
+    path('tvshows/<int:pk>/', async_views.detail_view("tv")),
+    path('trending/all/', async_views.trending_all),
+]
 
 urlpatterns = [
+    path('images/<str:size>/<str:name>', image_proxy, name='image-proxy'),
+    *(async_urlpatterns if settings.ASYNC_READS else []),
     path('', include(router.urls)),
 ]
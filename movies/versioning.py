@@ -0,0 +1,51 @@
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "catalog:version"
+
+
+def catalog_version():
+    """
+    Nanosecond timestamp of the last catalog change, or None when the cache
+    is unreachable. A missing stamp is recreated as "now", which only makes
+    clients refetch once.
+    """
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+    except RedisError as e:
+        logger.warning(f"Catalog version unavailable: {e}")
+        return None
+
+
+async def acatalog_version():
+    """catalog_version() for async views, through the async cache API"""
+    try:
+        version = await cache.aget(VERSION_KEY)
+        if version is None:
+            await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+            version = await cache.aget(VERSION_KEY)
+        return version
+    except RedisError as e:
+        logger.warning(f"Catalog version unavailable: {e}")
+        return None
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed once the current transaction commits"""
+    def bump():
+        try:
+            cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+        except RedisError as e:
+            logger.error(f"Failed to bump the catalog version: {e}")
+
+    transaction.on_commit(bump)
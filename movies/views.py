@@ -1,13 +1,403 @@
+from functools import lru_cache
+
+import requests
+
 from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.decorators import action
-from django.core.cache import cache
-from .models import Movie
-from .serializers import MovieSerializer, TvShowSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from .filters import CatalogFilterBackend
+from .images import ImageNotFound, get_variant
+from .history import new_entries, rising_titles, title_history
+from .models import Movie, TitleCredit, TvShow
+from .pagination import CatalogPagination
+from .renderers import ORJSONRenderer
+from .serializers import MovieSerializer, TvShowSerializer, TrendingSnapshotSerializer
+from .trending import DATABASE_FIELDS, get_merged_trending, get_trending
+from .versioning import catalog_version
+from cinewhisper.throttling import ThrottledWritesMixin
+
+
+@lru_cache(maxsize=None)
+def serializer_field_names(serializer_class) -> tuple:
+    """Field names of a serializer in output order; building the fields is costly"""
+    return tuple(serializer_class().fields)
+
+
+def value_rows(queryset, fields, media_type):
+    """
+    Project a queryset to serializer fields with values() and return it with
+    a builder turning each row into the serializer's output, fields in order
+    """
+    # id and popularity are always read: keyset cursors are built from them
+    columns = list(dict.fromkeys([name for name in fields if name != 'media_type'] + ['id', 'popularity']))
+
+    def build(row):
+        return {name: media_type if name == 'media_type' else row[name] for name in fields}
+
+    return queryset.values(*columns), build
+
+
+def int_param(request, name, default, maximum):
+    """Read a positive integer query parameter"""
+    value = request.query_params.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: "Must be an integer."})
+    if not 0 < value <= maximum:
+        raise ValidationError({name: f"Must be between 1 and {maximum}."})
+    return value
+
+
+class NotModified(Exception):
+    """Raised by ConditionalCatalogMixin to answer a request with a 304"""
+
+
+class ConditionalCatalogMixin:
+    """
+    ETag, Last-Modified and Cache-Control for GET routes that only depend on
+    the catalog. Both validators come from the catalog version stamp bumped
+    at ingestion, so a conditional request is answered with a 304 right
+    after authentication, before any query or serialization.
+    Actions listed in uncached_actions depend on other data and are skipped.
+    """
+    uncached_actions = {'also_favourited'}
+
+    def conditional_validators(self, request):
+        """(etag, last_modified) for this request, or None when it is not cacheable"""
+        if request.method not in ('GET', 'HEAD') or self.action in self.uncached_actions:
+            return None
+        version = catalog_version()
+        if version is None:
+            return None
+        # The rendered format is part of the representation
+        etag = f'"{version}-{request.accepted_renderer.format}"'
+        return etag, version // 10 ** 9
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = self.conditional_validators(request)
+        if self.validators and get_conditional_response(
+            request, etag=self.validators[0], last_modified=self.validators[1]
+        ) is not None:
+            raise NotModified
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=304)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, 'validators', None)
+        if validators and response.status_code in (200, 304):
+            response['ETag'] = validators[0]
+            response['Last-Modified'] = http_date(validators[1])
+            patch_cache_control(response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class FastReadMixin:
+    """
+    Serializer-free list and retrieve.
+
+    Rows are read with values() projected to the serializer's fields, in
+    the serializer's field order, and media_type is added as a constant, so
+    the rendered JSON is byte-for-byte what the serializer would produce
+    without DRF's per-field work. Deployments opt in with the
+    CATALOG_FAST_READS setting (fast_reads overrides it per view), for the
+    actions listed in fast_read_actions; rendering goes through ORJSONRenderer.
+    """
+    fast_read_actions = {'list', 'retrieve'}
+    # None follows settings.CATALOG_FAST_READS
+    fast_reads = None
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def fast_read(self):
+        enabled = settings.CATALOG_FAST_READS if self.fast_reads is None else self.fast_reads
+        return enabled and self.action in self.fast_read_actions
+
+    def read_fields(self):
+        """Serializer field names in output order"""
+        return serializer_field_names(self.get_serializer_class())
+
+    def rows(self, queryset):
+        """Project a queryset to the serialized fields and return a row builder"""
+        return value_rows(queryset, self.read_fields(), self.media_type)
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_read():
+            return super().list(request, *args, **kwargs)
+
+        queryset, build = self.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([build(row) for row in page])
+        return Response([build(row) for row in queryset])
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.fast_read():
+            return super().retrieve(request, *args, **kwargs)
+
+        queryset, build = self.rows(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return Response(build(row))
+
+
+# Keys of cached trending items (TMDb results, or catalog rows in their shape)
+TRENDING_ITEM_KEYS = tuple(dict.fromkeys(
+    ['id' if name == 'tmdb_id' else name for names in DATABASE_FIELDS.values() for name in names] + ['media_type']
+))
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,title,poster_path and ?exclude=overview on read routes.
+
+    The response is trimmed to the chosen serializer fields and the query
+    only loads their columns (plus the keys the views rely on), so a
+    poster grid never reads the overview text. Trending lists, which are
+    served from the cache, are trimmed to the same keys.
+    """
+    always_loaded = ('id', 'tmdb_id', 'popularity')
+
+    def field_params(self):
+        """The raw fields/exclude name lists, or None for either when absent"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None, None
+        params = request.query_params
+
+        def names(param):
+            value = params.get(param)
+            return [name.strip() for name in value.split(',') if name.strip()] if value else None
+
+        return names('fields'), names('exclude')
+
+    def read_fields(self):
+        """Serializer field names in output order, narrowed by fields/exclude"""
+        available = super().read_fields()
+        fields, exclude = self.field_params()
+        if fields is None and exclude is None:
+            return available
+
+        self.check_field_names(available, fields, exclude)
+        selected = [name for name in available if fields is None or name in fields]
+        return tuple(name for name in selected if name not in (exclude or []))
+
+    @staticmethod
+    def check_field_names(available, fields, exclude):
+        for param, names in (('fields', fields), ('exclude', exclude)):
+            unknown = sorted(set(names or []) - set(available))
+            if unknown:
+                raise ValidationError({param: f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(available)}."})
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, exclude = self.field_params()
+        if fields is None and exclude is None:
+            return queryset
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = [name for name in self.read_fields() if name in model_fields]
+        return queryset.only(*dict.fromkeys(columns + list(self.always_loaded)))
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields, exclude = self.field_params()
+        if fields is None and exclude is None:
+            return serializer
+
+        keep = set(self.read_fields())
+        target = getattr(serializer, 'child', serializer)
+        for name in list(target.fields):
+            if name not in keep:
+                target.fields.pop(name)
+        return serializer
+
+    def trim_items(self, items):
+        """Apply fields/exclude, checked against TRENDING_ITEM_KEYS, to cached trending items"""
+        fields, exclude = self.field_params()
+        if fields is None and exclude is None:
+            return items
+        self.check_field_names(TRENDING_ITEM_KEYS, fields, exclude)
+        return [
+            {key: value for key, value in item.items()
+             if (fields is None or key in fields) and key not in (exclude or [])}
+            for item in items
+        ]
+
+
+class TrendingHistoryMixin:
+    """
+    Trend analytics endpoints served from the trending snapshot history.
+    Viewsets set media_type to the snapshot media type they cover.
+    """
+    media_type = None
+
+    def with_titles(self, entries):
+        """Attach the catalog record of each snapshot entry, keeping the snapshot order"""
+        titles = self.get_queryset().in_bulk([entry["snapshot"].object_id for entry in entries])
+
+        results = []
+        for entry in entries:
+            snapshot = entry.pop("snapshot")
+            title = titles.get(snapshot.object_id)
+            data = self.get_serializer(title).data if title else {"id": snapshot.object_id}
+            results.append({**data, "rank": snapshot.rank, **entry})
+        return results
+
+    def paginated(self, results):
+        paginator = PageNumberPagination()
+        paginator.page_size = self.request.query_params.get('page_size', 10)
+        page = paginator.paginate_queryset(results, self.request)
+        return paginator.get_paginated_response(page)
+
+    @action(detail=False, methods=['get'], url_path='trending/rising')
+    def trending_rising(self, request):
+        """
+        GET /<media>/trending/rising?hours=24 - Titles that climbed the ranking
+        since the run `hours` ago, biggest climbers first.
+        """
+        hours = int_param(request, "hours", 24, 24 * 90)
+        entries = rising_titles(self.media_type, hours)
+        return self.paginated(self.with_titles(entries))
+
+    @action(detail=False, methods=['get'], url_path='trending/new')
+    def trending_new(self, request):
+        """
+        GET /<media>/trending/new?days=7 - Titles in the latest run that were
+        not trending in the previous `days` days.
+        """
+        days = int_param(request, "days", 7, 365)
+        entries = [{"snapshot": snapshot} for snapshot in new_entries(self.media_type, days)]
+        return self.paginated(self.with_titles(entries))
+
+    @action(detail=True, methods=['get'], url_path='history')
+    def history(self, request, pk=None):
+        """
+        GET /<media>/{id}/history?days=30 - Trending rank and popularity of a
+        title for each run over the last `days` days.
+        """
+        title = self.get_object()
+        days = int_param(request, "days", 30, 365)
+        snapshots = title_history(title, days)
+        return Response(TrendingSnapshotSerializer(snapshots, many=True).data)
+
+
+class SearchMixin:
+    """Ranked full-text search over the title, original title and overview"""
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        GET /<media>/search?q=... - Titles matching q, best matches first.
+        Supports web-search syntax: quoted phrases, OR and -excluded words.
+        """
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        query = SearchQuery(term, config=settings.SEARCH_CONFIG, search_type="websearch")
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F("search_vector"), query))
+            .order_by("-search_rank", "-popularity")
+        )
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class SimilarTitlesMixin:
+    """
+    Recommendations for a single title: content-based neighbours from the
+    precomputed lists, and titles favourited together with it.
+    """
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk=None):
+        """
+        GET /<media>/{id}/similar - Titles most like this one, best match first.
+        Reads the stored top-k list, so the cost is independent of catalog size.
+        """
+        title = self.get_object()
+        entry = title.similar_titles.first()
+        if entry is None:
+            return Response({"results": []})
+
+        neighbours = self.get_queryset().in_bulk(entry.neighbour_ids)
+        results = [
+            {**self.get_serializer(neighbours[neighbour_id]).data, "similarity": score}
+            for neighbour_id, score in zip(entry.neighbour_ids, entry.scores)
+            if neighbour_id in neighbours
+        ]
+        return Response({"results": results})
+
+    @action(detail=True, methods=['get'], url_path='also-favourited')
+    def also_favourited(self, request, pk=None):
+        """
+        GET /<media>/{id}/also-favourited?limit=20 - Movies and TV shows most
+        often favourited by the users who favourited this title.
+        """
+        # Favourites belong to the users app; the catalog only calls into it here
+        from users.cooccurrence import also_favourited
 
+        title = self.get_object()
+        limit = int_param(request, "limit", 20, 100)
+        return Response({"results": also_favourited(title, limit)})
 
-class MovieViewSet(viewsets.ModelViewSet):
+
+class TitleDetailsMixin:
+    """Details, credits and keywords gathered by the enrichment stage"""
+
+    @action(detail=True, methods=['get'], url_path='details')
+    def details(self, request, pk=None):
+        """
+        GET /<media>/{id}/details - Runtime, status, tagline, keywords, cast and
+        key crew. 404 until the title has been enriched.
+        """
+        title = self.get_object()
+        details = title.title_details.first()
+        if details is None:
+            return Response({"error": "No details yet"}, status=404)
+
+        credits = {TitleCredit.CAST: [], TitleCredit.CREW: []}
+        rows = (
+            title.credits
+            .order_by('role', 'order')
+            .values_list('role', 'person_id', 'name', 'credit')
+        )
+        for role, person_id, name, credit in rows:
+            key = "character" if role == TitleCredit.CAST else "job"
+            credits[role].append({"id": person_id, "name": name, key: credit})
+
+        return Response({
+            "runtime": details.runtime,
+            "status": details.status,
+            "tagline": details.tagline,
+            "keywords": details.keywords,
+            "cast": credits[TitleCredit.CAST],
+            "crew": credits[TitleCredit.CREW],
+            "fetched_at": details.fetched_at,
+        })
+
+
+class MovieViewSet(ThrottledWritesMixin, ConditionalCatalogMixin, SparseFieldsMixin, FastReadMixin, SearchMixin, TrendingHistoryMixin, SimilarTitlesMixin, TitleDetailsMixin, viewsets.ModelViewSet):
     """
     ModelViewSet to Movies
     Also includes custom endpoints for fetching trending movies and trending TV shows.
@@ -15,13 +405,18 @@ class MovieViewSet(viewsets.ModelViewSet):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     permission_classes = [permissions.AllowAny]
+    media_type = "movie"
+    date_field = "release_date"
+    throttle_scope = "catalog-write"
+    filter_backends = [CatalogFilterBackend]
+    pagination_class = CatalogPagination
 
     @action(detail=False, methods=['get'], url_path='trending')
     def trending_movies(self, request):
         """
-        GET /movies/trending/movies - Fetch trending movies from cache.
+        GET /movies/trending - Fetch trending movies from cache.
         """
-        trending_data = cache.get("trending_movies")
+        trending_data = get_trending("movie")
 
         if not trending_data:
             return Response({"error": "No trending movies"}, status=404)
@@ -30,25 +425,30 @@ class MovieViewSet(viewsets.ModelViewSet):
         paginator = PageNumberPagination()
         paginator.page_size = request.query_params.get('page_size', 10)
         page = paginator.paginate_queryset(trending_data, request)
-        return paginator.get_paginated_response(page)
+        return paginator.get_paginated_response(self.trim_items(page))
 
 
 
-class TvShowViewSet(viewsets.ModelViewSet):
+class TvShowViewSet(ThrottledWritesMixin, ConditionalCatalogMixin, SparseFieldsMixin, FastReadMixin, SearchMixin, TrendingHistoryMixin, SimilarTitlesMixin, TitleDetailsMixin, viewsets.ModelViewSet):
     """
     ModelViewSet to TvShow
     Also includes custom endpoints for fetching trending movies and trending TV shows
     """
-    queryset = Movie.objects.all()
+    queryset = TvShow.objects.all()
     serializer_class = TvShowSerializer
     permission_classes = [permissions.AllowAny]
+    media_type = "tv"
+    date_field = "first_air_date"
+    throttle_scope = "catalog-write"
+    filter_backends = [CatalogFilterBackend]
+    pagination_class = CatalogPagination
 
     @action(detail=False, methods=['get'], url_path='trending')
     def trending_tv_shows(self, request):
         """
-        GET /movies/trending/tv_shows - Fetch trending TV shows from cache.
+        GET /tvshows/trending - Fetch trending TV shows from cache.
         """
-        trending_data = cache.get("trending_tv_shows")
+        trending_data = get_trending("tv")
 
         if not trending_data:
             return Response({"error": "No trending TV shows"}, status=404)
@@ -58,4 +458,64 @@ class TvShowViewSet(viewsets.ModelViewSet):
         paginator.page_size = request.query_params.get('page_size', 10)
         page = paginator.paginate_queryset(trending_data, request)
 
-        return paginator.get_paginated_response(page) 
+        return paginator.get_paginated_response(self.trim_items(page))
+
+
+class TrendingAllViewSet(ConditionalCatalogMixin, SparseFieldsMixin, viewsets.ViewSet):
+    """Movies and TV shows trending together, merged at ingestion"""
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+    media_types = ("movie", "tv")
+
+    def list(self, request):
+        """
+        GET /trending/all?media_type=movie|tv - Trending movies and TV shows
+        in one feed, most popular first. Each item carries its media_type;
+        pages are stable slices of the order precomputed at ingestion.
+        """
+        media_type = request.query_params.get('media_type') or None
+        if media_type is not None and media_type not in self.media_types:
+            raise ValidationError({"media_type": f"Must be one of: {', '.join(self.media_types)}."})
+
+        trending_data = get_merged_trending(media_type)
+        if not trending_data:
+            return Response({"error": "No trending titles"}, status=404)
+
+        paginator = PageNumberPagination()
+        paginator.page_size = request.query_params.get('page_size', 10)
+        page = paginator.paginate_queryset(trending_data, request)
+        return paginator.get_paginated_response(self.trim_items(page))
+
+
+
+@require_GET
+def image_proxy(request, size, name):
+    """
+    GET /images/{size}/{name}?format=webp|jpeg - A TMDb poster or backdrop
+    scaled to one of the proxy's widths (w92, w185, w342, w780). Without
+    ?format=, WebP is sent to clients that accept it and JPEG otherwise.
+    """
+    output = request.GET.get("format")
+    negotiated = output is None
+    if negotiated:
+        output = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+
+    # TMDb never reuses an image path, so a variant never changes
+    etag = f'"{size}-{output}-{name}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            data, content_type = get_variant(name, size, output)
+        except ValueError as e:
+            return HttpResponse(str(e), status=400, content_type="text/plain")
+        except ImageNotFound:
+            raise Http404("No such image")
+        except requests.RequestException:
+            return HttpResponse("Image unavailable", status=502, content_type="text/plain")
+        response = HttpResponse(data, content_type=content_type)
+
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=settings.IMAGE_CACHE_MAX_AGE, immutable=True)
+    if negotiated:
+        patch_vary_headers(response, ["Accept"])
+    return response
@@ -0,0 +1,58 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import cached_user_fields
+from .models import User
+
+# Enough of the row to authenticate and authorise a request; anything else
+# is loaded from the database the first time a view reads it
+CACHED_FIELDS = (
+    "user_id", "username", "email", "is_verified", "is_active", "is_staff", "is_superuser", "token_version",
+)
+
+
+def load_user_fields(user_id):
+    return User.objects.filter(pk=user_id).values(*CACHED_FIELDS).first()
+
+
+def user_from_fields(fields: dict) -> User:
+    """A User as if loaded with .only(*CACHED_FIELDS): other fields load on first access"""
+    # from_db expects the values in model field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in fields]
+    return User.from_db("default", names, [fields[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the user without a query per request.
+
+    The token is validated as usual; the user comes from the per-process and
+    shared user cache, which is dropped whenever the user is saved, deleted
+    or has their tokens revoked. Tokens whose token_version claim is behind
+    the user's are rejected. Claims such as email are not trusted for the
+    user itself since they may be hours old.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Needs the password hash, which is never cached
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        fields = cached_user_fields(user_id, lambda: load_user_fields(user_id))
+        if fields is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not fields["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if validated_token.get("token_version", 0) != fields["token_version"]:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        return user_from_fields(fields)
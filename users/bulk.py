@@ -0,0 +1,144 @@
+import uuid
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.utils import timezone
+
+from movies.models import Movie, TvShow
+
+from .cache import bump_favourites_version
+from .cooccurrence import lock_user
+from .models import Favourite
+from .tasks import pair_favourites, unpair_favourites
+
+CONTENT_TYPES = {"movie": Movie, "tvshow": TvShow}
+
+# Favourites that already exist (including ones a concurrent request just
+# inserted) are skipped; RETURNING yields only the rows written here. They
+# are stored unpaired, for the pair_favourites task to count
+INSERT_SQL = f"""
+INSERT INTO {Favourite._meta.db_table} (favourite_id, user_id, content_type_id, object_id, added_at, paired)
+SELECT item.favourite_id, %(user_id)s, item.content_type_id, item.object_id, %(added_at)s, false
+FROM unnest(%(ids)s::uuid[], %(content_types)s::int[], %(object_ids)s::int[])
+    AS item(favourite_id, content_type_id, object_id)
+ON CONFLICT (user_id, content_type_id, object_id) DO NOTHING
+RETURNING content_type_id, object_id
+"""
+
+DELETE_SQL = f"""
+DELETE FROM {Favourite._meta.db_table} f
+USING unnest(%(content_types)s::int[], %(object_ids)s::int[]) AS item(content_type_id, object_id)
+WHERE f.user_id = %(user_id)s AND f.content_type_id = item.content_type_id AND f.object_id = item.object_id
+RETURNING f.content_type_id, f.object_id, f.paired
+"""
+
+# The favourites a bulk removal's pairs are dropped against
+PAIRED_SQL = f"""
+SELECT content_type_id, object_id FROM {Favourite._meta.db_table} WHERE user_id = %(user_id)s AND paired
+"""
+
+
+def content_type_of(name: str):
+    return ContentType.objects.get_for_model(CONTENT_TYPES[name])
+
+
+def group_by_type(items: list) -> dict:
+    """{content_type: set of object_ids} of (content_type, object_id) items"""
+    grouped = {}
+    for content_type, object_id in items:
+        grouped.setdefault(content_type, set()).add(object_id)
+    return grouped
+
+
+def existing_titles(items: list) -> set:
+    """The items whose title exists, one IN query per content type"""
+    found = set()
+    for content_type, object_ids in group_by_type(items).items():
+        ids = CONTENT_TYPES[content_type].objects.filter(id__in=object_ids).values_list('id', flat=True)
+        found.update((content_type, pk) for pk in ids)
+    return found
+
+
+def content_type_ids(items: list) -> tuple:
+    """Parallel content type id and object id arrays of (content_type, object_id) items"""
+    return [content_type_of(content_type).pk for content_type, _ in items], [object_id for _, object_id in items]
+
+
+def content_type_names(rows) -> set:
+    """(content_type, object_id) items of (content_type_id, object_id) rows"""
+    names = {content_type_of(name).pk: name for name in CONTENT_TYPES}
+    return {(names[content_type_id], object_id) for content_type_id, object_id in rows}
+
+
+def result(content_type, object_id, status):
+    return {"content_type": content_type, "object_id": object_id, "status": status}
+
+
+def bulk_add(user, items: list) -> list:
+    """
+    Favourite many titles at once. Returns one result per item: added,
+    exists (already a favourite) or not_found (no such title).
+
+    Only the rows the INSERT actually wrote are reported as added; rows a
+    concurrent request inserted first count as existing. Counting their
+    co-occurrences grows with the user's favourites, so it is left to the
+    pair_favourites task once the insert commits.
+    """
+    items = list(dict.fromkeys(items))
+    titles = existing_titles(items)
+    candidates = [item for item in items if item in titles]
+
+    added = set()
+    if candidates:
+        content_types, object_ids = content_type_ids(candidates)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(INSERT_SQL, {
+                "user_id": user.pk,
+                "added_at": timezone.now(),
+                "ids": [str(uuid.uuid4()) for _ in candidates],
+                "content_types": content_types,
+                "object_ids": object_ids,
+            })
+            inserted = cursor.fetchall()
+            # Raw inserts send no post_save, so pair and invalidate here
+            if inserted:
+                user_id = str(user.pk)
+                transaction.on_commit(lambda: pair_favourites.delay(user_id))
+                bump_favourites_version(user.pk)
+        added = content_type_names(inserted)
+
+    return [
+        result(*item, "added" if item in added else "exists" if item in titles else "not_found")
+        for item in items
+    ]
+
+
+def bulk_remove(user, items: list) -> list:
+    """
+    Unfavourite many titles at once. Returns one result per item: removed,
+    or not_favourited when it was not a favourite.
+
+    The pairs of the removed favourites are dropped by the unpair_favourites
+    task, against the favourites paired at the time of the removal.
+    """
+    items = list(dict.fromkeys(items))
+    removed = set()
+    if items:
+        content_types, object_ids = content_type_ids(items)
+        with transaction.atomic(), connection.cursor() as cursor:
+            lock_user(user.pk)
+            # One DELETE rather than a post_delete round trip per favourite;
+            # Favourite has no dependent rows, so only the signal work is skipped
+            cursor.execute(DELETE_SQL, {"user_id": user.pk, "content_types": content_types, "object_ids": object_ids})
+            deleted = cursor.fetchall()
+            unpair = [(content_type_id, object_id) for content_type_id, object_id, paired in deleted if paired]
+            if unpair:
+                cursor.execute(PAIRED_SQL, {"user_id": user.pk})
+                others = cursor.fetchall()
+                user_id = str(user.pk)
+                transaction.on_commit(lambda: unpair_favourites.delay(user_id, unpair, others))
+            if deleted:
+                bump_favourites_version(user.pk)
+        removed = content_type_names((content_type_id, object_id) for content_type_id, object_id, _ in deleted)
+
+    return [result(*item, "removed" if item in removed else "not_favourited") for item in items]
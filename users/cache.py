@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from redis.exceptions import RedisError
+from rest_framework.response import Response
+
+from movies.versioning import catalog_version
+
+logger = logging.getLogger(__name__)
+
+
+def version_key(user_id) -> str:
+    return f"favourites:version:{user_id}"
+
+
+def favourites_version(user_id) -> int:
+    """
+    Current version of a user's favourites and profile. Versions are
+    timestamps, so one recreated after eviction never repeats an old ETag.
+    """
+    version = cache.get(version_key(user_id))
+    if version is None:
+        cache.add(version_key(user_id), time.time_ns(), timeout=None)
+        version = cache.get(version_key(user_id))
+    return version
+
+
+def after_commit_write(write, description: str, attempts: int = 3):
+    """
+    Run a cache write for a committed change, retrying briefly. Failures are
+    logged rather than raised: the database write has already gone through.
+    """
+    for attempt in range(attempts):
+        try:
+            write()
+            return
+        except RedisError as e:
+            if attempt + 1 == attempts:
+                logger.error(f"Could not {description} after {attempts} attempts: {e}")
+                return
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def bump_favourites_version(user_id):
+    """Invalidate a user's cached payloads and ETags once the transaction commits"""
+    transaction.on_commit(lambda: after_commit_write(
+        lambda: cache.set(version_key(user_id), time.time_ns(), timeout=None),
+        f"bump the favourites version of user {user_id}",
+    ))
+
+
+def cached_response(request, user_id, build):
+    """
+    Serve a per-user payload from the cache, keyed by the user's version,
+    the catalog version and the full request URL.
+
+    A request whose If-None-Match carries the current ETag gets a 304 from
+    the version lookups alone. Otherwise the cached payload is returned, or
+    build() is called and its data cached for FAVOURITES_CACHE_TIMEOUT.
+    Embedded titles change with the catalog, so ingestion invalidates both.
+    While the cache is unreachable build()'s data is served uncached.
+    """
+    try:
+        version = favourites_version(user_id)
+    except RedisError as e:
+        logger.error(f"Favourites cache unavailable, serving user {user_id} uncached: {e}")
+        version = None
+    catalog = catalog_version()
+    if version is None or catalog is None:
+        response = Response(build())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(f"{user_id}:{version}:{catalog}:{url}".encode()).hexdigest()
+    etag = f'"{digest}"'
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        key = f"favourites:payload:{digest}"
+        try:
+            data = cache.get(key)
+        except RedisError as e:
+            logger.error(f"Favourites cache unavailable, building user {user_id}'s payload: {e}")
+            data = None
+        if data is None:
+            data = build()
+            try:
+                cache.set(key, data, timeout=settings.FAVOURITES_CACHE_TIMEOUT)
+            except RedisError as e:
+                logger.error(f"Could not cache user {user_id}'s payload: {e}")
+        response = Response(data)
+    else:
+        response = Response(status=not_modified.status_code)
+
+    response["ETag"] = etag
+    # Per-user data: clients may keep it but must revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# Recently resolved users of this process: {user_id: (expires, fields)}
+_local_users = {}
+LOCAL_USERS_MAX = 10000
+_local_users_lock = threading.Lock()
+
+
+def user_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def cached_user_fields(user_id, load):
+    """
+    The fields authentication needs for a user, or None if there is no such
+    user. Looked up in this process for USER_CACHE_LOCAL_TIMEOUT seconds,
+    then in the shared cache for USER_CACHE_TIMEOUT, and only then loaded
+    from the database with load(), which is also used while the shared
+    cache is unreachable.
+    """
+    user_id = str(user_id)
+    now = time.monotonic()
+    entry = _local_users.get(user_id)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    try:
+        fields = cache.get(user_key(user_id))
+    except RedisError as e:
+        logger.error(f"User cache unavailable, loading user {user_id} from the database: {e}")
+        fields = None
+    if fields is None:
+        fields = load()
+        if fields is None:
+            return None
+        try:
+            cache.set(user_key(user_id), fields, timeout=settings.USER_CACHE_TIMEOUT)
+        except RedisError as e:
+            logger.error(f"Could not cache user {user_id}: {e}")
+
+    with _local_users_lock:
+        if len(_local_users) >= LOCAL_USERS_MAX:
+            for stale in [key for key, (expires, _) in _local_users.items() if expires <= now]:
+                del _local_users[stale]
+        if len(_local_users) < LOCAL_USERS_MAX:
+            _local_users[user_id] = (now + settings.USER_CACHE_LOCAL_TIMEOUT, fields)
+    return fields
+
+
+def invalidate_user(user_id):
+    """
+    Forget a user's cached fields once the transaction commits. Other
+    processes may keep their copy for up to USER_CACHE_LOCAL_TIMEOUT; if
+    the shared cache stays unreachable through the retries, its copy can
+    outlive a revocation by up to USER_CACHE_TIMEOUT.
+    """
+    def forget():
+        with _local_users_lock:
+            _local_users.pop(str(user_id), None)
+        after_commit_write(lambda: cache.delete(user_key(user_id)), f"forget cached user {user_id}")
+
+    transaction.on_commit(forget)
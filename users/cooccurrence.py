@@ -0,0 +1,184 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+
+from movies.serializers import serialize_title
+
+from .models import Favourite, FavouritePair, User
+
+# Ordered pairs touched by a change to `items` for one user: every pair
+# between two of the items, plus each item against the user's other paired
+# favourites (when `stored`) and the `extra` favourites, in both directions.
+PAIRS_SQL = """
+WITH items AS (
+    SELECT * FROM unnest(%(content_types)s::int[], %(object_ids)s::int[]) AS item(content_type_id, object_id)
+), others AS (
+    SELECT f.content_type_id, f.object_id FROM users_favourite f
+    WHERE %(stored)s AND f.user_id = %(user_id)s AND f.paired
+      AND (f.content_type_id, f.object_id) NOT IN (SELECT content_type_id, object_id FROM items)
+    UNION ALL
+    SELECT * FROM unnest(%(extra_content_types)s::int[], %(extra_object_ids)s::int[])
+), pairs AS (
+    SELECT a.content_type_id, a.object_id, b.content_type_id AS other_content_type_id, b.object_id AS other_object_id
+    FROM items a JOIN items b ON (a.content_type_id, a.object_id) <> (b.content_type_id, b.object_id)
+    UNION ALL
+    SELECT i.content_type_id, i.object_id, o.content_type_id, o.object_id FROM items i CROSS JOIN others o
+    UNION ALL
+    SELECT o.content_type_id, o.object_id, i.content_type_id, i.object_id FROM items i CROSS JOIN others o
+)
+"""
+
+INCREMENT_SQL = PAIRS_SQL + """
+INSERT INTO users_favouritepair (content_type_id, object_id, other_content_type_id, other_object_id, count)
+SELECT content_type_id, object_id, other_content_type_id, other_object_id, 1 FROM pairs
+ORDER BY 1, 2, 3, 4
+ON CONFLICT (content_type_id, object_id, other_content_type_id, other_object_id)
+DO UPDATE SET count = users_favouritepair.count + 1
+"""
+
+DECREMENT_SQL = PAIRS_SQL + """
+UPDATE users_favouritepair p SET count = GREATEST(p.count - 1, 0)
+FROM pairs
+WHERE p.content_type_id = pairs.content_type_id AND p.object_id = pairs.object_id
+  AND p.other_content_type_id = pairs.other_content_type_id AND p.other_object_id = pairs.other_object_id
+RETURNING p.id, p.count
+"""
+
+# The most recent favourites of a user seed the recommendations; each seed
+# contributes only its strongest neighbours, so the cost is bounded no matter
+# how many favourites or pairs exist.
+USER_RECOMMENDATIONS_SQL = """
+SELECT n.other_content_type_id, n.other_object_id, SUM(n.count) AS score
+FROM (
+    SELECT content_type_id, object_id FROM users_favourite
+    WHERE user_id = %(user_id)s ORDER BY added_at DESC LIMIT %(seeds)s
+) seed
+CROSS JOIN LATERAL (
+    SELECT p.other_content_type_id, p.other_object_id, p.count FROM users_favouritepair p
+    WHERE p.content_type_id = seed.content_type_id AND p.object_id = seed.object_id
+    ORDER BY p.count DESC LIMIT %(per_seed)s
+) n
+WHERE NOT EXISTS (
+    SELECT 1 FROM users_favourite f
+    WHERE f.user_id = %(user_id)s
+      AND f.content_type_id = n.other_content_type_id AND f.object_id = n.other_object_id
+)
+GROUP BY n.other_content_type_id, n.other_object_id
+ORDER BY score DESC, n.other_content_type_id, n.other_object_id
+LIMIT %(limit)s
+"""
+
+
+def pair_params(user_id, items: list, extra: list, stored: bool) -> dict:
+    return {
+        "user_id": user_id,
+        "stored": stored,
+        "content_types": [content_type_id for content_type_id, _ in items],
+        "object_ids": [object_id for _, object_id in items],
+        "extra_content_types": [content_type_id for content_type_id, _ in extra],
+        "extra_object_ids": [object_id for _, object_id in extra],
+    }
+
+
+def lock_user(user_id):
+    """
+    Lock a user's row until the transaction ends. Changes to one user's
+    pairs take turns on it, so each sees what the previous ones committed.
+    """
+    list(User.objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True))
+
+
+def adjust_pairs(user_id, items: list, delta: int, extra: list = (), stored: bool = True):
+    """
+    Add (delta=1) or remove (delta=-1) the co-occurrences of a user's
+    favourites `items`, given as (content_type_id, object_id) pairs.
+
+    Call after the favourites were stored or deleted. Each item is paired
+    with the other items, the user's other paired favourites (unless
+    stored is False) and `extra` (favourites deleted in the same operation
+    and already accounted for, or the snapshot to pair against instead).
+    """
+    if not items:
+        return
+    params = pair_params(user_id, items, list(extra), stored)
+    with transaction.atomic(), connection.cursor() as cursor:
+        lock_user(user_id)
+        if delta > 0:
+            cursor.execute(INCREMENT_SQL, params)
+            return
+        cursor.execute(DECREMENT_SQL, params)
+        emptied = [pk for pk, count in cursor.fetchall() if count == 0]
+        if emptied:
+            FavouritePair.objects.filter(pk__in=emptied, count=0).delete()
+
+
+def pair_pending(user_id) -> int:
+    """
+    Count the co-occurrences of a user's unpaired (bulk-added) favourites,
+    FAVOURITE_PAIR_BATCH per transaction. Each batch is paired with the
+    favourites paired before it. Returns the number of favourites paired.
+    """
+    paired = 0
+    while True:
+        with transaction.atomic():
+            lock_user(user_id)
+            pending = list(
+                Favourite.objects.filter(user_id=user_id, paired=False)
+                .values_list('pk', 'content_type_id', 'object_id')[:settings.FAVOURITE_PAIR_BATCH]
+            )
+            if not pending:
+                return paired
+            adjust_pairs(user_id, [(content_type_id, object_id) for _, content_type_id, object_id in pending], 1)
+            Favourite.objects.filter(pk__in=[pk for pk, _, _ in pending]).update(paired=True)
+        paired += len(pending)
+
+
+def title_neighbours(content_type_id: int, object_id: int, limit: int) -> list:
+    """Titles most often favourited together with one title, as (content_type_id, object_id, count)"""
+    return list(
+        FavouritePair.objects
+        .filter(content_type_id=content_type_id, object_id=object_id)
+        .order_by('-count', 'other_content_type_id', 'other_object_id')
+        .values_list('other_content_type_id', 'other_object_id', 'count')[:limit]
+    )
+
+
+def also_favourited(title, limit: int) -> list:
+    """Serialized titles most often favourited together with a Movie or TvShow, best first"""
+    content_type = ContentType.objects.get_for_model(title)
+    return hydrate(title_neighbours(content_type.pk, title.pk, limit))
+
+
+def user_recommendations(user_id, limit: int) -> list:
+    """Titles most often favourited alongside a user's favourites, excluding their own"""
+    with connection.cursor() as cursor:
+        cursor.execute(USER_RECOMMENDATIONS_SQL, {
+            "user_id": user_id,
+            "seeds": settings.FAVOURITE_RECOMMENDATION_SEEDS,
+            "per_seed": settings.FAVOURITE_NEIGHBOURS_PER_SEED,
+            "limit": limit,
+        })
+        return cursor.fetchall()
+
+
+def hydrate(entries: list) -> list:
+    """
+    Serialize (content_type_id, object_id, score) entries with their title,
+    one IN query per content type, keeping the entry order. Entries whose
+    title no longer exists are dropped.
+    """
+    wanted = {}
+    for content_type_id, object_id, _ in entries:
+        wanted.setdefault(content_type_id, set()).add(object_id)
+
+    titles = {}
+    for content_type_id, object_ids in wanted.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        for pk, title in model.objects.in_bulk(object_ids).items():
+            titles[(content_type_id, pk)] = serialize_title(title)
+
+    return [
+        {**titles[(content_type_id, object_id)], "score": score}
+        for content_type_id, object_id, score in entries
+        if (content_type_id, object_id) in titles
+    ]
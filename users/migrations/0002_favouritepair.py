@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Count the pairs of favourites stored before pairs were maintained incrementally
+BACKFILL_SQL = """
+INSERT INTO users_favouritepair (content_type_id, object_id, other_content_type_id, other_object_id, count)
+SELECT a.content_type_id, a.object_id, b.content_type_id, b.object_id, COUNT(*)
+FROM users_favourite a
+JOIN users_favourite b ON a.user_id = b.user_id
+    AND (a.content_type_id, a.object_id) <> (b.content_type_id, b.object_id)
+GROUP BY a.content_type_id, a.object_id, b.content_type_id, b.object_id;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavouritePair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('other_object_id', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='favourite',
+            index=models.Index(fields=['user', '-added_at'], name='favourite_user_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='favouritepair',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='favouritepair',
+            name='other_content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype'),
+        ),
+        migrations.AddIndex(
+            model_name='favouritepair',
+            index=models.Index(fields=['content_type', 'object_id', '-count'], name='favourite_pair_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favouritepair',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id', 'other_content_type', 'other_object_id'), name='unique_favourite_pair'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
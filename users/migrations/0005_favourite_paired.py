@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favourite',
+            name='paired',
+            field=models.BooleanField(default=True),
+        ),
+    ]
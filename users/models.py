@@ -3,8 +3,11 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
+from django.core.exceptions import ValidationError
 import uuid
 
+from .cache import invalidate_user
+
 class User(AbstractUser):
     """
     Custom User model extending Django's AbstractUser
@@ -22,9 +25,14 @@ class User(AbstractUser):
             upload_to="profile_pictures/",
             blank=True, null=True
     )
+    # Storage names of the processed sizes of profile_picture, filled in by
+    # the process_profile_picture task; "large" replaces the upload itself
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
     
     email = models.EmailField(unique=True)
     is_verified = models.BooleanField(default=False)
+    # Carried in every token; bumping it revokes all tokens issued before
+    token_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -35,6 +43,12 @@ class User(AbstractUser):
         """String representation of instances"""
         return f"{self.username}"
 
+    def revoke_tokens(self):
+        """Invalidate every access and refresh token issued to this user so far"""
+        User.objects.filter(pk=self.pk).update(token_version=models.F('token_version') + 1)
+        self.refresh_from_db(fields=['token_version'])
+        invalidate_user(self.pk)
+
 
 class Favourite(models.Model):
     """
@@ -53,20 +67,54 @@ class Favourite(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     content_object = GenericForeignKey("content_type", "object_id")
     added_at = models.DateTimeField(auto_now_add=True)
+    # False while the co-occurrences of a bulk-added favourite are left to
+    # the pair_favourites task; unpaired favourites count in no pair
+    paired = models.BooleanField(default=True)
 
     class Meta:
         unique_together = ["user", "content_type", "object_id"]
+        indexes = [
+            models.Index(fields=['user', '-added_at'], name='favourite_user_recent_idx'),
+        ]
 
     def clean(self):
-        """Validate that object_id is a valid instance of content_type"""
+        """
+        Validate that object_id is a valid instance of content_type.
+        Run by model forms; the API serializers validate before saving, so
+        save() does not repeat the lookup.
+        """
         model_class = self.content_type.model_class()
         if not model_class.objects.filter(id=self.object_id).exists():
             raise ValidationError("Invalid object_id: No matching movie or TV show found.")
 
-    def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+    def __str__(self):
+        return f"{self.user} - {self.content_object}"
+
+
+class FavouritePair(models.Model):
+    """
+    How many users favourited both of two titles.
+
+    Stored in both directions, so the neighbours of a title are a single
+    index range scan ordered by count. Maintained incrementally as
+    favourites are added and removed (see users.cooccurrence).
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveIntegerField()
+    other_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    other_object_id = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_type', 'object_id', 'other_content_type', 'other_object_id'],
+                name='unique_favourite_pair',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', '-count'], name='favourite_pair_top_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user} - {self.content_object}"
+        return f"{self.content_type_id}:{self.object_id} + {self.other_content_type_id}:{self.other_object_id} ({self.count})"
@@ -0,0 +1,7 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class FavouritePagination(PageNumberPagination):
+    """Page-number pagination for favourites with a client-chosen page size"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,109 @@
+import io
+import logging
+import secrets
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .cache import bump_favourites_version
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Longest side of each processed size, in pixels
+VARIANTS = {"large": 1024, "medium": 256, "small": 64}
+
+JPEG_QUALITY = 85
+
+# Leading bytes of the formats accepted for upload
+SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+
+
+def looks_like_image(upload) -> bool:
+    """Cheap upload check from the first bytes only; the file is decoded later, off the request"""
+    head = upload.read(12)
+    upload.seek(0)
+    is_webp = head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    return is_webp or head.startswith(SIGNATURES)
+
+
+def storage():
+    return User._meta.get_field('profile_picture').storage
+
+
+def render_variants(original) -> dict:
+    """
+    Decode an upload and encode each size as a JPEG.
+
+    The image is rotated upright from its EXIF orientation first; the
+    re-encoded files carry no EXIF, so location and camera data are dropped.
+    """
+    image = Image.open(original)
+    image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    else:
+        image = image.convert("RGB")
+
+    rendered = {}
+    for name, side in VARIANTS.items():
+        variant = image.copy()
+        variant.thumbnail((side, side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def delete_files(names):
+    for name in names:
+        storage().delete(name)
+
+
+def process_profile_picture(user_id):
+    """
+    Bring a user's processed sizes in line with their current profile_picture.
+
+    A new upload is decoded, downscaled into VARIANTS and replaced by its
+    "large" size; the raw upload and the previous sizes are deleted. A
+    removed picture has its sizes deleted. The swap only happens if the
+    picture did not change meanwhile, so a newer upload always wins.
+    """
+    row = User.objects.filter(pk=user_id).values('profile_picture', 'profile_picture_variants').first()
+    if row is None:
+        return
+    name, previous = row['profile_picture'], row['profile_picture_variants']
+    if (name and name == previous.get("large")) or (not name and not previous):
+        return
+
+    variants = {}
+    if name:
+        try:
+            with storage().open(name) as original:
+                rendered = render_variants(original)
+        except (OSError, Image.DecompressionBombError) as e:
+            logger.warning(f"Discarding unreadable profile picture {name} of user {user_id}: {e}")
+            rendered = None
+
+        if rendered is not None:
+            token = secrets.token_hex(8)
+            variants = {
+                size: storage().save(f"profile_pictures/{user_id}/{size}-{token}.jpg", ContentFile(data))
+                for size, data in rendered.items()
+            }
+
+    swapped = User.objects.filter(pk=user_id, profile_picture=name).update(
+        profile_picture=variants.get("large"), profile_picture_variants=variants,
+    )
+    if not swapped:
+        # Replaced again while this ran; the newer upload has its own task
+        delete_files(variants.values())
+        return
+
+    delete_files((set(previous.values()) | ({name} if name else set())) - set(variants.values()))
+    bump_favourites_version(user_id)
+    logger.info(f"Processed profile picture of user {user_id} into {len(variants)} sizes")
@@ -1,9 +1,55 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from movies.serializers import serialize_title
 from .models import Favourite, User
+from .pictures import looks_like_image
+from .tasks import process_profile_picture
+
+
+class ProfilePictureField(serializers.FileField):
+    """
+    An image upload checked by size and leading bytes only. Decoding is left
+    to the process_profile_picture task, so large photos cost the request no
+    more than streaming them to storage.
+    """
+
+    def to_internal_value(self, data):
+        upload = super().to_internal_value(data)
+        if upload.size > settings.PROFILE_PICTURE_MAX_BYTES:
+            raise serializers.ValidationError(
+                f"Profile pictures are limited to {settings.PROFILE_PICTURE_MAX_BYTES // 1024 ** 2} MB."
+            )
+        if not looks_like_image(upload):
+            raise serializers.ValidationError("Upload a JPEG, PNG, GIF or WebP image.")
+        return upload
+
+
+def schedule_picture_processing(user):
+    """Process the stored upload once the transaction that saved it commits"""
+    user_id = str(user.pk)
+    transaction.on_commit(lambda: process_profile_picture.delay(user_id))
+
+
+class ProfilePictureVariantsMixin:
+    """Exposes the processed picture sizes as URLs, or None while processing"""
+
+    def get_profile_picture_variants(self, obj):
+        variants = obj.profile_picture_variants
+        if not obj.profile_picture or obj.profile_picture.name != variants.get("large"):
+            return None
+        storage = obj.profile_picture.storage
+        request = self.context.get('request')
+        return {
+            size: request.build_absolute_uri(storage.url(name)) if request else storage.url(name)
+            for size, name in variants.items()
+        }
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -15,13 +61,16 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['username'] = user.username 
         token['email'] = user.email
         token['is_verified'] = user.is_verified
+        token['token_version'] = user.token_version
 
         return token
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(ProfilePictureVariantsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
+    profile_picture = ProfilePictureField(required=False, allow_null=True)
+    profile_picture_variants = serializers.SerializerMethodField()
 
     email = serializers.EmailField(
             required=True,
@@ -30,7 +79,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ['username', 'email', 'password', 'password2', 'profile_picture']
+        fields = ['username', 'email', 'password', 'password2', 'profile_picture', 'profile_picture_variants']
 
     def validate(self, data):
         if data['password'] != data['password2']:
@@ -46,25 +95,60 @@ class RegisterSerializer(serializers.ModelSerializer):
         )
         user.set_password(validated_data.get('password'))
         user.save()
+        if user.profile_picture:
+            schedule_picture_processing(user)
         return user
     
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(ProfilePictureVariantsMixin, serializers.ModelSerializer):
     """Serializer for the User model"""
-    profile_picture = serializers.ImageField(required=False, allow_null=True)
+    profile_picture = ProfilePictureField(required=False, allow_null=True)
+    profile_picture_variants = serializers.SerializerMethodField()
     email = serializers.EmailField(required=True)
 
     class Meta:
         model = User
         fields = "__all__"
-        read_only_fields = ["user_id", "created_at", "updated_at"]
+        read_only_fields = ["user_id", "created_at", "updated_at", "token_version", "profile_picture_variants"]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Import FavouriteSerializer here to avoid circular imports
-        from .serializers import FavouriteSerializer
-        self.fields['favourites'] = FavouriteSerializer(many=True, read_only=True)
+        self.fields['favourites'] = serializers.SerializerMethodField()
+
+    def update(self, instance, validated_data):
+        previous = instance.profile_picture.name
+        instance = super().update(instance, validated_data)
+        if 'profile_picture' in validated_data and instance.profile_picture.name != previous:
+            schedule_picture_processing(instance)
+        return instance
+
+    def get_favourites(self, obj):
+        """
+        The most recent favourites with their titles embedded, as the first
+        page of /favourites/; the rest is reached through `next`.
+        """
+        limit = settings.PROFILE_FAVOURITES_LIMIT
+        favourites = list(with_titles(obj.favourites.order_by('-added_at', 'favourite_id'))[:limit + 1])
+        results = FavouriteSerializer(favourites[:limit], many=True, context=self.context).data
+        if len(favourites) <= limit:
+            return {"count": len(results), "next": None, "results": results}
+
+        url = reverse('favourites-list') + '?' + urlencode({'page': 2, 'page_size': limit})
+        request = self.context.get('request')
+        return {
+            "count": obj.favourites.count(),
+            "next": request.build_absolute_uri(url) if request else url,
+            "results": results,
+        }
+
+
+def with_titles(queryset):
+    """
+    Favourites queryset that loads each favourite's title in one IN query
+    per content type instead of one query per favourite
+    """
+    return queryset.select_related('content_type').prefetch_related('content_object')
 
 
 class FavouriteSerializer(serializers.ModelSerializer):
@@ -73,10 +157,16 @@ class FavouriteSerializer(serializers.ModelSerializer):
             queryset=ContentType.objects.filter(model__in=["movie", "tvshow"]),
             slug_field="model"
     )
+    item = serializers.SerializerMethodField()
 
     class Meta:
         model = Favourite
-        fields = ["user", "content_type", "object_id", "added_at"]
+        fields = ["favourite_id", "user", "content_type", "object_id", "added_at", "item"]
+
+    def get_item(self, obj):
+        """The favourited movie or TV show, or None if it no longer exists"""
+        title = obj.content_object
+        return serialize_title(title) if title is not None else None
 
     def validate(self, data):
         """Ensure that object_id exists in the specified content_type"""
@@ -86,3 +176,22 @@ class FavouriteSerializer(serializers.ModelSerializer):
         return data
 
 
+class FavouriteItemSerializer(serializers.Serializer):
+    """One (content_type, object_id) pair of a bulk favourites request"""
+    content_type = serializers.ChoiceField(choices=["movie", "tvshow"])
+    object_id = serializers.IntegerField(min_value=1)
+
+
+class FavouriteBulkSerializer(serializers.Serializer):
+    """Titles to add to and remove from the user's favourites in one request"""
+    add = FavouriteItemSerializer(many=True, required=False, default=list)
+    remove = FavouriteItemSerializer(many=True, required=False, default=list)
+
+    def validate(self, data):
+        total = len(data["add"]) + len(data["remove"])
+        if not total:
+            raise serializers.ValidationError("Provide items to add or remove.")
+        if total > settings.FAVOURITES_BULK_MAX:
+            raise serializers.ValidationError(f"At most {settings.FAVOURITES_BULK_MAX} items per request.")
+        return data
+
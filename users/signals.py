@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_favourites_version, invalidate_user
+from .cooccurrence import adjust_pairs, lock_user
+from .models import Favourite, User
+
+
+@receiver(post_save, sender=Favourite)
+def count_added_favourite(sender, instance, created, **kwargs):
+    """Pair a new favourite with the user's other favourites"""
+    if created:
+        adjust_pairs(instance.user_id, [(instance.content_type_id, instance.object_id)], 1)
+    bump_favourites_version(instance.user_id)
+
+
+@receiver(pre_delete, sender=Favourite)
+def lock_removed_favourite(sender, instance, **kwargs):
+    """
+    Take the user's pair lock before the row goes, and re-read whether the
+    favourite was paired: pair_favourites may have paired it since it was loaded.
+    """
+    lock_user(instance.user_id)
+    instance.paired = Favourite.objects.filter(pk=instance.pk).values_list('paired', flat=True).first() or False
+
+
+@receiver(post_delete, sender=Favourite)
+def count_removed_favourite(sender, instance, origin=None, **kwargs):
+    """
+    Unpair a removed favourite from the user's other favourites.
+
+    Queryset and cascade deletes remove every row before the first
+    post_delete, so the favourites of the same user already handled for
+    this deletion are paired in explicitly; each pair is dropped once.
+    Unpaired favourites were never counted and are skipped.
+    """
+    bump_favourites_version(instance.user_id)
+    if not instance.paired:
+        return
+    item = (instance.content_type_id, instance.object_id)
+    handled = {}
+    if origin is not None and origin is not instance:
+        handled = origin.__dict__.setdefault('_unpaired_favourites', {})
+    removed_with = handled.setdefault(instance.user_id, [])
+    adjust_pairs(instance.user_id, [item], -1, extra=removed_with)
+    removed_with.append(item)
+
+
+@receiver(post_save, sender=User)
+def profile_changed(sender, instance, **kwargs):
+    """The cached profile and the user cached for authentication embed the user's fields"""
+    bump_favourites_version(instance.pk)
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -0,0 +1,25 @@
+from celery import shared_task
+
+from .cooccurrence import adjust_pairs, pair_pending
+from .pictures import process_profile_picture as process
+
+
+@shared_task
+def process_profile_picture(user_id: str):
+    """Decode, strip and downscale a user's uploaded profile picture"""
+    process(user_id)
+
+
+@shared_task
+def pair_favourites(user_id: str):
+    """Count the co-occurrences of a user's bulk-added favourites"""
+    pair_pending(user_id)
+
+
+@shared_task
+def unpair_favourites(user_id: str, items: list, others: list):
+    """
+    Drop the co-occurrences of favourites removed in bulk, against the
+    favourites that were paired when they were removed
+    """
+    adjust_pairs(user_id, [tuple(item) for item in items], -1, extra=[tuple(item) for item in others], stored=False)
@@ -1,3 +1,620 @@
-from django.test import TestCase
+import io
+import tempfile
+import threading
+import time
+from unittest import mock
+import redis
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from movies.models import Movie, TvShow
+from movies.versioning import bump_catalog_version
+from cinewhisper.throttling import get_script
+from cinewhisper.celery import app
+from . import bulk, cooccurrence
+from .cache import cached_user_fields, invalidate_user
+from .models import Favourite, FavouritePair, User
+from .serializers import MyTokenObtainPairSerializer
+from .pictures import process_profile_picture
+from .tasks import process_profile_picture as process_task
+
+
+class FavouriteHydrationTests(TestCase):
+    """Favourites embed their titles at a query cost independent of how many there are"""
+
+    @classmethod
+    def setUpTestData(cls):
+        movies = Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}") for i in range(1000)])
+        shows = TvShow.objects.bulk_create([TvShow(tmdb_id=i, name=f"Show {i}") for i in range(1000)])
+        movie_type = ContentType.objects.get_for_model(Movie)
+        tv_type = ContentType.objects.get_for_model(TvShow)
+
+        cls.few = User.objects.create(username="few", email="few@example.com")
+        cls.many = User.objects.create(username="many", email="many@example.com")
+        Favourite.objects.bulk_create(
+            [Favourite(user=cls.few, content_type=movie_type, object_id=movie.pk) for movie in movies[:3]]
+            + [Favourite(user=cls.few, content_type=tv_type, object_id=show.pk) for show in shows[:2]]
+            # Interleaved so every page mixes movies and TV shows
+            + [
+                Favourite(user=cls.many, content_type=content_type, object_id=title.pk)
+                for movie, show in zip(movies, shows)
+                for content_type, title in ((movie_type, movie), (tv_type, show))
+            ]
+        )
+
+    def get(self, user, url):
+        token = RefreshToken.for_user(user).access_token
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(context.captured_queries)
+
+    def test_favourites_list_embeds_titles(self):
+        body, queries = self.get(self.many, "/favourites/?page_size=100")
+        self.assertEqual(body["count"], 2000)
+        self.assertEqual(len(body["results"]), 100)
+        self.assertTrue(all(favourite["item"] for favourite in body["results"]))
+
+        _, few_queries = self.get(self.few, "/favourites/?page_size=100")
+        self.assertEqual(queries, few_queries)
+
+    def test_profile_favourites_bounded(self):
+        body, queries = self.get(self.many, f"/profile/{self.many.pk}/")
+        favourites = body["favourites"]
+        self.assertEqual(favourites["count"], 2000)
+        self.assertEqual(len(favourites["results"]), 20)
+        self.assertIn("/favourites/?page=2", favourites["next"])
+        self.assertEqual({f["item"]["media_type"] for f in favourites["results"]}, {"movie", "tv"})
+
+        few_body, few_queries = self.get(self.few, f"/profile/{self.few.pk}/")
+        self.assertEqual(few_body["favourites"]["count"], 5)
+        self.assertIsNone(few_body["favourites"]["next"])
+        # Only the extra COUNT for the truncated list differs
+        self.assertEqual(queries, few_queries + 1)
+
+
+class FavouritePairTests(TestCase):
+    """Pair counts follow every kind of add and delete, and drive both recommendation endpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie_type = ContentType.objects.get_for_model(Movie)
+        cls.tv_type = ContentType.objects.get_for_model(TvShow)
+        m = Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}") for i in range(4)])
+        t = TvShow.objects.create(tmdb_id=1, name="Show")
+        cls.m = [(cls.movie_type.pk, movie.pk) for movie in m]
+        cls.t = (cls.tv_type.pk, t.pk)
+        cls.users = {}
+        for name, titles in (("a", cls.m[:3]), ("b", [cls.m[0], cls.m[1], cls.t]), ("c", [cls.m[0], cls.m[3]])):
+            user = cls.users[name] = User.objects.create(username=name, email=f"{name}@example.com")
+            for content_type_id, object_id in titles:
+                Favourite.objects.create(user=user, content_type_id=content_type_id, object_id=object_id)
+
+    def pairs(self):
+        return {
+            (tuple(row[:2]), tuple(row[2:4])): row[4]
+            for row in FavouritePair.objects.values_list(
+                'content_type_id', 'object_id', 'other_content_type_id', 'other_object_id', 'count'
+            )
+        }
+
+    def expected(self, counts):
+        """Both directions of each (a, b): count"""
+        return {**counts, **{(b, a): count for (a, b), count in counts.items()}}
+
+    def test_counts_after_adds(self):
+        m = self.m
+        self.assertEqual(self.pairs(), self.expected({
+            (m[0], m[1]): 2, (m[0], m[2]): 1, (m[1], m[2]): 1,
+            (m[0], self.t): 1, (m[1], self.t): 1, (m[0], m[3]): 1,
+        }))
+
+    def test_single_delete(self):
+        m = self.m
+        Favourite.objects.get(user=self.users["a"], object_id=m[1][1], content_type_id=m[1][0]).delete()
+        self.assertEqual(self.pairs(), self.expected({
+            (m[0], m[1]): 1, (m[0], m[2]): 1, (m[0], self.t): 1, (m[1], self.t): 1, (m[0], m[3]): 1,
+        }))
+
+    def test_queryset_delete(self):
+        m = self.m
+        Favourite.objects.filter(
+            user=self.users["a"], content_type_id=self.movie_type.pk, object_id__in=[m[0][1], m[1][1]]
+        ).delete()
+        # a's pair between the two deleted favourites is dropped once, not twice
+        self.assertEqual(self.pairs(), self.expected({
+            (m[0], m[1]): 1, (m[0], self.t): 1, (m[1], self.t): 1, (m[0], m[3]): 1,
+        }))
+
+    def test_user_cascade_delete(self):
+        m = self.m
+        self.users["a"].delete()
+        self.assertEqual(self.pairs(), self.expected({
+            (m[0], m[1]): 1, (m[0], self.t): 1, (m[1], self.t): 1, (m[0], m[3]): 1,
+        }))
+        User.objects.filter(pk__in=[self.users["b"].pk, self.users["c"].pk]).delete()
+        self.assertEqual(self.pairs(), {})
+
+    def test_recommendation_order(self):
+        m = self.m
+        ties = sorted([m[2], m[3], self.t])
+
+        response = self.client.get(f"/movies/{m[0][1]}/also-favourited/")
+        results = [(r["media_type"], r["id"], r["score"]) for r in response.json()["results"]]
+        media = {self.movie_type.pk: "movie", self.tv_type.pk: "tv"}
+        self.assertEqual(results, [("movie", m[1][1], 2)] + [(media[ct], pk, 1) for ct, pk in ties])
+
+        token = RefreshToken.for_user(self.users["c"]).access_token
+        response = self.client.get("/favourites/recommendations/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        results = [(r["media_type"], r["id"], r["score"]) for r in response.json()["results"]]
+        # c's own favourites (m0, m3) are never recommended
+        self.assertEqual(results, [("movie", m[1][1], 2)] + [(media[ct], pk, 1) for ct, pk in ties if (ct, pk) != m[3]])
+
+
+class FavouritePairConcurrencyTests(TransactionTestCase):
+    """Concurrent favourites of one user see each other"""
+
+    def test_concurrent_adds_paired(self):
+        movie_type = ContentType.objects.get_for_model(Movie)
+        first, second = Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}") for i in range(2)])
+        user = User.objects.create(username="racer", email="racer@example.com")
+        paired = threading.Event()
+        errors = []
+
+        def add(movie, before=None, after=None):
+            try:
+                if before:
+                    before.wait(5)
+                with transaction.atomic():
+                    Favourite.objects.create(user=user, content_type=movie_type, object_id=movie.pk)
+                    if after:
+                        after.set()
+                        # Without the per-user lock the other add pairs now, missing this one
+                        time.sleep(0.5)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=add, args=(first, None, paired)),
+            threading.Thread(target=add, args=(second, paired)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(FavouritePair.objects.values_list('count', flat=True)), [1, 1])
+
+
+class BulkFavouriteTests(TestCase):
+    """Bulk add/remove validates per content type and reports a status per item"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}") for i in range(300)])
+        cls.shows = TvShow.objects.bulk_create([TvShow(tmdb_id=i, name=f"Show {i}") for i in range(300)])
+        cls.user = User.objects.create(username="bulk", email="bulk@example.com")
+        Favourite.objects.create(
+            user=cls.user, content_type=ContentType.objects.get_for_model(Movie), object_id=cls.movies[0].pk
+        )
+
+    def setUp(self):
+        app.conf.update(task_always_eager=True, task_eager_propagates=True)
+        self.addCleanup(app.conf.update, task_always_eager=False, task_eager_propagates=False)
+
+    def post(self, body, pair=True):
+        """The response and its query count; pair runs the pair tasks queued on commit"""
+        token = RefreshToken.for_user(self.user).access_token
+        with self.captureOnCommitCallbacks(execute=pair), CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                "/favourites/bulk/", body, content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+        return response, len(context.captured_queries)
+
+    def recount(self):
+        """Pair counts recomputed from every user's paired favourites"""
+        counts = {}
+        for user_id in Favourite.objects.values_list('user_id', flat=True).distinct():
+            items = list(Favourite.objects.filter(user_id=user_id, paired=True).values_list('content_type_id', 'object_id'))
+            for a in items:
+                for b in items:
+                    if a != b:
+                        counts[a + b] = counts.get(a + b, 0) + 1
+        return counts
+
+    def pairs(self):
+        return {
+            row[:4]: row[4]
+            for row in FavouritePair.objects.values_list(
+                'content_type_id', 'object_id', 'other_content_type_id', 'other_object_id', 'count'
+            )
+        }
+
+    def items(self, count):
+        return (
+            [{"content_type": "movie", "object_id": movie.pk} for movie in self.movies[:count]]
+            + [{"content_type": "tvshow", "object_id": show.pk} for show in self.shows[:count]]
+        )
+
+    def test_add_reports_each_item(self):
+        missing = {"content_type": "movie", "object_id": 10 ** 6}
+        response, _ = self.post({"add": self.items(200) + [missing]})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        statuses = [item["status"] for item in response.json()["added"]]
+        self.assertEqual(statuses.count("added"), 399)
+        self.assertEqual(statuses[0], "exists")
+        self.assertEqual(statuses[-1], "not_found")
+        self.assertEqual(Favourite.objects.filter(user=self.user).count(), 400)
+
+    def test_query_count_independent_of_size(self):
+        _, small_add = self.post({"add": self.items(5)})
+        _, small_remove = self.post({"remove": self.items(5)})
+        _, large_add = self.post({"add": self.items(250)})
+        _, large_remove = self.post({"remove": self.items(250)})
+        self.assertEqual(small_add, large_add)
+        self.assertEqual(small_remove, large_remove)
+
+    def test_remove(self):
+        self.post({"add": self.items(10)})
+        response, _ = self.post({"remove": self.items(10)[:5] + [{"content_type": "tvshow", "object_id": self.shows[50].pk}]})
+        statuses = [item["status"] for item in response.json()["removed"]]
+        self.assertEqual(statuses, ["removed"] * 5 + ["not_favourited"])
+        self.assertEqual(Favourite.objects.filter(user=self.user).count(), 15)
+
+    def test_pairs_follow_rows_written(self):
+        def pair_count():
+            return sum(FavouritePair.objects.values_list('count', flat=True))
+
+        self.post({"add": self.items(2)})
+        # 4 favourites: 4 * 3 ordered pairs
+        self.assertEqual(pair_count(), 12)
+        response, _ = self.post({"add": self.items(2)})
+        self.assertEqual({item["status"] for item in response.json()["added"]}, {"exists"})
+        self.assertEqual(pair_count(), 12)
+
+        self.post({"remove": self.items(1)})
+        response, _ = self.post({"remove": self.items(1)})
+        self.assertEqual({item["status"] for item in response.json()["removed"]}, {"not_favourited"})
+        self.assertEqual(pair_count(), 2)
+
+    def test_pairs_counted_off_request(self):
+        _, small = self.post({"add": self.items(2)}, pair=False)
+        _, large = self.post({"add": self.items(200)[4:]}, pair=False)
+        # The request only stores the favourites; the pairs wait for the task
+        self.assertEqual(small, large)
+        self.assertEqual(FavouritePair.objects.count(), 0)
+        self.assertEqual(Favourite.objects.filter(user=self.user, paired=False).count(), 397)
+
+        # Single changes meanwhile leave the pending favourites alone
+        movie_type = ContentType.objects.get_for_model(Movie)
+        Favourite.objects.get(user=self.user, content_type=movie_type, object_id=self.movies[1].pk).delete()
+        Favourite.objects.get(user=self.user, content_type=movie_type, object_id=self.movies[0].pk).delete()
+        Favourite.objects.create(user=self.user, content_type=movie_type, object_id=self.movies[250].pk)
+        Favourite.objects.create(user=self.user, content_type=movie_type, object_id=self.movies[251].pk)
+        self.assertEqual(self.pairs(), self.recount())
+
+        with override_settings(FAVOURITE_PAIR_BATCH=150):
+            self.assertEqual(cooccurrence.pair_pending(self.user.pk), 396)
+        self.assertEqual(len(self.recount()), 398 * 397)
+        self.assertEqual(self.pairs(), self.recount())
+
+        # A bulk removal drops its pairs against the favourites paired at the time
+        self.post({"add": self.items(200)[:4] + [{"content_type": "movie", "object_id": self.movies[1].pk}]}, pair=False)
+        self.post({"remove": self.items(200)[:10]})
+        self.post({"add": [{"content_type": "movie", "object_id": self.movies[252].pk}]})
+        self.assertEqual(self.pairs(), self.recount())
+        self.assertFalse(Favourite.objects.filter(paired=False).exists())
+
+    def test_concurrent_insert_not_counted_twice(self):
+        movie = self.movies[1]
+        checked = bulk.existing_titles
+
+        def insert_meanwhile(items):
+            # Another request favourites the same title after the title check
+            Favourite.objects.create(user=self.user, content_type=ContentType.objects.get_for_model(Movie), object_id=movie.pk)
+            return checked(items)
+
+        with mock.patch.object(bulk, "existing_titles", insert_meanwhile):
+            response, _ = self.post({"add": [{"content_type": "movie", "object_id": movie.pk}]})
+        self.assertEqual(response.json()["added"][0]["status"], "exists")
+        self.assertEqual(list(FavouritePair.objects.values_list('count', flat=True)), [1, 1])
+
+    def test_rejects_oversized_and_malformed_requests(self):
+        self.assertEqual(self.post({"add": self.items(300)})[0].status_code, 400)
+        self.assertEqual(self.post({"add": [{"content_type": "book", "object_id": 1}]})[0].status_code, 400)
+        self.assertEqual(self.post({})[0].status_code, 400)
+
+
+class FavouritesCacheTests(TestCase):
+    """Favourites and profile reads are cached per user and revalidated by ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = Movie.objects.bulk_create([Movie(tmdb_id=i, title=f"Movie {i}") for i in range(3)])
+        cls.movie_type = ContentType.objects.get_for_model(Movie)
+        cls.user = User.objects.create(username="cached", email="cached@example.com")
+        Favourite.objects.create(user=cls.user, content_type=cls.movie_type, object_id=cls.movies[0].pk)
+
+    def get(self, url, **headers):
+        token = RefreshToken.for_user(self.user).access_token
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}", **headers)
+        return response, [query["sql"] for query in context.captured_queries]
+
+    def test_not_modified_skips_favourite_queries(self):
+        response, _ = self.get("/favourites/")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response, queries = self.get("/favourites/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([sql for sql in queries if "users_favourite" in sql or "movies_movie" in sql])
+
+    def test_change_invalidates(self):
+        for url in ("/favourites/", f"/profile/{self.user.pk}/"):
+            etag = self.get(url)[0]["ETag"]
+            with self.captureOnCommitCallbacks(execute=True):
+                favourite = Favourite.objects.create(
+                    user=self.user, content_type=self.movie_type, object_id=self.movies[1].pk
+                )
+            response, _ = self.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            with self.captureOnCommitCallbacks(execute=True):
+                favourite.delete()
+
+    def test_catalog_change_invalidates(self):
+        etag = self.get("/favourites/")[0]["ETag"]
+        Movie.objects.filter(pk=self.movies[0].pk).update(title="Renamed")
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_catalog_version()
+        response, _ = self.get("/favourites/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Renamed", response.content.decode())
+
+    def test_cache_outage_serves_uncached(self):
+        down = redis.ConnectionError("down")
+        with mock.patch("django.core.cache.backends.redis.RedisCacheClient.get", side_effect=down), \
+                mock.patch("django.core.cache.backends.redis.RedisCacheClient.set", side_effect=down):
+            for url in ("/favourites/", f"/profile/{self.user.pk}/"):
+                response, _ = self.get(url)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertNotIn("ETag", response)
+
+    def test_cached_payload_reused(self):
+        first, _ = self.get("/favourites/")
+        second, queries = self.get("/favourites/")
+        self.assertEqual(first.json(), second.json())
+        self.assertFalse([sql for sql in queries if "users_favourite" in sql])
+
+
+def clear_throttles():
+    client = get_script().registered_client
+    keys = list(client.scan_iter("throttle:*"))
+    if keys:
+        client.delete(*keys)
+
+
+class ProfilePictureTests(TestCase):
+    """Uploads are stored untouched in the request and processed by a task"""
+
+    def setUp(self):
+        clear_throttles()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(process_task, "delay")
+        self.delay = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def photo(self, size=(3000, 2000)):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = "PhoneMaker"
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "blue").save(buffer, "JPEG", exif=exif)
+        return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+    def register(self, picture):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/auth/", {
+                "username": "pic", "email": "pic@example.com",
+                "password": "Str0ng-passw0rd", "password2": "Str0ng-passw0rd",
+                "profile_picture": picture,
+            })
+
+    def test_upload_processed_off_request(self):
+        response = self.register(self.photo())
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIsNone(response.json()["profile_picture_variants"])
+        user = User.objects.get(email="pic@example.com")
+        self.delay.assert_called_once_with(str(user.pk))
+        upload = user.profile_picture.name
+
+        process_profile_picture(user.pk)
+        user.refresh_from_db()
+        self.assertEqual(set(user.profile_picture_variants), {"large", "medium", "small"})
+        self.assertFalse(user.profile_picture.storage.exists(upload))
+        with user.profile_picture.open() as f:
+            large = Image.open(f)
+            self.assertEqual(large.size, (683, 1024))
+            self.assertFalse(large.getexif())
+
+        token = RefreshToken.for_user(user).access_token
+        body = self.client.get(f"/profile/{user.pk}/", HTTP_AUTHORIZATION=f"Bearer {token}").json()
+        self.assertTrue(body["profile_picture_variants"]["small"].endswith(".jpg"))
+
+        # Removing the picture removes its sizes too
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/profile/{user.pk}/", {"profile_picture": None},
+                content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        process_profile_picture(user.pk)
+        variants = user.profile_picture_variants
+        user.refresh_from_db()
+        self.assertEqual(user.profile_picture_variants, {})
+        self.assertFalse([name for name in variants.values() if user.profile_picture.storage.exists(name)])
+
+    def test_rejects_non_images_without_decoding(self):
+        fake = SimpleUploadedFile("photo.jpg", b"not an image at all", content_type="image/jpeg")
+        self.assertEqual(self.register(fake).status_code, 400)
+        self.delay.assert_not_called()
+
+
+@override_settings(REST_FRAMEWORK={
+    "DEFAULT_AUTHENTICATION_CLASSES": ["users.authentication.CachedJWTAuthentication"],
+    "NUM_PROXIES": 1,
+    "DEFAULT_THROTTLE_RATES": {"login.ip": "3/min", "login.account": "2/min", "catalog-write.ip": "1/min"},
+})
+class ThrottleTests(TestCase):
+    """Token buckets per address and per account, shared through Redis"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="stuffed", email="stuffed@example.com", password="Str0ng-passw0rd")
+
+    def setUp(self):
+        clear_throttles()
+
+    def login(self, email, address="10.0.0.1", **headers):
+        return self.client.post(
+            "/auth/login/", {"email": email, "password": "wrong"}, REMOTE_ADDR=address, **headers
+        )
+
+    def test_account_bucket_spans_addresses(self):
+        self.assertEqual(self.login("Stuffed@example.com", "10.0.0.1").status_code, 401)
+        self.assertEqual(self.login("stuffed@example.com ", "10.0.0.2").status_code, 401)
+        response = self.login("stuffed@example.com", "10.0.0.3")
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response["Retry-After"]) <= 30)
+
+    def test_ip_bucket(self):
+        statuses = [self.login(f"user{n}@example.com").status_code for n in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        self.assertEqual(self.login("other@example.com", "10.0.0.9").status_code, 401)
+
+    def test_spoofed_forwarded_for_shares_the_proxy_bucket(self):
+        # The proxy appends the address it saw; whatever the client put before it is ignored
+        statuses = [
+            self.login(f"user{n}@example.com", "10.1.0.1", HTTP_X_FORWARDED_FOR=f"203.0.113.{n}, 198.51.100.7").status_code
+            for n in range(4)
+        ]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        response = self.login("other@example.com", "10.1.0.1", HTTP_X_FORWARDED_FOR="198.51.100.8")
+        self.assertEqual(response.status_code, 401)
+
+    def test_catalog_reads_not_throttled(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get("/movies/").status_code, 200)
+        self.assertEqual(self.client.post("/movies/", {"tmdb_id": 1, "title": "One"}).status_code, 201)
+        self.assertEqual(self.client.post("/movies/", {"tmdb_id": 2, "title": "Two"}).status_code, 429)
+
+
+class CachedUserResolutionTests(TestCase):
+    """Authenticated requests resolve the user from the cache, not a query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="cachedauth", email="cachedauth@example.com")
+
+    def setUp(self):
+        # The cached user outlives each test's rolled back transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_user(self.user.pk)
+
+    def get(self, token):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/favourites/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return response, [query["sql"] for query in context.captured_queries]
+
+    def token(self):
+        return MyTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def test_no_user_query_once_cached(self):
+        token = self.token()
+        response, _ = self.get(token)
+        self.assertEqual(response.status_code, 200)
+
+        response, queries = self.get(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([sql for sql in queries if "users_user" in sql])
+
+        # Deactivation takes effect immediately in this process
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get(token)[0].status_code, 401)
+
+    def test_revoked_tokens_rejected(self):
+        old = self.token()
+        self.assertEqual(self.get(old)[0].status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_tokens()
+        response, _ = self.get(old)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_revoked")
+        self.assertEqual(self.get(self.token())[0].status_code, 200)
+
+    def test_token_version_not_writable(self):
+        old = self.token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_tokens()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/profile/{self.user.pk}/", {"token_version": 0},
+                content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {self.token()}",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(self.get(old)[0].status_code, 401)
+
+    def test_cache_outage_after_commit(self):
+        down = redis.ConnectionError("down")
+        cache_key = f"auth:user:{self.user.pk}"
+        cache.set(cache_key, {"stale": True})
+        real_delete = cache.delete
+        outcomes = [down, None]
+
+        def flaky_delete(key):
+            if outcomes.pop(0):
+                raise down
+            return real_delete(key)
+
+        # A blip is retried, so the revocation still drops the cached fields
+        with mock.patch("users.cache.time.sleep"), \
+                mock.patch("users.cache.cache.delete", side_effect=flaky_delete) as delete, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_tokens()
+        self.assertEqual(delete.call_count, 2)
+        self.assertIsNone(cache.get(cache_key))
+
+        # A lasting outage is logged; the committed write still succeeds
+        with mock.patch("users.cache.time.sleep"), \
+                mock.patch("users.cache.cache.delete", side_effect=down), \
+                mock.patch("users.cache.cache.set", side_effect=down), \
+                self.assertLogs("users.cache", "ERROR"), \
+                self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create(username="offline", email="offline@example.com")
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
+
+    def test_cache_outage_loads_from_database(self):
+        down = redis.ConnectionError("down")
+        with mock.patch("users.cache.cache.get", side_effect=down), \
+                mock.patch("users.cache.cache.set", side_effect=down) as set_:
+            self.assertEqual(cached_user_fields(self.user.pk, lambda: {"pk": "loaded"}), {"pk": "loaded"})
+            set_.assert_called_once()
@@ -2,18 +2,24 @@ from django.shortcuts import render
 from rest_framework import generics, permissions
 from .serializers import (
         RegisterSerializer, MyTokenObtainPairSerializer,
-        ProfileSerializer, FavouriteSerializer
+        ProfileSerializer, FavouriteSerializer, FavouriteBulkSerializer, with_titles
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .models import Favourite
+from .pagination import FavouritePagination
+from .bulk import bulk_add, bulk_remove
+from .cache import cached_response
+from .cooccurrence import hydrate, user_recommendations
 from django.contrib.auth import get_user_model
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
 from django.db import IntegrityError
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from django.contrib.auth.models import AnonymousUser
+from cinewhisper.throttling import RedisRateThrottle
 
 
 User = get_user_model()
@@ -21,12 +27,17 @@ User = get_user_model()
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    # Checking a password is the most expensive thing we do
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = "login"
 
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
     serializer_class = RegisterSerializer
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = "register"
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -45,6 +56,16 @@ class UserViewSet(viewsets.ModelViewSet):
 
         return User.objects.filter(pk=user.pk)
 
+    def retrieve(self, request, *args, **kwargs):
+        """The user's own profile is served from the per-user cache"""
+        if not request.user.is_authenticated or kwargs.get(self.lookup_field) != str(request.user.pk):
+            return super().retrieve(request, *args, **kwargs)
+
+        def build():
+            return super(UserViewSet, self).retrieve(request, *args, **kwargs).data
+
+        return cached_response(request, request.user.pk, build)
+
 
 class FavouriteViewSet(viewsets.ModelViewSet):
     """
@@ -55,17 +76,27 @@ class FavouriteViewSet(viewsets.ModelViewSet):
       - The queryset is filtered to the current authenticated user's favourites.
       - Make sures that on creation, the current user is automatically assigned
       - Duplicate entries are prevented
+      - Each favourite embeds its movie or TV show, loaded in one query per content type
     """
     serializer_class = FavouriteSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'favourite_id'
+    pagination_class = FavouritePagination
 
     def get_queryset(self):
         """Get only the favourites belonging to the authenticated user"""
         if not hasattr(self, 'request') or not self.request.user.is_authenticated:
             return Favourite.objects.none()
 
-        return Favourite.objects.filter(user=self.request.user)
+        return with_titles(Favourite.objects.filter(user=self.request.user)).order_by('-added_at', 'favourite_id')
+
+    def list(self, request, *args, **kwargs):
+        """Cached per user and page; If-None-Match with the current ETag gets a 304"""
+
+        def build():
+            return super(FavouriteViewSet, self).list(request, *args, **kwargs).data
+
+        return cached_response(request, request.user.pk, build)
 
     def perform_create(self, serializer):
         """Assign the current user to the favourite"""
@@ -83,3 +114,38 @@ class FavouriteViewSet(viewsets.ModelViewSet):
 
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(detail=False, methods=['get'], url_path='recommendations')
+    def recommendations(self, request):
+        """
+        GET /favourites/recommendations?limit=20 - Titles most often favourited
+        together with the user's favourites that the user has not favourited yet.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+
+        entries = user_recommendations(request.user.pk, limit)
+        return Response({"results": hydrate(entries)})
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        POST /favourites/bulk - Add and remove many favourites at once.
+
+        Body: {"add": [{"content_type": "movie", "object_id": 1}, ...], "remove": [...]}
+        Titles are validated with one query per content type and the new
+        favourites inserted together. Responds with a status per item.
+        """
+        serializer = FavouriteBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        def pairs(items):
+            return [(item["content_type"], item["object_id"]) for item in items]
+
+        return Response({
+            "added": bulk_add(request.user, pairs(serializer.validated_data["add"])),
+            "removed": bulk_remove(request.user, pairs(serializer.validated_data["remove"])),
+        })
+